@@ -0,0 +1,70 @@
+"""Time searches of an archive of received messages.
+
+Run from the top of the repo with `python -m benchmarks.bench_archive` or
+`PYTHONPATH=. python benchmarks/bench_archive.py`.
+"""
+
+
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+from ntfyr.archive import Archive
+from ntfyr.subscription import Message
+
+TOPICS = ['alerts', 'backups', 'ci', 'deploys']
+TAGS = ['warning', 'disk', 'network', 'ok', 'failed']
+WORDS = ['disk', 'full', 'backup', 'finished', 'deploy', 'timeout', 'host']
+
+
+def _fill(archive, count):
+    rng = random.Random(0)
+    now = int(time.time())
+    start = time.perf_counter()
+    for index in range(count):
+        archive.add(
+            'https://ntfy.example.com',
+            Message(
+                id=str(index),
+                time=now - count + index,
+                topic=rng.choice(TOPICS),
+                title=rng.choice(WORDS),
+                message=' '.join(rng.choices(WORDS, k=8)) + f' {index}',
+                priority=rng.randint(1, 5),
+                tags=rng.sample(TAGS, 2),
+            ),
+        )
+    archive.flush()
+    return time.perf_counter() - start
+
+
+def main(count=100000, number=20):
+    """Print the insert rate and the time per search for each query."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir, 'archive.sqlite3')
+        with Archive(path, flush_size=1000) as archive:
+            seconds = _fill(archive, count)
+            print(f'{"insert":>24}: {count / seconds:8.0f} messages/s')
+            week = int(time.time()) - 7 * 86400
+            for name, query in [
+                ('topic, last week', dict(topic='alerts', since=week)),
+                ('text', dict(text='disk full')),
+                ('text and tag', dict(text='timeout', tags=['failed'])),
+                ('priority and topic', dict(priority=5, topic='ci')),
+                ('rare word', dict(text=str(count - 1))),
+            ]:
+                seconds = min(
+                    timeit.repeat(
+                        lambda: archive.search(**query),
+                        number=number,
+                        repeat=3,
+                    )
+                )
+                print(f'{name:>24}: {seconds / number * 1e3:8.2f} ms/search')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Compare loading the config with a cold and a warm config cache.
+
+Run from the top of the repo with `python -m benchmarks.bench_config` or
+`PYTHONPATH=. python benchmarks/bench_config.py`.
+"""
+
+
+import os
+import pathlib
+import sys
+import tempfile
+import timeit
+
+import ntfyr.config
+from ntfyr.config import Config, _read_config_file
+
+CONFIG = '''[ntfyr]
+server = http://ntfy.example.com
+user = alice
+password = supersecret
+tags = warning
+priority = high
+timestamp = %%Y-%%m-%%d %%H:%%M:%%S %%Z
+rate_limit = 5
+'''
+
+
+def _cold():
+    _read_config_file.cache_clear()
+    ntfyr.config._search_result = None
+    pathlib.Path(os.environ['NTFYR_CONFIG_CACHE']).unlink(missing_ok=True)
+    Config().search()
+
+
+def _warm_process():
+    """Load the config like a new process with the cache on disk."""
+    _read_config_file.cache_clear()
+    ntfyr.config._search_result = None
+    Config().search()
+
+
+def _warm():
+    Config().search()
+
+
+def main(number=2000):
+    """Print the time per config load for each case."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for index in range(3):
+            path = pathlib.Path(tmp_dir, f'config{index}.ini')
+            path.write_text(CONFIG)
+            paths.append(str(path))
+        os.environ['NTFYR_CONFIGS'] = ':'.join(paths)
+        os.environ['NTFYR_CONFIG_CACHE'] = os.path.join(tmp_dir, 'cache.json')
+        for name, func in [
+            ('cold', _cold),
+            ('warm (new process)', _warm_process),
+            ('warm (same process)', _warm),
+        ]:
+            func()
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            print(f'{name:>20}: {seconds / number * 1e6:8.1f} us/load')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
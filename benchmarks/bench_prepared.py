@@ -0,0 +1,62 @@
+"""Compare the per-send overhead of the ways to send a notification.
+
+`notify()`, `NtfyClient.send()` and `PreparedNotification.send()` are
+compared. The requests go to a session that answers without touching the
+network so only the work done by `ntfyr` is measured.
+
+Run from the top of the repo with `python -m benchmarks.bench_prepared` or
+`PYTHONPATH=. python benchmarks/bench_prepared.py`.
+"""
+
+
+import sys
+import timeit
+
+from ntfyr._http import Response
+from ntfyr.config import Config
+from ntfyr.ntfyr import NtfyClient, notify
+
+CONFIG = Config(
+    topic='topic',
+    server='http://ntfy.example.com',
+    title='Disk space low',
+    priority='high',
+    tags=['warning', 'disk'],
+    user='alice',
+    password='supersecret',
+    transport='stdlib',
+)
+
+
+class _NullSession:
+    """A session that answers every request with an empty JSON object."""
+
+    def post(self, url, headers=None, data=None, auth=None, timeout=None):
+        return Response(200, {}, b'{}')
+
+    def close(self):
+        pass
+
+
+def main(number=20000):
+    """Print the time per send for each way of sending."""
+    import ntfyr.ntfyr
+
+    session = _NullSession()
+    ntfyr.ntfyr._default_sessions[CONFIG.transport] = session
+    client = NtfyClient(CONFIG, session=session)
+    prepared = CONFIG.prepare()
+    for name, func in [
+        ('notify()', lambda: notify(CONFIG, 'message')),
+        ('NtfyClient.send()', lambda: client.send('message')),
+        (
+            'PreparedNotification.send()',
+            lambda: prepared.send('message', session),
+        ),
+    ]:
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f'{name:>28}: {seconds / number * 1e6:6.2f} us/send')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Measure sending throughput against a local mock ntfy server.
+
+The server adds latency and fails some requests with a 503 so the effect of
+concurrency and retries can be measured offline. Run from the top of the repo
+with `python -m benchmarks.bench_throughput`.
+"""
+
+
+import dataclasses
+import sys
+import time
+
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.ntfyr import NtfyClient, notify_many
+from tests.fixtures.ntfy_server import MockNtfyServer
+
+
+def _sequential(config, items):
+    with NtfyClient(config) as client:
+        for _, message in items:
+            try:
+                client.send(message)
+            except NtfyrError:
+                pass
+
+
+def _concurrent(config, items):
+    notify_many(items, max_workers=10)
+
+
+def main(count=200, latency=0.01, error_rate=0.05):
+    """Print the notifications sent per second for each case."""
+    with MockNtfyServer(latency=latency, error_rate=error_rate, seed=0) as srv:
+        for transport in ['requests', 'stdlib']:
+            config = Config(
+                topic='bench',
+                server=srv.url,
+                transport=transport,
+                max_attempts=3,
+                retry_delay=0.01,
+            )
+            items = [
+                (dataclasses.replace(config), f'message {index}')
+                for index in range(count)
+            ]
+            for name, func in [
+                ('sequential', _sequential),
+                ('notify_many', _concurrent),
+            ]:
+                sent = len(srv.requests)
+                start = time.perf_counter()
+                func(config, items)
+                seconds = time.perf_counter() - start
+                requests = len(srv.requests) - sent
+                print(
+                    f'{transport:>8} {name:>12}: {count / seconds:8.0f} '
+                    f'notifications/s, {requests} requests'
+                )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,35 @@
 This is just the backend of the ntfyr script.
 """
 
+
 from .errors import (  # noqa: F401
     NtfyrConfigException,
     NtfyrError,
     NtfyrException,
+    NtfyrQueueFullError,
+    NtfyrRateLimitError,
 )
-from .ntfyr import notify  # noqa: F401
+
+_LAZY_ATTRIBUTES = {
+    'BackgroundSender': 'background',
+    'NtfyClient': 'ntfyr',
+    'PreparedNotification': 'ntfyr',
+    'notify': 'ntfyr',
+    'notify_async_background': 'background',
+    'notify_many': 'ntfyr',
+    'subscribe': 'subscription',
+}
+"""Attributes imported on first use to keep the CLI quick to start."""
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+
+        module = importlib.import_module(f'.{_LAZY_ATTRIBUTES[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted([*globals(), *_LAZY_ATTRIBUTES])
@@ -6,14 +6,43 @@ https://github.com/haxwithaxe/ntfyr and https://pypi.org/project/ntfyr/
 
 
 import argparse
+import codecs
+import contextlib
+import io
+import json
 import logging
+import os
 import select
+import signal
 import sys
 
+from . import split, timestamp
 from ._common import log
-from .config import DEFAULT_TIMESTAMP, PRIORITIES, Config
-from .errors import NtfyrError
-from .ntfyr import notify
+from .config import (
+    DEFAULT_TIMESTAMP,
+    PRIORITIES,
+    SPOOL_SYNC_MODES,
+    TRANSPORTS,
+    Config,
+    priority_rank,
+)
+from .daemon import forward
+from .digest import DEFAULT_WINDOW as DEFAULT_DIGEST_WINDOW
+from .digest import Digest
+from .errors import NtfyrConfigException, NtfyrError
+from .health import FAILOVER_POLICIES
+from .ntfyr import DEFAULT_POOL_MAXSIZE, NtfyClient, notify, notify_many
+from .retry import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_RETRY_MAX_DELAY,
+)
+from .split import DEFAULT_MAX_PARTS
+
+_CHUNK_SIZE = 8192
+_MAX_RECORD_SIZE = 65536
 
 
 def _parse_args(args):
@@ -79,6 +108,74 @@ def _parse_args(args):
         help='The body of the message to send. The default'
         ' (or if "-" is given) is to read from stdin.',
     )
+    parser.add_argument(
+        '-F',
+        '--file',
+        default=None,
+        help='A file to upload as an attachment. The file is streamed so it '
+        'can be of any size. The message is shown with the attachment.',
+    )
+    parser.add_argument(
+        '--filename',
+        default=None,
+        help='The name shown for the --file attachment. Defaults to the name '
+        'of the file.',
+    )
+    parser.add_argument(
+        '--split',
+        action='store_true',
+        default=False,
+        help='Send a message larger than ntfy\'s 4096 byte limit as several '
+        'notifications labeled "(1/N)" in the title instead of as an '
+        'attachment. The message is read a chunk at a time.',
+    )
+    parser.add_argument(
+        '--max-parts',
+        type=int,
+        default=DEFAULT_MAX_PARTS,
+        help='The most parts --split sends. The rest of the message is '
+        f'dropped. Defaults to {DEFAULT_MAX_PARTS}.',
+    )
+    parser.add_argument(
+        '--max-bytes',
+        type=int,
+        default=None,
+        help='The most bytes --split sends. No limit by default.',
+    )
+    parser.add_argument(
+        '-f',
+        '--follow',
+        '--line-mode',
+        action='store_true',
+        default=False,
+        help='Read stdin one record at a time and send each record as a '
+        'separate notification as soon as it arrives. --message is ignored.',
+    )
+    parser.add_argument(
+        '--delimiter',
+        default='\\n',
+        help='The string that separates records in --follow mode. Backslash '
+        'escapes are supported. Defaults to a newline.',
+    )
+    parser.add_argument(
+        '--digest',
+        metavar='SECONDS',
+        type=float,
+        nargs='?',
+        const=DEFAULT_DIGEST_WINDOW,
+        default=None,
+        help='In --follow mode send one summary of the records received in '
+        'each window of SECONDS instead of a notification for each record. '
+        f'SECONDS defaults to {DEFAULT_DIGEST_WINDOW:g}.',
+    )
+    parser.add_argument(
+        '--digest-count',
+        metavar='COUNT',
+        type=int,
+        default=None,
+        help='Send the summary as soon as COUNT records are received. '
+        'Implies --digest.',
+    )
     parser.add_argument(
         '--timestamp',
         nargs='?',
@@ -92,14 +189,41 @@ def _parse_args(args):
     parser.add_argument(
         '-t',
         '--topic',
-        required=True,
-        help='The topic to send the notification to. Required',
+        nargs='+',
+        default=None,
+        help='One or more topics to send the notification to. Required '
+        'unless a topic is set in the config or --target is given.',
     )
     parser.add_argument(
         '-s',
         '--server',
+        nargs='+',
+        default=None,
+        help='One or more servers to send the notification to. Each topic is '
+        'sent to every server.',
+    )
+    parser.add_argument(
+        '--target',
+        nargs='+',
+        default=None,
+        help='One or more named target lists from the [targets] section of '
+        'the config to send the notification to.',
+    )
+    parser.add_argument(
+        '--failover',
+        nargs='+',
         default=None,
-        help='The server to send the notification to.',
+        help='Servers to send to when the server can not be reached or '
+        'returns a 429 or 5xx error. Append "=WEIGHT" to a server to weight '
+        'it for --failover-policy weighted.',
+    )
+    parser.add_argument(
+        '--failover-policy',
+        choices=FAILOVER_POLICIES,
+        default=None,
+        help='"ordered" tries the servers in the order given. "weighted" '
+        'tries the server with the lowest latency and fewest recent failures '
+        'for its weight first. Defaults to "ordered".',
     )
     parser.add_argument(
         '-u',
@@ -130,6 +254,120 @@ def _parse_args(args):
         ' The values specified as arguments override the values in these '
         'files.',
     )
+    parser.add_argument(
+        '--transport',
+        choices=TRANSPORTS,
+        default=None,
+        help='The HTTP library to send with. "stdlib" uses http.client which '
+        'starts faster than "requests". Defaults to "requests".',
+    )
+    parser.add_argument(
+        '--max-attempts',
+        type=int,
+        default=None,
+        help='The maximum number of attempts to send the notification. Only '
+        'connection errors and 429 and 5xx responses are retried. Defaults '
+        f'to {DEFAULT_MAX_ATTEMPTS}.',
+    )
+    parser.add_argument(
+        '--retry-delay',
+        type=float,
+        default=None,
+        help='The base delay in seconds for the exponential backoff between '
+        f'attempts. Defaults to {DEFAULT_RETRY_DELAY}.',
+    )
+    parser.add_argument(
+        '--retry-max-delay',
+        type=float,
+        default=None,
+        help='The maximum delay in seconds between attempts. Defaults to '
+        f'{DEFAULT_RETRY_MAX_DELAY}.',
+    )
+    parser.add_argument(
+        '--connect-timeout',
+        type=float,
+        default=None,
+        help='Seconds to wait for a connection to the server. Defaults to '
+        f'{DEFAULT_CONNECT_TIMEOUT:g}.',
+    )
+    parser.add_argument(
+        '--read-timeout',
+        type=float,
+        default=None,
+        help='Seconds to wait for the server to respond. Defaults to '
+        f'{DEFAULT_READ_TIMEOUT:g}.',
+    )
+    parser.add_argument(
+        '--deadline',
+        type=float,
+        default=None,
+        help='The most seconds sending a notification may take, including '
+        'retries and waiting for the rate limit. No limit by default.',
+    )
+    parser.add_argument(
+        '--spool',
+        default=None,
+        help='A directory to spool notifications in when the server can not '
+        'be reached or returns a 429 or 5xx error. Spooled notifications are '
+        'sent by `ntfyr flush` or a daemon started with --spool.',
+    )
+    parser.add_argument(
+        '--spool-sync',
+        choices=SPOOL_SYNC_MODES,
+        default=None,
+        help='How hard to try to make spooled notifications durable. "full" '
+        'calls fsync for every notification. Defaults to "normal".',
+    )
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        default=False,
+        help='Send the notification directly even if an ntfyr daemon is '
+        'running.',
+    )
+    parser.add_argument(
+        '--log-level',
+        default='ERROR',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Set the log level.',
+    )
+    parsed_args = parser.parse_args(args)
+    if parsed_args.file and parsed_args.follow:
+        parser.error('--file can not be used with --follow')
+    if parsed_args.split and (parsed_args.file or parsed_args.follow):
+        parser.error('--split can not be used with --file or --follow')
+    if parsed_args.digest_count is not None and parsed_args.digest is None:
+        parsed_args.digest = DEFAULT_DIGEST_WINDOW
+    return parsed_args
+
+
+def _parse_daemon_args(args):
+    from .spool import DEFAULT_DRAIN_INTERVAL
+
+    parser = argparse.ArgumentParser(
+        prog='ntfyr daemon',
+        description='Keep warm connections to ntfy servers and send '
+        'notifications for other ntfyr invocations.',
+    )
+    parser.add_argument(
+        '--socket',
+        default=None,
+        help='The Unix socket to listen on. Defaults to $NTFYR_SOCKET, '
+        '$XDG_RUNTIME_DIR/ntfyr.sock, or a per-user socket in the temporary '
+        'directory.',
+    )
+    parser.add_argument(
+        '--spool',
+        default=None,
+        help='Drain the spool in this directory in the background.',
+    )
+    parser.add_argument(
+        '--drain-interval',
+        type=float,
+        default=DEFAULT_DRAIN_INTERVAL,
+        help='Seconds between attempts to drain the spool. Defaults to '
+        f'{DEFAULT_DRAIN_INTERVAL}.',
+    )
     parser.add_argument(
         '--log-level',
         default='ERROR',
@@ -139,14 +377,233 @@ def _parse_args(args):
     return parser.parse_args(args)
 
 
-def _configure(args):
-    # Setup logging
+def _parse_flush_args(args):
+    from .spool import DEFAULT_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(
+        prog='ntfyr flush',
+        description='Send the spooled notifications.',
+    )
+    parser.add_argument(
+        '--spool',
+        default=None,
+        help='The spool directory. Defaults to the spool in the config.',
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help='The number of notifications to send per batch. Defaults to '
+        f'{DEFAULT_BATCH_SIZE}.',
+    )
+    parser.add_argument(
+        '-c',
+        '--config',
+        nargs='+',
+        default=[],
+        help='One or more configuration files to find the spool in.',
+    )
+    parser.add_argument(
+        '--log-level',
+        default='ERROR',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Set the log level.',
+    )
+    return parser.parse_args(args)
+
+
+def _parse_subscribe_args(args):
+    parser = argparse.ArgumentParser(
+        prog='ntfyr subscribe',
+        description='Print the messages published to topics as they arrive.',
+    )
+    parser.add_argument(
+        '-t',
+        '--topic',
+        nargs='+',
+        default=None,
+        help='One or more topics to subscribe to.',
+    )
+    parser.add_argument(
+        '-s',
+        '--server',
+        default=None,
+        help='The server to subscribe to.',
+    )
+    parser.add_argument(
+        '--since',
+        default=None,
+        help='Also print the cached messages since a message ID, a Unix '
+        'timestamp, a duration like "10m" or "all".',
+    )
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        default=False,
+        help='Print the cached messages and exit instead of waiting for new '
+        'ones.',
+    )
+    parser.add_argument(
+        '--cursor',
+        dest='cursor_path',
+        default=None,
+        help='Save where the subscription left off in this file and resume '
+        'from there when --since is not given.',
+    )
+    parser.add_argument(
+        '--archive',
+        dest='archive_path',
+        default=None,
+        help='Store the messages in this searchable archive. See "ntfyr '
+        'search".',
+    )
+    parser.add_argument(
+        '--format',
+        choices=['json', 'text'],
+        default='json',
+        help='Print each message as a line of JSON or as its title and '
+        'message. Defaults to "json".',
+    )
+    parser.add_argument(
+        '-u',
+        '--user',
+        default=None,
+        help='The user to authenticate to the server with.',
+    )
+    parser.add_argument(
+        '-p',
+        '--password',
+        default=None,
+        help='The password to authenticate to the server with.',
+    )
+    parser.add_argument(
+        '-o',
+        '--token',
+        default=None,
+        help='The token to authenticate to the server with.',
+    )
+    parser.add_argument(
+        '-c',
+        '--config',
+        nargs='+',
+        default=[],
+        help='One or more configuration files.',
+    )
+    parser.add_argument(
+        '--log-level',
+        default='ERROR',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Set the log level.',
+    )
+    return parser.parse_args(args)
+
+
+def _parse_search_args(args):
+    parser = argparse.ArgumentParser(
+        prog='ntfyr search',
+        description='Search the messages stored in the archive by "ntfyr '
+        'subscribe --archive".',
+    )
+    parser.add_argument(
+        'text',
+        nargs='*',
+        help='Words that must all be in the title or message.',
+    )
+    parser.add_argument(
+        '-t',
+        '--topic',
+        default=None,
+        help='Only messages published to this topic.',
+    )
+    parser.add_argument(
+        '--since',
+        default=None,
+        help='Only messages since a Unix timestamp, an ISO 8601 date or a '
+        'duration before now like "7d".',
+    )
+    parser.add_argument(
+        '--until',
+        default=None,
+        help='Only messages before a Unix timestamp, an ISO 8601 date or a '
+        'duration before now like "1h".',
+    )
+    parser.add_argument(
+        '-P',
+        '--priority',
+        choices=PRIORITIES,
+        default=None,
+        help='Only messages with at least this priority.',
+    )
+    parser.add_argument(
+        '-G',
+        '--tags',
+        nargs='+',
+        default=[],
+        help='Only messages with all of these tags.',
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=100,
+        help='Print at most this many of the newest matching messages. '
+        'Defaults to 100.',
+    )
+    parser.add_argument(
+        '--format',
+        choices=['json', 'text'],
+        default='json',
+        help='Print each message as a line of JSON or as its title and '
+        'message. Defaults to "json".',
+    )
+    parser.add_argument(
+        '--archive',
+        dest='archive_path',
+        default=None,
+        help='The archive to search. Defaults to the archive in the config.',
+    )
+    parser.add_argument(
+        '-c',
+        '--config',
+        nargs='+',
+        default=[],
+        help='One or more configuration files to find the archive in.',
+    )
+    parser.add_argument(
+        '--log-level',
+        default='ERROR',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Set the log level.',
+    )
+    parsed_args = parser.parse_args(args)
+    from .archive import parse_time
+
+    for name in ('since', 'until'):
+        value = getattr(parsed_args, name)
+        if value is None:
+            continue
+        try:
+            setattr(parsed_args, name, parse_time(value))
+        except ValueError:
+            parser.error(f'argument --{name}: invalid time: {value!r}')
+    return parsed_args
+
+
+def _setup_logging(args):
     if args.log_level:
         log.setLevel(getattr(logging, args.log_level.upper()))
+
+
+def _configure(args):
+    _setup_logging(args)
     # Assemble the config
     return Config.from_args(args)
 
 
+def _configure_targets(args):
+    _setup_logging(args)
+    return Config.targets_from_args(args)
+
+
 def _get_message(args):
     if args.message == '-':
         if select.select([sys.stdin], [], [], 0)[0]:
@@ -157,19 +614,312 @@ def _get_message(args):
         return args.message
 
 
+def _get_message_stream(args):
+    """Return a text stream of the message without reading it."""
+    if args.message != '-':
+        return io.StringIO(args.message)
+    if select.select([sys.stdin], [], [], 0)[0]:
+        return sys.stdin
+    return io.StringIO('')
+
+
+def _read_chunks(stream, size=_CHUNK_SIZE):
+    """Yield text from `stream` as soon as it is available."""
+    raw = getattr(stream, 'buffer', None)
+    if not hasattr(raw, 'read1'):
+        yield from iter(lambda: stream.readline(size), '')
+        return
+    decoder = codecs.getincrementaldecoder(stream.encoding or 'utf-8')(
+        errors='replace',
+    )
+    while True:
+        data = raw.read1(size)
+        text = decoder.decode(data, final=not data)
+        if text:
+            yield text
+        if not data:
+            return
+
+
+def _iter_records(stream, delimiter='\n'):
+    """Yield the non-empty records in `stream` separated by `delimiter`.
+
+    Records longer than `_MAX_RECORD_SIZE` are split so memory use stays
+    bounded no matter what the stream contains.
+    """
+    pending = ''
+    for chunk in _read_chunks(stream):
+        *records, pending = (pending + chunk).split(delimiter)
+        while len(pending) > _MAX_RECORD_SIZE:
+            records.append(pending[:_MAX_RECORD_SIZE])
+            pending = pending[_MAX_RECORD_SIZE:]
+        for record in records:
+            for start in range(0, len(record), _MAX_RECORD_SIZE):
+                yield record[start : start + _MAX_RECORD_SIZE]
+    if pending:
+        yield pending
+
+
+def _log_error(err, message):
+    log.error(
+        f'Error sending to {err.server}/{err.topic}: '
+        f'{err.__class__.__name__}: {err.message}',
+    )
+    log.debug('Sent headers: %s', err.headers)
+    log.debug('Sent message:\n%s', message)
+
+
+def _refresh_timezone_on_sighup():
+    """Look up the timezone for timestamps again when sent a SIGHUP.
+
+    Only the daemon does this. Other commands keep the default action so they
+    exit when their terminal is closed.
+    """
+    signal.signal(signal.SIGHUP, lambda *_: timestamp.refresh())
+
+
+def _upload(config, message, file, filename):
+    try:
+        return notify(config, message, body=file, filename=filename)
+    except NtfyrError as err:
+        return err
+
+
+def _send_to_targets(configs, message, file=None, filename=None):
+    """Send `message` to every target at once.
+
+    Returns:
+        bool: `True` if the message was sent to every target.
+
+    Raises:
+        NtfyrError: If there is only one target and sending to it failed.
+    """
+    if len(configs) == 1:
+        notify(configs[0], message, body=file, filename=filename)
+        return True
+    success = True
+    if file is None:
+        results = notify_many(
+            [(config, message) for config in configs],
+            max_workers=min(len(configs), DEFAULT_POOL_MAXSIZE),
+        )
+    else:
+        # Upload to one target at a time so the file is only read once at a
+        #   time.
+        results = [
+            _upload(config, message, file, filename) for config in configs
+        ]
+    for result in results:
+        if isinstance(result, NtfyrError):
+            _log_error(result, message)
+            success = False
+    return success
+
+
+def _send_split(configs, args):
+    """Send the message to every target in parts that fit ntfy's limit.
+
+    The message is read once and the same parts are sent to every target.
+
+    Returns:
+        bool: `True` if every part was sent to every target.
+    """
+    parts, truncated = split.collect_parts(
+        _get_message_stream(args),
+        min(split.part_limit(config) for config in configs),
+        args.max_parts,
+        args.max_bytes,
+    )
+    if truncated:
+        log.warning(
+            'Only the first %s parts of the message are sent', len(parts)
+        )
+    success = True
+    for config in configs:
+        try:
+            split.send_parts(config, parts)
+        except NtfyrError as err:
+            _log_error(err, None)
+            success = False
+    return success
+
+
+def _follow(configs, args):
+    """Send each record from stdin as it arrives or in periodic summaries.
+
+    Each record is sent to every target in `configs`.
+
+    Returns:
+        bool: `True` if every record was sent.
+    """
+    delimiter = codecs.decode(args.delimiter, 'unicode_escape')
+    if args.digest is not None:
+        # Fail early if the config is invalid.
+        for config in configs:
+            config.prepare()
+        with Digest(args.digest, args.digest_count) as digest:
+            for record in _iter_records(sys.stdin, delimiter):
+                for config in configs:
+                    digest.add(config, record)
+        return not digest.failed
+    success = True
+    with contextlib.ExitStack() as stack:
+        clients = [
+            stack.enter_context(NtfyClient(config)) for config in configs
+        ]
+        for record in _iter_records(sys.stdin, delimiter):
+            for client in clients:
+                try:
+                    client.send(record)
+                except NtfyrError as err:
+                    _log_error(err, record)
+                    success = False
+    return success
+
+
+def _daemon(args):
+    from .daemon import Daemon
+    from .spool import Spool, SpoolDrainer
+
+    parsed_args = _parse_daemon_args(args)
+    _setup_logging(parsed_args)
+    # Exit through the context manager so the socket is removed.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    _refresh_timezone_on_sighup()
+    with contextlib.ExitStack() as stack:
+        daemon = stack.enter_context(Daemon(parsed_args.socket))
+        if parsed_args.spool:
+            spool = stack.enter_context(Spool(parsed_args.spool))
+            drainer = SpoolDrainer(
+                spool,
+                interval=parsed_args.drain_interval,
+                session=daemon.session,
+            )
+            drainer.start()
+            stack.callback(drainer.stop)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _flush(args):
+    from .spool import Spool
+
+    parsed_args = _parse_flush_args(args)
+    config = _configure(parsed_args)
+    if not config.spool:
+        raise NtfyrConfigException('No spool directory was given.')
+    with Spool(config.spool, config.spool_sync) as spool:
+        sent = spool.drain(batch_size=parsed_args.batch_size)
+        remaining = len(spool)
+    log.info('Sent %s spooled notifications, %s remaining', sent, remaining)
+    if remaining:
+        sys.exit(1)
+
+
+def _format_received(message, output_format):
+    if output_format == 'json':
+        return json.dumps(message.as_dict(), ensure_ascii=False)
+    if message.title:
+        return f'{message.title}: {message.message or ""}'
+    return message.message or ''
+
+
+def _subscribe(args):
+    from .subscription import subscribe
+
+    parsed_args = _parse_subscribe_args(args)
+    config = _configure(parsed_args)
+    if parsed_args.topic:
+        # ntfy subscribes to several topics separated by commas at once.
+        config.topic = ','.join(parsed_args.topic)
+    try:
+        for message in subscribe(
+            config,
+            since=parsed_args.since,
+            poll=parsed_args.poll,
+        ):
+            print(_format_received(message, parsed_args.format), flush=True)
+    except NtfyrError as err:
+        _log_error(err, None)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def _search(args):
+    from .archive import Archive
+
+    parsed_args = _parse_search_args(args)
+    config = _configure(parsed_args)
+    if not config.archive_path:
+        raise NtfyrConfigException('No archive was given.')
+    path = os.path.expanduser(config.archive_path)
+    if not os.path.exists(path):
+        raise NtfyrConfigException(f'The archive does not exist: {path}')
+    with Archive(path) as archive:
+        messages = archive.search(
+            text=' '.join(parsed_args.text),
+            topic=parsed_args.topic,
+            since=parsed_args.since,
+            until=parsed_args.until,
+            priority=priority_rank(parsed_args.priority) or None,
+            tags=parsed_args.tags,
+            limit=parsed_args.limit,
+        )
+    # Print the newest matches oldest first like a log.
+    for message in reversed(messages):
+        print(_format_received(message, parsed_args.format))
+
+
+_COMMANDS = {
+    'daemon': _daemon,
+    'flush': _flush,
+    'search': _search,
+    'subscribe': _subscribe,
+}
+
+
 def main(args: list[str] = None):  # noqa: D103
+    if args is None:
+        args = sys.argv[1:]
+    if args and args[0] in _COMMANDS:
+        _COMMANDS[args[0]](args[1:])
+        return
     parsed_args = _parse_args(args)
-    config = _configure(parsed_args)
+    if parsed_args.follow:
+        try:
+            if not _follow(_configure_targets(parsed_args), parsed_args):
+                sys.exit(1)
+        except NtfyrError as err:
+            _log_error(err, None)
+            sys.exit(1)
+        return
+    _setup_logging(parsed_args)
+    if parsed_args.split:
+        try:
+            if not _send_split(_configure_targets(parsed_args), parsed_args):
+                sys.exit(1)
+        except NtfyrError as err:
+            _log_error(err, None)
+            sys.exit(1)
+        return
     message = _get_message(parsed_args)
+    # The daemon would only add a hop for a file upload.
+    direct = parsed_args.no_daemon or parsed_args.file
     try:
-        notify(config, message)
+        if direct or not forward(parsed_args, message):
+            configs = _configure_targets(parsed_args)
+            if not _send_to_targets(
+                configs,
+                message,
+                parsed_args.file,
+                parsed_args.filename,
+            ):
+                sys.exit(1)
     except NtfyrError as err:
-        log.error(
-            f'Error sending to {err.server}/{err.topic}: '
-            f'{err.__class__.__name__}: {err.message}',
-        )
-        log.debug('Sent headers: %s', err.headers)
-        log.debug('Sent message:\n%s', message)
+        _log_error(err, message)
         sys.exit(1)
 
 
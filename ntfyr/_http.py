@@ -0,0 +1,180 @@
+"""A minimal HTTP transport built on `http.client`.
+
+This is a small stand-in for `requests.Session` for when importing `requests`
+costs more than the notification, like a single `ntfyr` CLI invocation. It
+only implements what `ntfyr` uses.
+"""
+
+
+import base64
+import http.client
+import json
+import threading
+import urllib.parse
+
+
+class ConnectError(ConnectionError):
+    """Indicates a connection to the server could not be made.
+
+    The request was never sent so it is always safe to try again.
+    """
+
+
+class Response:
+    """The parts of `requests.Response` that `ntfyr` uses.
+
+    Arguments:
+        status_code (int): The HTTP status code.
+        headers (http.client.HTTPMessage): The response headers.
+        content (bytes): The response body.
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):  # noqa: D102
+        return self.status_code < 400
+
+    def json(self):
+        """Return the body decoded as JSON."""
+        return json.loads(self.content)
+
+    def __repr__(self):  # noqa: D105
+        return f'<Response [{self.status_code}]>'
+
+
+def _split_timeout(timeout):
+    if isinstance(timeout, (tuple, list)):
+        return timeout
+    return timeout, timeout
+
+
+def _rewind(data, start):
+    """Return `True` if the body `data` can be sent again."""
+    if start is not None:
+        data.seek(start)
+        return True
+    # A file object that can not seek was already read.
+    return not hasattr(data, 'read')
+
+
+class Session:
+    """Send requests over keep-alive connections with `http.client`.
+
+    Idle connections are kept in a pool per host. Each request takes its own
+    connection from the pool so a session can be shared between threads.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, netloc, timeout):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(netloc, timeout=timeout)
+        elif scheme == 'http':
+            conn = http.client.HTTPConnection(netloc, timeout=timeout)
+        else:
+            raise ValueError(f'Unsupported URL scheme: {scheme}')
+        try:
+            conn.connect()
+        except OSError as err:
+            conn.close()
+            raise ConnectError(f'Failed to connect to {netloc}: {err}') from err
+        return conn, False
+
+    def _release(self, scheme, netloc, conn):
+        with self._lock:
+            self._idle.setdefault((scheme, netloc), []).append(conn)
+
+    def request(
+        self,
+        method,
+        url,
+        headers=None,
+        data=None,
+        auth=None,
+        timeout=None,
+    ):
+        """Send a request and return the `Response`.
+
+        Arguments:
+            method (str): The HTTP method.
+            url (str): The URL to send the request to.
+            headers (dict, optional): The request headers.
+            data (bytes or file object, optional): The request body. A file
+                object is streamed in chunks. Set `Content-Length` in
+                `headers` for files or the body is sent chunked.
+            auth (tuple, optional): A `(user, password)` for basic auth.
+            timeout (float or tuple, optional): Seconds to wait for the server,
+                or a `(connect, read)` tuple.
+
+        Raises:
+            ConnectError: If a connection to the server could not be made.
+            OSError: If the request failed after it was sent.
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        headers = dict(headers or {})
+        if auth:
+            credentials = base64.b64encode(':'.join(auth).encode()).decode()
+            headers['Authorization'] = f'Basic {credentials}'
+        connect_timeout, read_timeout = _split_timeout(timeout)
+        start = data.tell() if hasattr(data, 'seek') else None
+        while True:
+            conn, reused = self._connection(
+                parts.scheme, parts.netloc, connect_timeout
+            )
+            try:
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, body=data, headers=headers)
+                res = conn.getresponse()
+                content = res.read()
+            except (OSError, http.client.HTTPException) as err:
+                conn.close()
+                if (
+                    reused
+                    and isinstance(
+                        err,
+                        (http.client.RemoteDisconnected, ConnectionResetError),
+                    )
+                    and _rewind(data, start)
+                ):
+                    # The server closed the idle connection. Use a new one.
+                    continue
+                if isinstance(err, OSError):
+                    raise
+                raise ConnectionError(
+                    f'{err.__class__.__name__}: {err}'
+                ) from err
+            break
+        if res.will_close:
+            conn.close()
+        else:
+            self._release(parts.scheme, parts.netloc, conn)
+        return Response(res.status, res.headers, content)
+
+    def post(self, url, **kwargs):
+        """Send a POST request. See `request()`."""
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """Send a PUT request. See `request()`."""
+        return self.request('PUT', url, **kwargs)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
@@ -0,0 +1,306 @@
+"""Asyncio support for `ntfyr`.
+
+This requires the optional `aiohttp` dependency which can be installed with
+`pip install ntfyr[aio]`.
+"""
+
+
+import asyncio
+import base64
+import json
+import time
+
+import aiohttp
+
+from . import dedup, health, ratelimit
+from ._common import log
+from .errors import NtfyrError
+from .ntfyr import (
+    _format_message,
+    _get_credentials,
+    _get_headers,
+    _get_url,
+    _is_transient,
+)
+from .retry import Deadline, RetryPolicy, parse_retry_after
+
+DEFAULT_CONCURRENCY = 100
+"""The default number of requests allowed in flight per server."""
+
+
+class AsyncNtfyClient:
+    """An asyncio client that sends notifications over pooled connections.
+
+    Unlike `NtfyClient` this client is not bound to a single config so one
+    client can publish to any number of servers and topics. The number of
+    requests in flight to each server is limited by a semaphore. Failover
+    servers are tried the same as by `NtfyClient` and share its circuit
+    breakers. Spooling is not supported.
+
+    Arguments:
+        session (aiohttp.ClientSession, optional): A session to share with
+            other clients. A client never closes a session it was given.
+        concurrency (int, optional): The maximum number of requests in flight
+            per server.
+    """
+
+    def __init__(self, session=None, concurrency=DEFAULT_CONCURRENCY):
+        self._owns_session = session is None
+        self._session = session
+        self._concurrency = concurrency
+        self._semaphores = {}
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self._concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _get_semaphore(self, server):
+        if server not in self._semaphores:
+            self._semaphores[server] = asyncio.Semaphore(self._concurrency)
+        return self._semaphores[server]
+
+    async def send(self, config, message, block=True):
+        """Send a notification.
+
+        Arguments:
+            config (Config): The config to send the notification with.
+            message (str): The body of the message to be sent.
+            block (bool, optional): Wait for the client-side rate limit if
+                `True`. Raise `NtfyrRateLimitError` instead if `False`.
+
+        Returns:
+            dict: The message as returned by the server or `None` if the
+            message was suppressed as a duplicate.
+
+        Raises:
+            NtfyrError: If `config` is invalid or sets `spool`, or the server
+                rejects the message. The number of attempts made is in its
+                `attempts` attribute.
+        """
+        if config.spool:
+            raise NtfyrError(
+                'Spooling is not supported by the asyncio client.',
+                server=config.server,
+                topic=config.topic,
+            )
+        url = _get_url(config)
+        headers = _get_headers(config)
+        request_headers = headers
+        credentials = _get_credentials(config)
+        if credentials:
+            basic = base64.b64encode(':'.join(credentials).encode()).decode()
+            request_headers = dict(headers, Authorization=f'Basic {basic}')
+        if dedup.is_duplicate(config, message):
+            log.info('Suppressed duplicate notification to %s', url)
+            return None
+        try:
+            return await self._send_with_retries(
+                url, request_headers, config, message, headers, block
+            )
+        except NtfyrError:
+            dedup.forget(config, message)
+            raise
+
+    async def _send_with_retries(
+        self, url, request_headers, config, message, headers, block
+    ):
+        message = _format_message(config, message)
+        log.debug(
+            'Sending request: method=POST, url=%s, headers=%s, auth.user=%s, '
+            'data=%s',  # nofmt
+            url,
+            headers,
+            config.user,
+            message,
+        )
+        retry_policy = RetryPolicy.from_config(config)
+        deadline = Deadline(config.deadline)
+        attempt = 1
+        while True:
+            try:
+                await ratelimit.acquire_async(
+                    config, block, deadline.remaining()
+                )
+                return await self._post_with_failover(
+                    url, request_headers, config, message, headers, deadline
+                )
+            except NtfyrError as err:
+                err.attempts = attempt
+                if not _is_retryable(err):
+                    raise
+                delay = retry_policy.delay(attempt, err.retry_after)
+                if delay is None or not deadline.allows(delay):
+                    raise
+                log.warning(
+                    'Attempt %s of %s to send to %s failed: %s. Retrying in '
+                    '%.2f seconds.',
+                    attempt,
+                    retry_policy.max_attempts,
+                    url,
+                    err.message,
+                    delay,
+                )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _post_with_failover(
+        self, url, request_headers, config, message, headers, deadline
+    ):
+        """Post to the first server in `config.failover` that accepts it."""
+        args = (request_headers, config, message, headers, deadline)
+        if not config.failover:
+            return await self._post(url, config.server, *args)
+        error = None
+        for server, server_health in health.candidates(config):
+            server_url = (
+                url if server == config.server else (f'{server}/{config.topic}')
+            )
+            started = time.monotonic()
+            try:
+                response = await self._post(server_url, server, *args)
+            except NtfyrError as err:
+                if _is_transient(err):
+                    server_health.record_failure(config.circuit_threshold)
+                if not _is_retryable(err) or deadline.expired():
+                    raise
+                log.warning(
+                    'Failed to send to %s: %s. Trying the next server.',
+                    server,
+                    err.message,
+                )
+                error = err
+                continue
+            server_health.record_success(time.monotonic() - started)
+            return response
+        if error is not None:
+            raise error
+        raise NtfyrError(
+            'Every server is unavailable until its circuit breaker resets.',
+            server=config.server,
+            topic=config.topic,
+            message=message,
+            headers=headers,
+        )
+
+    async def _post(
+        self, url, server, request_headers, config, message, headers, deadline
+    ):
+        error_args = dict(
+            server=server,
+            topic=config.topic,
+            message=message,
+            headers=headers,
+        )
+        if deadline.expired():
+            raise NtfyrError(
+                'The deadline for sending the notification passed.',
+                **error_args,
+            )
+        connect, read = deadline.timeout(
+            config.connect_timeout, config.read_timeout
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=deadline.remaining(),
+            sock_connect=connect,
+            sock_read=read,
+        )
+        try:
+            async with self._get_semaphore(server):
+                async with self._get_session().post(
+                    url,
+                    headers=request_headers,
+                    data=message.encode('utf-8'),
+                    timeout=timeout,
+                ) as res:
+                    content = await res.read()
+                    status = res.status
+                    retry_after = res.headers.get('Retry-After')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise NtfyrError(
+                f'{err.__class__.__name__}: {err}',
+                **error_args,
+            ) from err
+        return _handle_response(
+            status, content, server, config, message, headers, retry_after
+        )
+
+    async def close(self):
+        """Close the connection pool if it is owned by this client."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _is_retryable(err):
+    """Return `True` if it is safe to send the message that caused `err` again.
+
+    This is the asyncio counterpart of `ntfyr.ntfyr._is_retryable`.
+    """
+    if err.status_code is not None:
+        return err.status_code == 429 or err.status_code >= 500
+    return isinstance(err.__cause__, aiohttp.ClientConnectorError)
+
+
+def _handle_response(
+    status,
+    content,
+    server,
+    config,
+    message,
+    headers,
+    retry_after=None,
+):
+    """Return the decoded response or raise `NtfyrError` for a failure."""
+    error_args = dict(
+        server=server,
+        topic=config.topic,
+        message=message,
+        headers=headers,
+        status_code=status,
+        retry_after=parse_retry_after(retry_after),
+    )
+    try:
+        body = json.loads(content)
+        log.debug('Got response: %s\n%s\n', status, body)
+    except json.JSONDecodeError:
+        log.error(
+            'Failed to decode response from ntfy. Got: %s',
+            content.decode(),
+        )
+        raise NtfyrError(f'{status} {content.decode()}', **error_args)
+    if status >= 400:
+        if body:
+            raise NtfyrError(
+                '{error} {link}'.format(
+                    error=body.get('error'),
+                    link=body.get('link', ''),
+                ),
+                **error_args,
+            )
+        raise NtfyrError(f'{status} {content.decode()}', **error_args)
+    return body
+
+
+async def notify(config, message):
+    """Send a notification.
+
+    This opens and closes a connection pool for each call. Use an
+    `AsyncNtfyClient` to send many notifications.
+
+    Arguments:
+        config (Config): The config to send the notification with.
+        message (str): The body of the message to be sent.
+
+    Returns:
+        dict: The message as returned by the server.
+    """
+    async with AsyncNtfyClient() as client:
+        return await client.send(config, message)
@@ -0,0 +1,287 @@
+"""A local archive of received notifications that can be searched.
+
+Messages received by `subscribe()` are stored in a SQLite database when
+`archive_path` is set in the config. The messages table is indexed on the
+topic, time and priority, tags are kept in their own indexed table and the
+title and message are in an FTS5 full text index, so `Archive.search()` and
+the `ntfyr search` command answer queries from local data in milliseconds.
+Messages are inserted in batches, one transaction every `flush_size`
+messages or `flush_interval` seconds.
+"""
+
+
+import json
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime as dt
+
+from ._common import log
+from .errors import NtfyrError
+from .subscription import Message
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+"""The default most seconds a received message waits to be stored."""
+DEFAULT_FLUSH_SIZE = 100
+"""The default most messages stored in one transaction."""
+DEFAULT_SEARCH_LIMIT = 100
+"""The default number of messages returned by a search."""
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    title TEXT,
+    message TEXT,
+    tags TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (server, id)
+);
+CREATE INDEX IF NOT EXISTS messages_topic_time ON messages (topic, time);
+CREATE INDEX IF NOT EXISTS messages_time ON messages (time);
+CREATE INDEX IF NOT EXISTS messages_priority_time
+    ON messages (priority, time);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (tag, seq)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS messages_tags AFTER INSERT ON messages BEGIN
+    INSERT OR IGNORE INTO tags (tag, seq)
+        SELECT value, new.seq FROM json_each(new.tags);
+END;
+'''
+_FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    title, message, content='messages', content_rowid='seq'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, title, message)
+        VALUES (new.seq, new.title, new.message);
+END;
+'''
+_INSERT = (
+    'INSERT OR IGNORE INTO messages (server, id, topic, time, priority, '
+    'title, message, tags, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_DURATION = re.compile(r'(\d+)([smhdw])')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_time(value):
+    """Return the Unix time `value` refers to.
+
+    Arguments:
+        value (str): A Unix timestamp, an ISO 8601 date and time or a
+            duration before now like `30m`, `12h`, `7d` or `1w2d`.
+
+    Raises:
+        ValueError: If `value` is not a time.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    durations = _DURATION.findall(value)
+    if durations and ''.join(n + unit for n, unit in durations) == value:
+        seconds = sum(int(n) * _DURATION_UNITS[unit] for n, unit in durations)
+        return int(time.time()) - seconds
+    return int(dt.fromisoformat(value).timestamp())
+
+
+def _fts_query(text):
+    """Return an FTS5 query matching every word of `text` as typed."""
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""')) for word in text.split()
+    )
+
+
+class Archive:
+    """A searchable archive of received messages.
+
+    Arguments:
+        path (str or os.PathLike): The database file. It is created if it does
+            not exist.
+        flush_interval (float, optional): The most seconds a message waits to
+            be stored.
+        flush_size (int, optional): The most messages stored in one
+            transaction.
+
+    Attributes:
+        full_text (bool): `True` if SQLite has FTS5 and text searches use the
+            full text index. Otherwise they scan the messages.
+    """
+
+    def __init__(
+        self,
+        path,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        flush_size=DEFAULT_FLUSH_SIZE,
+    ):
+        self.path = pathlib.Path(path).expanduser()
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flushed = time.monotonic()
+        self._db = sqlite3.connect(
+            self.path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError as err:
+            log.warning('Text searches will be slow: %s', err)
+            self.full_text = False
+
+    def add(self, server, message):
+        """Store a message received from `server`.
+
+        The message is inserted with the next batch.
+        """
+        fields = message.as_dict()
+        with self._lock:
+            self._pending.append(
+                (
+                    server,
+                    message.id,
+                    message.topic or '',
+                    message.time or int(time.time()),
+                    message.priority or 3,
+                    message.title,
+                    message.message,
+                    json.dumps(message.tags or []),
+                    json.dumps(fields),
+                )
+            )
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        """Store the pending messages if they have waited long enough."""
+        with self._lock:
+            due = len(self._pending) >= self.flush_size or (
+                self._pending
+                and time.monotonic() - self._flushed >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Store the pending messages now in one transaction.
+
+        Messages already in the archive are skipped.
+        """
+        with self._lock:
+            self._flushed = time.monotonic()
+            if not self._pending:
+                return
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany(_INSERT, self._pending)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            self._pending.clear()
+
+    def search(
+        self,
+        text=None,
+        topic=None,
+        since=None,
+        until=None,
+        priority=None,
+        tags=(),
+        limit=DEFAULT_SEARCH_LIMIT,
+    ):
+        """Return the archived messages that match every given filter.
+
+        Arguments:
+            text (str, optional): Words that must all be in the title or
+                message.
+            topic (str, optional): The topic of the messages.
+            since (int, optional): The earliest Unix time of the messages.
+            until (int, optional): The Unix time the messages are before.
+            priority (int, optional): The lowest priority of the messages.
+            tags (list, optional): Tags the messages must all have.
+            limit (int, optional): The most messages returned.
+
+        Returns:
+            list: The matching `Message` objects, newest first.
+        """
+        self.flush()
+        where = []
+        params = []
+        text = text.strip() if text else None
+        if text and self.full_text:
+            where.append(
+                'seq IN (SELECT rowid FROM messages_fts '
+                'WHERE messages_fts MATCH ?)'
+            )
+            params.append(_fts_query(text))
+        elif text:
+            for word in text.split():
+                where.append(
+                    "(ifnull(title, '') || ' ' || ifnull(message, '')) LIKE ?"
+                )
+                params.append(f'%{word}%')
+        for column, operator, value in (
+            ('topic', '=', topic),
+            ('time', '>=', since),
+            ('time', '<', until),
+            ('priority', '>=', priority),
+        ):
+            if value is not None:
+                where.append(f'{column} {operator} ?')
+                params.append(value)
+        for tag in tags:
+            where.append('seq IN (SELECT seq FROM tags WHERE tag = ?)')
+            params.append(tag)
+        matches = 'SELECT seq FROM messages'
+        if where:
+            matches += ' WHERE ' + ' AND '.join(where)
+        # Sort the matches before reading the stored messages so only the
+        #   ones returned are read when many match.
+        query = (
+            f'SELECT data FROM messages WHERE seq IN ({matches} '
+            'ORDER BY time DESC, seq DESC LIMIT ?) '
+            'ORDER BY time DESC, seq DESC'
+        )
+        params.append(limit)
+        with self._lock:
+            try:
+                rows = self._db.execute(query, params).fetchall()
+            except sqlite3.OperationalError as err:
+                raise NtfyrError(f'Failed to search {self.path}: {err}')
+        return [Message.from_json(json.loads(data)) for data, in rows]
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            (count,) = self._db.execute(
+                'SELECT COUNT(*) FROM messages'
+            ).fetchone()
+        return count
+
+    def close(self):
+        """Store the pending messages and close the database."""
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,119 @@
+"""Files uploaded as ntfy attachments.
+
+The file is sent as the body of a `PUT` request with a `Filename` header. It
+is streamed from the file object in chunks by the transport so memory use
+does not depend on the size of the file. The message goes in the `Message`
+header.
+"""
+
+
+import base64
+import contextlib
+import io
+import os
+
+
+def _header_value(text):
+    """Return `text` in a form that can be sent in an HTTP header.
+
+    ntfy turns a literal `\\n` into a new line and decodes RFC 2047 encoded
+    words, so text that is not latin-1 is sent base64 encoded.
+    """
+    text = text.replace('\r\n', '\n').replace('\n', '\\n')
+    try:
+        text.encode('latin-1')
+    except UnicodeEncodeError:
+        encoded = base64.b64encode(text.encode('utf-8')).decode()
+        return f'=?UTF-8?B?{encoded}?='
+    return text
+
+
+class Attachment:
+    """A file to upload as the body of a notification.
+
+    Arguments:
+        file (file object): A binary file object positioned at the start of
+            the data to send.
+        filename (str, optional): The name shown for the attachment. Defaults
+            to the name of `file` without its directory.
+
+    Attributes:
+        size (int): The number of bytes that will be sent or `None` if the
+            size of `file` can not be found.
+    """
+
+    __slots__ = ('file', 'filename', 'size', '_start', '_sent')
+
+    def __init__(self, file, filename=None):
+        self.file = file
+        name = getattr(file, 'name', None)
+        if not filename and isinstance(name, (str, bytes, os.PathLike)):
+            filename = os.path.basename(os.fsdecode(name))
+        self.filename = filename or 'attachment'
+        try:
+            self._start = file.tell()
+        except (AttributeError, OSError):
+            self._start = None
+        self.size = self._size()
+        self._sent = False
+
+    def _size(self):
+        try:
+            return os.fstat(self.file.fileno()).st_size - (self._start or 0)
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        if self._start is None:
+            return None
+        try:
+            end = self.file.seek(0, os.SEEK_END)
+            self.file.seek(self._start)
+        except (AttributeError, OSError):
+            return None
+        return end - self._start
+
+    def rewind(self):
+        """Return the file ready to be sent, seeking back for a new attempt.
+
+        Returns:
+            file object: The file or `None` if it was already sent and can not
+            be sent again because it is not seekable.
+        """
+        if self._sent:
+            if self._start is None:
+                return None
+            self.file.seek(self._start)
+        self._sent = True
+        return self.file
+
+    def headers(self, headers, message):
+        """Return `headers` with the attachment headers added.
+
+        Arguments:
+            headers (dict): The ntfy headers of the notification.
+            message (str): The message shown with the attachment. Not sent if
+                it is empty.
+        """
+        headers = dict(headers)
+        headers['Filename'] = _header_value(self.filename)
+        if message:
+            headers['Message'] = _header_value(message)
+        if self.size is not None:
+            headers['Content-Length'] = str(self.size)
+        return headers
+
+
+@contextlib.contextmanager
+def open_attachment(body, filename=None):
+    """Yield an `Attachment` for a path or a binary file object.
+
+    Files opened from a path are closed on exit. File objects are left open.
+
+    Arguments:
+        body (str, os.PathLike or file object): The file to send.
+        filename (str, optional): The name shown for the attachment.
+    """
+    if isinstance(body, (str, bytes, os.PathLike)):
+        with open(body, 'rb') as file:
+            yield Attachment(file, filename)
+    else:
+        yield Attachment(body, filename)
@@ -0,0 +1,263 @@
+"""Fire-and-forget notifications sent from background threads.
+
+`notify_async_background()` puts a notification on a bounded in-memory queue
+and returns a future right away. Worker threads send the queued notifications
+over pooled keep-alive connections. The queue is drained when the interpreter
+exits, for at most `DEFAULT_EXIT_TIMEOUT` seconds.
+"""
+
+
+import atexit
+import collections
+import dataclasses
+import threading
+import time
+from concurrent.futures import Future
+
+from . import dedup
+from ._common import log
+from .errors import NtfyrError, NtfyrQueueFullError
+from .ntfyr import NtfyClient, _format_message, _get_default_session
+
+DEFAULT_QUEUE_SIZE = 1000
+"""The default number of notifications that can wait to be sent."""
+DEFAULT_WORKERS = 1
+"""The default number of threads sending notifications."""
+DEFAULT_EXIT_TIMEOUT = 5.0
+"""The default number of seconds to keep sending when the interpreter exits."""
+FULL_POLICIES = ['block', 'drop_oldest', 'drop_newest']
+"""What to do with a new notification when the queue is full."""
+
+_QUEUE_FULL = 'The notification was dropped because the queue was full.'
+
+_default_sender = None
+_default_sender_lock = threading.Lock()
+
+
+class BackgroundSender:
+    """Send notifications from a bounded queue in background threads.
+
+    The timestamp is added when a notification is submitted, not when it is
+    sent. Duplicates are checked against the message without the timestamp
+    when it is sent, the same as by `NtfyClient`. Failed notifications are
+    logged and their future is set to the `NtfyrError`.
+
+    Arguments:
+        queue_size (int, optional): The number of notifications that can wait
+            to be sent.
+        workers (int, optional): The number of threads sending notifications.
+        full_policy (str, optional): What `submit()` does when the queue is
+            full. `'block'` waits for room in the queue, `'drop_oldest'` drops
+            the notification that has waited longest and `'drop_newest'` drops
+            the new notification. Futures of dropped notifications are set to
+            `NtfyrQueueFullError`.
+        exit_timeout (float, optional): Seconds to keep sending queued
+            notifications when the interpreter exits.
+        session (requests.Session, optional): The session to send with.
+            Defaults to the session shared by `notify()` calls for the
+            transport in each config.
+
+    Raises:
+        ValueError: If `full_policy` is invalid.
+    """
+
+    def __init__(
+        self,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        workers=DEFAULT_WORKERS,
+        full_policy='block',
+        exit_timeout=DEFAULT_EXIT_TIMEOUT,
+        session=None,
+    ):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f'Invalid queue full policy: {full_policy}')
+        self.queue_size = queue_size
+        self.full_policy = full_policy
+        self.exit_timeout = exit_timeout
+        self.session = session
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._workers = [
+            threading.Thread(
+                target=self._work,
+                name=f'ntfyr-background-{index}',
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self._close_at_exit)
+
+    def submit(self, config, message):
+        """Queue a notification to be sent.
+
+        Arguments:
+            config (Config): The config to send the notification with.
+            message (str): The body of the message to be sent.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the message returned by the
+            server or the `NtfyrError` raised while sending it.
+
+        Raises:
+            NtfyrError: If the sender is closed.
+        """
+        future = Future()
+        body = _format_message(config, message)
+        config = dataclasses.replace(config, tags=list(config.tags))
+        item = (config, message, body, future)
+        with self._condition:
+            if self._closed:
+                raise NtfyrError('The background sender is closed.')
+            if len(self._queue) >= self.queue_size:
+                if self.full_policy == 'drop_newest':
+                    _fail(item, NtfyrQueueFullError, _QUEUE_FULL)
+                    return future
+                if self.full_policy == 'drop_oldest':
+                    _fail(
+                        self._queue.popleft(), NtfyrQueueFullError, _QUEUE_FULL
+                    )
+                else:
+                    self._condition.wait_for(
+                        lambda: len(self._queue) < self.queue_size
+                        or self._closed
+                    )
+                    if self._closed:
+                        raise NtfyrError('The background sender is closed.')
+            self._queue.append(item)
+            self._condition.notify_all()
+        return future
+
+    def __len__(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _next(self):
+        """Return the next queued notification or `None` once closed."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closed)
+            if not self._queue:
+                return None
+            item = self._queue.popleft()
+            self._condition.notify_all()
+            return item
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            config, message, body, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if dedup.is_duplicate(config, message):
+                log.info(
+                    'Suppressed duplicate notification to %s/%s',
+                    config.server,
+                    config.topic,
+                )
+                future.set_result(None)
+                continue
+            # The timestamp was already added and duplicates checked.
+            send_config = dataclasses.replace(
+                config, include_timestamp=False, dedup_ttl=None
+            )
+            session = self.session or _get_default_session(config.transport)
+            try:
+                with NtfyClient(send_config, session=session) as client:
+                    future.set_result(client.send(body))
+            except NtfyrError as err:
+                dedup.forget(config, message)
+                log.error(
+                    'Failed to send notification to %s/%s: %s',
+                    config.server,
+                    config.topic,
+                    err.message,
+                )
+                future.set_exception(err)
+            except Exception as err:
+                # Keep the worker alive no matter what goes wrong.
+                log.exception('Unexpected error sending notification')
+                dedup.forget(config, message)
+                future.set_exception(err)
+
+    def close(self, timeout=None):
+        """Stop accepting notifications and send the ones already queued.
+
+        Arguments:
+            timeout (float, optional): The most seconds to wait for the queue
+                to drain. Notifications still queued after that are dropped.
+                Waits until every notification is sent if `None`.
+        """
+        with self._condition:
+            already_closed = self._closed
+            self._closed = True
+            self._condition.notify_all()
+        if already_closed:
+            return
+        atexit.unregister(self._close_at_exit)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            if deadline is None:
+                worker.join()
+            else:
+                worker.join(max(0.0, deadline - time.monotonic()))
+        with self._condition:
+            dropped = list(self._queue)
+            self._queue.clear()
+        if dropped:
+            log.warning(
+                'Dropped %s notifications that were not sent in time',
+                len(dropped),
+            )
+        for item in dropped:
+            _fail(item, NtfyrError, 'The sender was closed before sending.')
+
+    def _close_at_exit(self):
+        self.close(self.exit_timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _fail(item, error_class, error):
+    """Set the future of a notification that will not be sent."""
+    config, _, body, future = item
+    if future.set_running_or_notify_cancel():
+        future.set_exception(
+            error_class(
+                error,
+                server=config.server,
+                topic=config.topic,
+                message=body,
+            )
+        )
+
+
+def notify_async_background(config, message):
+    """Send a notification from a background thread.
+
+    This returns right away. The notification is queued in a
+    `BackgroundSender` shared by every call, with the default queue size and
+    the `'block'` policy. Create a `BackgroundSender` for other settings.
+
+    Arguments:
+        config (Config): The config to send the notification with.
+        message (str): The body of the message to be sent.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the message returned by the
+        server or the `NtfyrError` raised while sending it.
+    """
+    global _default_sender
+
+    with _default_sender_lock:
+        if _default_sender is None:
+            _default_sender = BackgroundSender()
+        sender = _default_sender
+    return sender.submit(config, message)
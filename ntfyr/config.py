@@ -5,13 +5,27 @@ This is just the backend of the ntfyr script.
 
 
 import argparse
-import configparser
+import contextlib
+import functools
 import os
 import pathlib
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, replace
 
 from ._common import log
+from .dedup import DEFAULT_DEDUP_SIZE
 from .errors import NtfyrConfigException
+from .health import (
+    DEFAULT_CIRCUIT_RESET,
+    DEFAULT_CIRCUIT_THRESHOLD,
+    FAILOVER_POLICIES,
+)
+from .retry import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_RETRY_MAX_DELAY,
+)
 
 DEFAULT_SERVER = 'https://ntfy.sh'
 DEFAULT_TIMESTAMP = '%Y-%m-%d %H:%M:%S %Z'
@@ -28,6 +42,39 @@ PRIORITIES = [
     '4',
     '5',
 ]
+_PRIORITY_RANKS = {
+    'min': 1,
+    'low': 2,
+    'default': 3,
+    'high': 4,
+    'urgent': 5,
+    'max': 5,
+}
+SPOOL_SYNC_MODES = ['off', 'normal', 'full']
+TRANSPORTS = ['requests', 'stdlib']
+CONFIG_FILE_CACHE_SIZE = 32
+"""The number of parsed config files kept in memory."""
+
+_search_result = None
+"""The signature and values of the last `Config.search()` in this process."""
+_POSITIVE_KEYS = (
+    'rate_limit',
+    'rate_burst',
+    'topic_rate_limit',
+    'topic_rate_burst',
+)
+
+
+def priority_rank(priority):
+    """Return the number from 1 to 5 of a priority in `PRIORITIES`.
+
+    Returns:
+        int: The rank of `priority`, higher is more urgent, or 0 if it is
+        `None`.
+    """
+    if priority is None:
+        return 0
+    return _PRIORITY_RANKS.get(priority) or int(priority)
 
 
 def _config_paths():
@@ -55,36 +102,192 @@ def _config_paths():
     return [pathlib.Path(p) for p in paths]
 
 
+def _stat_signature(path):
+    """Return what identifies the current contents of `path`.
+
+    The change time is included since it changes with the permissions and
+    when the modification time is set back.
+
+    Returns:
+        list: The modification and change time, size, inode and mode of
+        `path` or `None` if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    except OSError:
+        # Unreadable files are reported when they are read.
+        return [None, None, None, None, None]
+    return [
+        stat.st_mtime_ns,
+        stat.st_ctime_ns,
+        stat.st_size,
+        stat.st_ino,
+        stat.st_mode,
+    ]
+
+
+@functools.lru_cache(maxsize=CONFIG_FILE_CACHE_SIZE)
+def _read_config_file(path, signature):
+    """Return the sections of the config file at `path` by name.
+
+    The result is cached for each `signature` so a file is only parsed again
+    after it changes. Errors are not cached.
+
+    Raises:
+        OSError: If the file can not be read.
+        NtfyrConfigException: If the file has no `[ntfyr]` section.
+    """
+    config_text = path.read_text()
+    import configparser
+
+    confparser = configparser.ConfigParser(defaults={})
+    confparser.read_string(config_text)
+    if not confparser.has_section('ntfyr'):
+        raise NtfyrConfigException(f'Invalid config source: {path}')
+    return {name: dict(confparser[name]) for name in confparser.sections()}
+
+
+def _read_source(path):
+    """Return the `[ntfyr]` section of the config file at `path`.
+
+    Returns:
+        dict: The values in the file, empty if it does not exist, or `None`
+        if it could not be read.
+    """
+    signature = _stat_signature(path)
+    if signature is None:
+        log.warning('The config source "%s" does not exist.', path)
+        return {}
+    try:
+        # Copy so changes by the caller do not leak into the cache.
+        return dict(_read_config_file(path, tuple(signature))['ntfyr'])
+    except OSError as err:
+        log.warning(
+            'Failed to read config source %s: %s: %s',
+            path.absolute(),
+            err.__class__.__name__,
+            err,
+        )
+        return None
+
+
 def _convert_source(source):
     if hasattr(source, 'get') and hasattr(source, '__contains__'):
         return source
     elif isinstance(source, argparse.Namespace):
         return NamespaceAdapter(source)
     elif isinstance(source, (str, pathlib.Path)):
-        source = pathlib.Path(source)
-        if not source.exists():
-            log.warning('The config source "%s" does not exist.', source)
-            return {}
-        try:
-            config_text = source.read_text()
-        except OSError as err:
-            log.warning(
-                'Failed to read config source %s: %s: %s',
-                source.absolute(),
-                err.__class__.__name__,
-                err,
-            )
-            return {}
-        confparser = configparser.ConfigParser(defaults={})
-        confparser.read_string(config_text)
-        try:
-            return dict(confparser['ntfyr'])
-        except KeyError:
-            raise NtfyrConfigException(f'Invalid config source: {source}')
+        source = _read_source(pathlib.Path(source))
+        return {} if source is None else source
     else:
         raise NtfyrConfigException(f'Unknown source type {source}')
 
 
+def _read_targets(paths):
+    """Return the named target lists in the `[targets]` section of `paths`.
+
+    A list in a later file replaces a list with the same name in an earlier
+    file. Missing and unreadable files are skipped since they are reported
+    when the `[ntfyr]` section is read.
+    """
+    targets = {}
+    for path in paths:
+        path = pathlib.Path(path)
+        signature = _stat_signature(path)
+        if signature is None:
+            continue
+        try:
+            sections = _read_config_file(path, tuple(signature))
+        except OSError:
+            continue
+        targets.update(sections.get('targets', {}))
+    return targets
+
+
+def _parse_target(entry, servers):
+    """Return the `(server, topic)` pairs for an entry in a target list.
+
+    An entry is either a URL like `https://ntfy.sh/alerts` or a topic that
+    is sent to each of `servers`.
+    """
+    if '://' not in entry:
+        return [(server, entry) for server in servers]
+    server, _, topic = entry.rstrip('/').rpartition('/')
+    if not topic or '://' not in server or server.endswith('/'):
+        raise NtfyrConfigException(f'Invalid target: {entry}')
+    return [(server, topic)]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _search_cache_path():
+    """Return the file the result of `Config.search()` is cached in.
+
+    `NTFYR_CONFIG_CACHE` is used if it is set and the cache is disabled if it
+    is empty. Otherwise the cache is kept in `$XDG_CACHE_HOME/ntfyr` or
+    `~/.cache/ntfyr`.
+
+    Returns:
+        pathlib.Path: The cache file or `None` if there is nowhere to keep it.
+    """
+    if 'NTFYR_CONFIG_CACHE' in os.environ:
+        path = os.environ['NTFYR_CONFIG_CACHE']
+        return pathlib.Path(path) if path else None
+    if os.environ.get('XDG_CACHE_HOME'):
+        return pathlib.Path(
+            os.environ['XDG_CACHE_HOME'], 'ntfyr', 'config.json'
+        )
+    if os.environ.get('HOME'):
+        return pathlib.Path(
+            os.environ['HOME'], '.cache', 'ntfyr', 'config.json'
+        )
+    return None
+
+
+def _load_search_cache(cache_path, signature):
+    """Return the cached search result for `signature` or `None`."""
+    import json
+
+    try:
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('signature') != signature:
+        return None
+    return cached.get('values')
+
+
+def _save_search_cache(cache_path, signature, values):
+    """Write the search result for `signature` to `cache_path`.
+
+    The cache may hold credentials so it is only readable by its owner. It
+    is replaced atomically so concurrent invocations never read a partial
+    file. Failing to write the cache is not an error.
+    """
+    import json
+
+    tmp_path = cache_path.with_name(f'.{cache_path.name}.{os.getpid()}')
+    try:
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump({'signature': signature, 'values': values}, cache_file)
+        os.replace(tmp_path, cache_path)
+    except OSError as err:
+        log.debug('Failed to write the config cache %s: %s', cache_path, err)
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
+
+
 class NamespaceAdapter:
     """An adapter for `argparse.Namespace` objects.
 
@@ -134,6 +337,28 @@ class Config:
     user: str = None
     password: str = None
     token: str = None
+    spool: str = None
+    spool_sync: str = 'normal'
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    retry_delay: float = DEFAULT_RETRY_DELAY
+    retry_max_delay: float = DEFAULT_RETRY_MAX_DELAY
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_READ_TIMEOUT
+    deadline: float = None
+    rate_limit: float = None
+    rate_burst: int = None
+    topic_rate_limit: float = None
+    topic_rate_burst: int = None
+    transport: str = 'requests'
+    dedup_ttl: float = None
+    dedup_size: int = DEFAULT_DEDUP_SIZE
+    dedup_path: str = None
+    cursor_path: str = None
+    archive_path: str = None
+    failover: list[str] = field(default_factory=list)
+    failover_policy: str = 'ordered'
+    circuit_threshold: int = DEFAULT_CIRCUIT_THRESHOLD
+    circuit_reset: float = DEFAULT_CIRCUIT_RESET
 
     def get(self, key, default=None):
         if key in self.__dict__:
@@ -141,8 +366,81 @@ class Config:
         return default
 
     def search(self):
-        for source in _config_paths():
-            self.update(source)
+        """Update the config from the config files in the default locations.
+
+        The merged and validated values are cached in memory and on disk
+        along with the modification and change time, size, inode and mode of
+        every config file. The files are only parsed again when one of them
+        changes. The cache on disk also records the names of the config
+        fields so it is not used by a version of ntfyr that reads different
+        keys. Nothing is cached if a config file could not be read.
+        """
+        global _search_result
+
+        paths = _config_paths()
+        signature = [[str(p), _stat_signature(p)] for p in paths]
+        values = None
+        if _search_result and _search_result[0] == signature:
+            values = _search_result[1]
+        cache_path = _search_cache_path()
+        cache_key = [sorted(f.name for f in fields(self)), signature]
+        if values is None and cache_path:
+            values = _load_search_cache(cache_path, cache_key)
+        if values is None:
+            values, complete = self._search(paths)
+            if not complete:
+                # Read the files again next time instead of keeping a result
+                #   that is missing the unreadable ones.
+                _search_result = None
+                self._set_values(values)
+                return self
+            if cache_path:
+                _save_search_cache(cache_path, cache_key, values)
+        else:
+            for path, stat in signature:
+                if stat is None:
+                    log.warning('The config source "%s" does not exist.', path)
+        _search_result = (signature, values)
+        self._set_values(values)
+        return self
+
+    def _set_values(self, values):
+        for key, value in values.items():
+            setattr(
+                self, key, list(value) if isinstance(value, list) else value
+            )
+
+    @classmethod
+    def _search(cls, paths):
+        """Return the values set by the config files at `paths`.
+
+        Returns:
+            tuple: The values and `False` if a config file could not be read.
+        """
+        config = cls()
+        keys = set()
+        complete = True
+        for path in paths:
+            source = _read_source(path)
+            if source is None:
+                complete = False
+                continue
+            keys.update(key for key in cls.__annotations__ if key in source)
+            config.update(source)
+        if 'timestamp' in keys:
+            keys.add('include_timestamp')
+        return {key: config.get(key) for key in sorted(keys)}, complete
+
+    def prepare(self):
+        """Return a `PreparedNotification` for sending with this config.
+
+        Raises:
+            NtfyrError: If the config is missing a server or topic, or has
+                invalid authentication settings.
+        """
+        from .ntfyr import PreparedNotification
+
+        return PreparedNotification(self)
 
     def update(self, source):
         source = _convert_source(source)
@@ -153,6 +451,26 @@ class Config:
             if key == 'priority':
                 self._typed_set(key, value, required_type, PRIORITIES)
                 continue
+            if key == 'spool_sync':
+                self._typed_set(key, value, required_type, SPOOL_SYNC_MODES)
+                continue
+            if key == 'transport':
+                self._typed_set(key, value, required_type, TRANSPORTS)
+                continue
+            if key == 'failover_policy':
+                self._typed_set(key, value, required_type, FAILOVER_POLICIES)
+                continue
+            if key == 'failover':
+                # Config files list the servers separated by commas or
+                #   whitespace.
+                if isinstance(value, str):
+                    value = value.replace(',', ' ').split()
+                if not isinstance(value, (list, tuple)):
+                    raise NtfyrConfigException(
+                        f'Invalid value for `failover`: {value}',
+                    )
+                self.failover = [str(server) for server in value]
+                continue
             if key == 'tags':
                 if value and not isinstance(value, (list, tuple)):
                     value = [str(value)]
@@ -168,9 +486,23 @@ class Config:
             if key == 'timestamp' and source.get('timestamp'):
                 self.include_timestamp = True
             self._typed_set(key, source.get(key, self.get(key)), required_type)
+            value = getattr(self, key)
+            if key in _POSITIVE_KEYS and value is not None and not value > 0:
+                raise NtfyrConfigException(
+                    f'Invalid value for `{key}`: {value} is not positive',
+                )
         return self
 
     def _typed_set(self, attr, value, required_type, choices=None):
+        if required_type in (int, float) and not isinstance(value, bool):
+            # Numbers from config files are strings
+            try:
+                if isinstance(value, (str, int)):
+                    value = required_type(value)
+            except ValueError:
+                raise NtfyrConfigException(
+                    f'Invalid value for `{attr}`: {value}'
+                )
         if not isinstance(value, required_type):
             raise NtfyrConfigException(f'Invalid value for `{attr}`: {value}')
         if choices and value not in choices:
@@ -179,10 +511,63 @@ class Config:
 
     @classmethod
     def from_args(cls, args):
+        """Return the config for parsed CLI arguments.
+
+        Only the first server and topic are used if several are given. Use
+        `targets_from_args()` to get a config for each of them.
+        """
         config = cls()
         for config_filename in args.config:
             config.update(config_filename)
         if not args.config:
             config.search()
-        config.update(args)
+        first = {
+            key: next(iter(_as_list(getattr(args, key, None))), None)
+            for key in ('server', 'topic')
+        }
+        config.update(argparse.Namespace(**dict(vars(args), **first)))
         return config
+
+    @classmethod
+    def targets_from_args(cls, args):
+        """Return a config for each target of parsed CLI arguments.
+
+        Every server in `args.server` is combined with every topic in
+        `args.topic`. The lists named in `args.target` are looked up in the
+        `[targets]` section of the config files. The server and topic from
+        the config files are used if none are given. Each target is only
+        included once.
+
+        Returns:
+            list: A `Config` for each target. If no topic was given at all
+            the only config has no topic.
+
+        Raises:
+            NtfyrConfigException: If a target list does not exist or has an
+                invalid entry.
+        """
+        names = getattr(args, 'target', None) or []
+        config = cls.from_args(
+            argparse.Namespace(**dict(vars(args), server=None, topic=None))
+        )
+        servers = _as_list(getattr(args, 'server', None)) or [config.server]
+        topics = _as_list(getattr(args, 'topic', None))
+        if not topics and not names:
+            topics = [config.topic]
+        targets = [(server, topic) for server in servers for topic in topics]
+        if names:
+            target_lists = _read_targets(args.config or _config_paths())
+            for name in names:
+                if name not in target_lists:
+                    raise NtfyrConfigException(f'Unknown target list: {name}')
+                for entry in target_lists[name].replace(',', ' ').split():
+                    targets.extend(_parse_target(entry, servers))
+        return [
+            replace(
+                config,
+                server=server,
+                topic=topic,
+                tags=list(config.tags),
+            )
+            for server, topic in dict.fromkeys(targets)
+        ]
@@ -0,0 +1,251 @@
+"""Where subscriptions left off.
+
+A cursor file keeps the ID and time of the last message received for each
+server and topic, so a subscription resumes after a restart with
+`since=<id>` and does not fetch the server's whole cache. The IDs of the
+last `SEEN_SIZE` messages are kept too, so messages received again at the
+boundary are dropped. The file is replaced atomically and synced to disk,
+along with its directory, so a crash leaves either the old or the new
+cursors. It is only written every `flush_interval` seconds or `flush_size`
+messages and when it is closed.
+"""
+
+
+import collections
+import contextlib
+import json
+import os
+import pathlib
+import threading
+import time
+
+from ._common import log
+
+SEEN_SIZE = 64
+"""The number of recent message IDs kept to drop duplicates."""
+DEFAULT_FLUSH_INTERVAL = 5.0
+"""The default most seconds between writes of a changed cursor file."""
+DEFAULT_FLUSH_SIZE = 100
+"""The default most messages received between writes of the cursor file."""
+
+
+def _fsync_directory(path):
+    """Make a file replaced in the directory at `path` survive a crash."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _is_valid(value):
+    """Return `True` if `value` is a cursor as saved by `Cursor.as_dict()`."""
+    if not isinstance(value, dict) or not set(value) <= {'id', 'time', 'seen'}:
+        return False
+    seen = value.get('seen', [])
+    return (
+        isinstance(value.get('id'), (str, type(None)))
+        and (
+            value.get('time') is None
+            or (
+                isinstance(value['time'], int)
+                and not isinstance(value['time'], bool)
+            )
+        )
+        and isinstance(seen, list)
+        and all(isinstance(message_id, str) for message_id in seen)
+    )
+
+
+class Cursor:
+    """Where one subscription left off.
+
+    Arguments:
+        id (str, optional): The ID of the last message received.
+        time (int, optional): The time of the last message received.
+        seen (list, optional): The IDs of the last messages received, oldest
+            first.
+    """
+
+    __slots__ = ('id', 'time', '_seen', '_seen_ids')
+
+    def __init__(self, id=None, time=None, seen=()):
+        self.id = id
+        self.time = time
+        self._seen = collections.deque(maxlen=SEEN_SIZE)
+        self._seen_ids = set()
+        for message_id in seen:
+            self._remember(message_id)
+
+    def _remember(self, message_id):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_ids.discard(self._seen[0])
+        self._seen.append(message_id)
+        self._seen_ids.add(message_id)
+
+    def is_new(self, message):
+        """Return `False` if `message` was already received.
+
+        A message is a duplicate if its ID is one of the recent IDs or it is
+        older than the last message received.
+        """
+        if message.id in self._seen_ids:
+            return False
+        return (
+            self.time is None
+            or message.time is None
+            or (message.time >= self.time)
+        )
+
+    def advance(self, message):
+        """Move the cursor past `message`."""
+        self.id = message.id
+        if message.time is not None:
+            self.time = message.time
+        self._remember(message.id)
+
+    def as_dict(self):
+        """Return the cursor as it is saved."""
+        return {'id': self.id, 'time': self.time, 'seen': list(self._seen)}
+
+
+class Cursors:
+    """The cursors of every subscription saved in one file.
+
+    Arguments:
+        path (str or os.PathLike): The cursor file. It is created when the
+            first cursor is written.
+        flush_interval (float, optional): The most seconds a received message
+            waits to be written.
+        flush_size (int, optional): The most messages received before the
+            file is written.
+        before_flush (callable, optional): Called before the file is written,
+            to store the messages received up to the cursors elsewhere first.
+    """
+
+    def __init__(
+        self,
+        path,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        flush_size=DEFAULT_FLUSH_SIZE,
+        before_flush=None,
+    ):
+        self.path = pathlib.Path(path).expanduser()
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.before_flush = before_flush
+        self._cursors = {
+            key: Cursor(**value) for key, value in self._load().items()
+        }
+        self._dirty = set()
+        self._pending = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as cursor_file:
+                cursors = json.load(cursor_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            log.warning('Ignoring the cursor file %s: %s', self.path, err)
+            return {}
+        if not isinstance(cursors, dict):
+            log.warning('Ignoring the invalid cursor file %s', self.path)
+            return {}
+        valid = {}
+        for key, value in cursors.items():
+            if _is_valid(value):
+                valid[key] = value
+            else:
+                log.warning(
+                    'Ignoring the invalid cursor %s in %s', key, self.path
+                )
+        return valid
+
+    def get(self, server, topic):
+        """Return the cursor of the subscription to `topic` on `server`."""
+        key = f'{server}/{topic}'
+        with self._lock:
+            if key not in self._cursors:
+                self._cursors[key] = Cursor()
+            return self._cursors[key]
+
+    def reset(self, server, topic):
+        """Start the cursor of a subscription over."""
+        key = f'{server}/{topic}'
+        with self._lock:
+            self._cursors[key] = Cursor()
+            self._dirty.add(key)
+
+    def advance(self, server, topic, message):
+        """Move the cursor of a subscription past `message`.
+
+        The file is written if enough messages were received or enough time
+        passed since it was last written.
+        """
+        key = f'{server}/{topic}'
+        cursor = self.get(server, topic)
+        with self._lock:
+            cursor.advance(message)
+            self._dirty.add(key)
+            self._pending += 1
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        """Write the file if a change has waited long enough."""
+        with self._lock:
+            due = self._pending >= self.flush_size or (
+                self._dirty
+                and time.monotonic() - self._flushed >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the changed cursors to the file now.
+
+        Cursors of other subscriptions written to the file by other processes
+        are kept. Failing to write the file is logged and retried on the next
+        flush.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            if self.before_flush:
+                self.before_flush()
+            cursors = self._load()
+            cursors.update(
+                (key, self._cursors[key].as_dict()) for key in self._dirty
+            )
+            tmp_path = self.path.with_name(f'.{self.path.name}.{os.getpid()}')
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'w') as cursor_file:
+                    json.dump(cursors, cursor_file)
+                    cursor_file.flush()
+                    os.fsync(cursor_file.fileno())
+                os.replace(tmp_path, self.path)
+                _fsync_directory(self.path.parent)
+            except OSError as err:
+                log.warning(
+                    'Failed to write the cursor file %s: %s', self.path, err
+                )
+                with contextlib.suppress(OSError):
+                    tmp_path.unlink()
+                return
+            finally:
+                self._flushed = time.monotonic()
+            self._dirty.clear()
+            self._pending = 0
+
+    def close(self):
+        """Write the changed cursors."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
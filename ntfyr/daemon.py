@@ -0,0 +1,298 @@
+"""A local daemon that sends notifications for `ntfyr` CLI invocations.
+
+The daemon keeps warm connections to the ntfy servers and listens on a Unix
+domain socket. The CLI forwards its parsed arguments and message to a running
+daemon and sends the notification itself if no daemon is running.
+
+Each request and reply is a single line of JSON.
+"""
+
+
+import argparse
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import struct
+
+from ._common import log
+from .config import Config, _config_paths
+from .errors import NtfyrError, NtfyrException
+from .ntfyr import (
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    _new_session,
+    notify_many,
+)
+
+CONNECT_TIMEOUT = 1
+"""Seconds to wait for the daemon to accept a connection."""
+REPLY_TIMEOUT = 120
+"""Seconds to wait for the daemon to reply to a request without a deadline."""
+
+
+def socket_path():
+    """Return the path of the daemon socket.
+
+    `NTFYR_SOCKET` is used if it is set. Otherwise the socket is
+    `$XDG_RUNTIME_DIR/ntfyr.sock` or in a per-user directory in the temporary
+    directory that only the user can access.
+    """
+    if os.environ.get('NTFYR_SOCKET'):
+        return pathlib.Path(os.environ['NTFYR_SOCKET'])
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return pathlib.Path(os.environ['XDG_RUNTIME_DIR'], 'ntfyr.sock')
+    import tempfile
+
+    return pathlib.Path(
+        tempfile.gettempdir(), f'ntfyr-{os.getuid()}', 'ntfyr.sock'
+    )
+
+
+def _is_trusted_directory(path):
+    """Return `True` if only the current user can add files to `path`.
+
+    The directory must belong to the current user, or to root and have the
+    sticky bit set so other users can not replace files in it.
+    """
+    try:
+        dir_stat = path.stat()
+    except OSError:
+        return False
+    if dir_stat.st_uid == os.getuid():
+        return True
+    return dir_stat.st_uid == 0 and bool(dir_stat.st_mode & stat.S_ISVTX)
+
+
+def _is_trusted(path):
+    """Return `True` if only the current user can have created `path`."""
+    try:
+        path_stat = path.lstat()
+    except OSError:
+        return False
+    return path_stat.st_uid == os.getuid() and _is_trusted_directory(
+        path.parent
+    )
+
+
+def _peer_is_user(sock):
+    """Return `True` if the process listening on `sock` runs as this user.
+
+    Always `True` where the peer credentials are not available.
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    creds = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')
+    )
+    _, uid, _ = struct.unpack('3i', creds)
+    return uid == os.getuid()
+
+
+def _connect(path, timeout=CONNECT_TIMEOUT):
+    """Return a socket connected to `path` or `None` if nothing is there."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except OSError as err:
+        log.debug('No daemon listening on %s: %s', path, err)
+        sock.close()
+        return None
+    return sock
+
+
+def forward(args, message, path=None):
+    """Send a notification through a running daemon.
+
+    If no config files are given in `args`, the files this process would
+    search, from `NTFYR_CONFIGS` or the default locations, are sent instead
+    so the daemon uses the same config as sending directly would. The paths
+    are made absolute before they are sent. Credentials are only sent if they
+    were given in `args`, and only to a daemon run by the same user.
+
+    Arguments:
+        args (argparse.Namespace): The parsed CLI arguments.
+        message (str): The body of the message to be sent.
+        path (pathlib.Path, optional): The daemon socket. Defaults to
+            `socket_path()`.
+
+    Returns:
+        bool: `True` if the daemon sent the notification. `False` if no daemon
+        is running or the socket or the daemon may belong to another user.
+
+    Raises:
+        NtfyrError: If the daemon failed to send the notification. If it
+            failed for several targets the others are logged.
+    """
+    path = path or socket_path()
+    if not path.exists():
+        return False
+    if not _is_trusted(path):
+        log.warning(
+            'Not using the daemon socket %s because it may belong to another '
+            'user.',
+            path,
+        )
+        return False
+    sock = _connect(path)
+    if sock is None:
+        return False
+    if not _peer_is_user(sock):
+        sock.close()
+        log.warning(
+            'Not using the daemon on %s because it runs as another user.',
+            path,
+        )
+        return False
+    forwarded = dict(
+        vars(args),
+        config=[
+            str(pathlib.Path(p).absolute())
+            for p in args.config or _config_paths()
+        ],
+    )
+    # The daemon reads credentials from the config files itself so only
+    #   credentials given as arguments are sent.
+    for key in ('user', 'password', 'token'):
+        if forwarded.get(key) is None:
+            forwarded.pop(key, None)
+    request = {'args': forwarded, 'message': message}
+    reply_timeout = REPLY_TIMEOUT
+    if getattr(args, 'deadline', None) is not None:
+        # Leave the daemon time to report that the deadline passed.
+        reply_timeout = args.deadline + CONNECT_TIMEOUT
+    try:
+        sock.settimeout(reply_timeout)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reply_file:
+            reply = json.loads(reply_file.readline())
+    except (OSError, ValueError) as err:
+        raise NtfyrError(
+            f'No reply from the daemon at {path}: {err}',
+            message=message,
+        ) from err
+    finally:
+        sock.close()
+    if not reply['ok']:
+        for error in reply.get('errors', [])[1:]:
+            log.error(
+                'Error sending to %s/%s: %s',
+                error['server'],
+                error['topic'],
+                error['error'],
+            )
+        raise NtfyrError(
+            reply['error'],
+            server=reply.get('server'),
+            topic=reply.get('topic'),
+            message=message,
+            headers=reply.get('headers'),
+        )
+    return True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            configs = Config.targets_from_args(
+                argparse.Namespace(**request['args'])
+            )
+            results = notify_many(
+                [(config, request['message']) for config in configs],
+                max_workers=min(len(configs), DEFAULT_POOL_MAXSIZE),
+                session=self.server.session,
+            )
+            errors = [
+                _error_reply(result)
+                for result in results
+                if isinstance(result, NtfyrError)
+            ]
+            if errors:
+                reply = dict(errors[0], ok=False, errors=errors)
+            else:
+                reply = {'ok': True, 'responses': results}
+        except NtfyrError as err:
+            reply = dict(_error_reply(err), ok=False)
+        except (NtfyrException, ValueError, KeyError, TypeError) as err:
+            reply = {'ok': False, 'error': f'{err.__class__.__name__}: {err}'}
+        if not reply['ok']:
+            log.error('Failed to send notification: %s', reply['error'])
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+def _error_reply(err):
+    return {
+        'error': err.message,
+        'server': err.server,
+        'topic': err.topic,
+        'headers': err.headers,
+    }
+
+
+class Daemon(socketserver.ThreadingUnixStreamServer):
+    """A server that sends notifications forwarded by the CLI.
+
+    The socket is only accessible by the user running the daemon. Its
+    directory is created only accessible by the user if it does not exist. A
+    stale socket left behind by a daemon that was killed is replaced.
+
+    Notifications are always sent with a `requests` session so connections
+    are pooled, whatever `transport` is set in the config.
+
+    Arguments:
+        path (pathlib.Path, optional): The socket to listen on. Defaults to
+            `socket_path()`.
+        pool_connections (int, optional): The number of per-host connection
+            pools to keep.
+        pool_maxsize (int, optional): The number of connections to keep alive
+            per host.
+
+    Raises:
+        NtfyrException: If another daemon is listening on `path` or `path` or
+            its directory may belong to another user.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path=None,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    ):
+        self.path = pathlib.Path(path or socket_path())
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _is_trusted_directory(self.path.parent):
+            raise NtfyrException(
+                f'The directory {self.path.parent} may belong to another user.',
+            )
+        if self.path.exists():
+            if not _is_trusted(self.path):
+                raise NtfyrException(
+                    f'The socket {self.path} may belong to another user.',
+                )
+            sock = _connect(self.path)
+            if sock is not None:
+                sock.close()
+                raise NtfyrException(
+                    f'A daemon is already listening on {self.path}',
+                )
+            self.path.unlink()
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.path), _RequestHandler)
+        finally:
+            os.umask(old_umask)
+        self.session = _new_session(pool_connections, pool_maxsize)
+        log.info('Listening on %s', self.path)
+
+    def server_close(self):
+        """Stop listening and close the connection pool."""
+        super().server_close()
+        self.session.close()
+        if self.path.exists():
+            self.path.unlink()
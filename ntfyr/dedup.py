@@ -0,0 +1,206 @@
+"""Suppress duplicate notifications.
+
+A notification is a duplicate if one with the same server, topic, title, tags
+and message was sent within the last `dedup_ttl` seconds. Only a 16 byte
+digest of each notification is kept, in an LRU of at most `dedup_size`
+entries. The digests are kept in memory and shared by every client in the
+process, or in a SQLite database at `dedup_path` to share them between
+processes.
+"""
+
+
+import collections
+import threading
+import time
+
+DEFAULT_DEDUP_SIZE = 1024
+"""The default number of digests kept."""
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS digests (
+    digest BLOB PRIMARY KEY,
+    expires REAL NOT NULL
+)
+'''
+
+_deduplicators = {}
+_deduplicators_lock = threading.Lock()
+
+
+def digest(config, message):
+    """Return the digest that identifies a notification.
+
+    Arguments:
+        config (Config): The config the notification is sent with.
+        message (str): The body of the message before a timestamp is added.
+    """
+    import hashlib
+
+    tags = config.tags
+    if isinstance(tags, (list, tuple)):
+        tags = ','.join(str(tag) for tag in tags)
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in (config.server, config.topic, config.title, tags, message):
+        hasher.update(str(part or '').encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.digest()
+
+
+class Deduplicator:
+    """An in-memory LRU of recently sent digests.
+
+    Arguments:
+        ttl (float): Seconds a digest suppresses duplicates for.
+        max_entries (int, optional): The most digests kept. The least
+            recently seen digests are dropped first.
+
+    Attributes:
+        suppressed (int): The number of duplicates suppressed.
+    """
+
+    def __init__(self, ttl, max_entries=DEFAULT_DEDUP_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.suppressed = 0
+        self._expires = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """Return `True` if `key` was seen within the TTL, else record it.
+
+        A duplicate does not extend the TTL, so a notification that keeps
+        repeating is sent once per TTL.
+        """
+        with self._lock:
+            now = time.monotonic()
+            expires = self._expires.get(key)
+            if expires is not None and expires > now:
+                self._expires.move_to_end(key)
+                self.suppressed += 1
+                return True
+            self._expires[key] = now + self.ttl
+            self._expires.move_to_end(key)
+            while len(self._expires) > self.max_entries:
+                self._expires.popitem(last=False)
+            return False
+
+    def forget(self, key):
+        """Forget `key` so the next notification with it is sent."""
+        with self._lock:
+            self._expires.pop(key, None)
+
+    def close(self):
+        """Release the resources used by the deduplicator."""
+
+
+class SqliteDeduplicator(Deduplicator):
+    """Recently sent digests kept in a SQLite database.
+
+    The database can be shared by many processes. Expiry uses the wall clock
+    since the monotonic clock is not shared between processes.
+
+    Arguments:
+        path (str): The database file. It is created if it does not exist.
+        ttl (float): Seconds a digest suppresses duplicates for.
+        max_entries (int, optional): The most digests kept. The digests that
+            expire first are dropped first.
+    """
+
+    def __init__(self, path, ttl, max_entries=DEFAULT_DEDUP_SIZE):
+        import sqlite3
+
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._db = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.execute(_SCHEMA)
+
+    def check(self, key):  # noqa: D102
+        with self._lock:
+            now = time.time()
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    'SELECT expires FROM digests WHERE digest = ?', (key,)
+                ).fetchone()
+                duplicate = row is not None and row[0] > now
+                if not duplicate:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO digests VALUES (?, ?)',
+                        (key, now + self.ttl),
+                    )
+                    self._db.execute(
+                        'DELETE FROM digests WHERE expires <= ?', (now,)
+                    )
+                    self._db.execute(
+                        'DELETE FROM digests WHERE digest IN (SELECT digest '
+                        'FROM digests ORDER BY expires DESC LIMIT -1 '
+                        'OFFSET ?)',
+                        (self.max_entries,),
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            if duplicate:
+                self.suppressed += 1
+            return duplicate
+
+    def forget(self, key):  # noqa: D102
+        with self._lock:
+            self._db.execute('DELETE FROM digests WHERE digest = ?', (key,))
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+
+def get_deduplicator(config):
+    """Return the deduplicator shared by every client in the process.
+
+    Returns:
+        Deduplicator: The deduplicator for the settings in `config` or
+        `None` if `config.dedup_ttl` is not set.
+    """
+    if not config.dedup_ttl:
+        return None
+    key = (config.dedup_path, config.dedup_ttl, config.dedup_size)
+    with _deduplicators_lock:
+        if key not in _deduplicators:
+            if config.dedup_path:
+                _deduplicators[key] = SqliteDeduplicator(
+                    config.dedup_path, config.dedup_ttl, config.dedup_size
+                )
+            else:
+                _deduplicators[key] = Deduplicator(
+                    config.dedup_ttl, config.dedup_size
+                )
+        return _deduplicators[key]
+
+
+def is_duplicate(config, message):
+    """Return `True` if the notification should be suppressed.
+
+    The notification is recorded as sent if it is not a duplicate.
+
+    Arguments:
+        config (Config): The config the notification is sent with.
+        message (str): The body of the message before a timestamp is added.
+    """
+    deduplicator = get_deduplicator(config)
+    if deduplicator is None:
+        return False
+    return deduplicator.check(digest(config, message))
+
+
+def forget(config, message):
+    """Forget a notification that failed so it is not suppressed next time."""
+    deduplicator = get_deduplicator(config)
+    if deduplicator is not None:
+        deduplicator.forget(digest(config, message))
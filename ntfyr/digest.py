@@ -0,0 +1,256 @@
+"""Combine many notifications into periodic summaries.
+
+A `Digest` collects the messages for each topic and sends one summary, like
+"37 events, 5 distinct", when the window since the first message ends or
+enough messages were collected. The summary has the highest priority and
+every tag of the collected messages and includes the first or last few
+messages, trimmed to fit in `MESSAGE_SIZE_LIMIT`.
+"""
+
+
+import collections
+import dataclasses
+import threading
+import time
+
+from ._common import log
+from .config import priority_rank
+from .errors import NtfyrError
+from .ntfyr import (
+    MESSAGE_SIZE_LIMIT,
+    NtfyClient,
+    _format_message,
+    _get_default_session,
+)
+
+DEFAULT_WINDOW = 60.0
+"""The default number of seconds messages are collected for."""
+DEFAULT_MAX_LINES = 5
+"""The default number of messages included in a summary."""
+MAX_DISTINCT = 10000
+"""The most distinct messages counted for each summary."""
+KEEP_CHOICES = ['first', 'last']
+"""Which messages are included in a summary."""
+
+_ELLIPSIS = '\u2026'
+
+
+class _Buffer:
+    """The messages collected for one topic."""
+
+    def __init__(self, config, max_lines, keep, deadline):
+        self.config = config
+        self.count = 0
+        self.distinct = set()
+        self.lines = collections.deque(
+            maxlen=max_lines if keep == 'last' else None
+        )
+        self.max_lines = max_lines
+        self.priority = None
+        self.tags = {}
+        self.deadline = deadline
+        self.first_message = None
+
+    def add(self, config, message):
+        self.count += 1
+        if self.count == 1:
+            self.first_message = message
+        if len(self.distinct) < MAX_DISTINCT:
+            self.distinct.add(hash(message))
+        if self.lines.maxlen or len(self.lines) < self.max_lines:
+            self.lines.append(message)
+        if priority_rank(config.priority) > priority_rank(self.priority):
+            self.priority = config.priority
+        tags = config.tags
+        if not isinstance(tags, (list, tuple)):
+            tags = [tags] if tags else []
+        self.tags.update(dict.fromkeys(tags))
+
+    def summary(self):
+        """Return the config and message to send for the collected messages."""
+        if self.count == 1:
+            return self.config, self.first_message
+        distinct = len(self.distinct)
+        more = '+' if distinct >= MAX_DISTINCT else ''
+        heading = f'{self.count} events, {distinct}{more} distinct'
+        config = dataclasses.replace(
+            self.config,
+            priority=self.priority,
+            tags=list(self.tags),
+            title=self.config.title or heading,
+        )
+        # Leave room for the timestamp added when the summary is sent.
+        prefix = _format_message(config, '')
+        return config, _fit(
+            heading, list(self.lines), self.count, len(prefix.encode('utf-8'))
+        )
+
+
+def _fit(heading, lines, count, reserved=0):
+    """Return `heading` and as many `lines` as fit in `MESSAGE_SIZE_LIMIT`.
+
+    Room is left for a count of the messages not shown.
+
+    Arguments:
+        heading (str): The first line of the summary.
+        lines (list): The messages to include.
+        count (int): The number of messages collected.
+        reserved (int, optional): The bytes to leave free for a timestamp.
+    """
+    more_size = len(f'\n({count} more not shown)'.encode('utf-8'))
+    limit = MESSAGE_SIZE_LIMIT - reserved - more_size
+    parts = [heading]
+    size = len(heading.encode('utf-8'))
+    for line in lines:
+        encoded = line.encode('utf-8')
+        if size + 1 + len(encoded) > limit:
+            room = limit - size - 1 - len(_ELLIPSIS.encode('utf-8'))
+            if room > 0:
+                parts.append(
+                    encoded[:room].decode('utf-8', 'ignore') + _ELLIPSIS
+                )
+            break
+        parts.append(line)
+        size += 1 + len(encoded)
+    shown = len(parts) - 1
+    if count > shown:
+        parts.append(f'({count - shown} more not shown)')
+    return '\n'.join(parts)
+
+
+class Digest:
+    """Collect notifications and send a summary for each topic periodically.
+
+    Arguments:
+        window (float, optional): Seconds to collect messages for after the
+            first message for a topic.
+        max_count (int, optional): Send the summary as soon as this many
+            messages are collected for a topic. No limit if `None`.
+        max_lines (int, optional): The number of messages included in a
+            summary.
+        keep (str, optional): `'first'` to include the first messages or
+            `'last'` to include the most recent ones.
+        session (requests.Session, optional): The session to send with.
+            Defaults to the session shared by `notify()` calls for the
+            transport in each config.
+
+    Attributes:
+        failed (int): The number of summaries that could not be sent.
+
+    Raises:
+        ValueError: If `keep` is invalid.
+    """
+
+    def __init__(
+        self,
+        window=DEFAULT_WINDOW,
+        max_count=None,
+        max_lines=DEFAULT_MAX_LINES,
+        keep='first',
+        session=None,
+    ):
+        if keep not in KEEP_CHOICES:
+            raise ValueError(f'Invalid value for `keep`: {keep}')
+        self.window = window
+        self.max_count = max_count
+        self.max_lines = max_lines
+        self.keep = keep
+        self.session = session
+        self.failed = 0
+        self._buffers = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name='ntfyr-digest',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def add(self, config, message):
+        """Add a message to the summary for its topic.
+
+        Arguments:
+            config (Config): The config to send the notification with. The
+                summary is sent with the config of the first message for the
+                topic, with the highest priority and all tags seen.
+            message (str): The body of the message.
+        """
+        key = (config.server, config.topic)
+        with self._condition:
+            if self._closed:
+                raise NtfyrError('The digest is closed.')
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = _Buffer(
+                    config,
+                    self.max_lines,
+                    self.keep,
+                    time.monotonic() + self.window,
+                )
+                self._buffers[key] = buffer
+                self._condition.notify()
+            buffer.add(config, message)
+            if self.max_count is None or buffer.count < self.max_count:
+                return
+            del self._buffers[key]
+        self._send(buffer)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                due = [
+                    key
+                    for key, buffer in self._buffers.items()
+                    if buffer.deadline <= now
+                ]
+                if not due:
+                    if self._closed:
+                        return
+                    deadlines = [b.deadline for b in self._buffers.values()]
+                    timeout = min(deadlines) - now if deadlines else None
+                    self._condition.wait(timeout)
+                    continue
+                buffers = [self._buffers.pop(key) for key in due]
+            for buffer in buffers:
+                self._send(buffer)
+
+    def _send(self, buffer):
+        config, message = buffer.summary()
+        session = self.session or _get_default_session(config.transport)
+        try:
+            with NtfyClient(config, session=session) as client:
+                client.send(message)
+        except NtfyrError as err:
+            # Summaries are sent by the digest thread and by `add()`.
+            with self._condition:
+                self.failed += 1
+            log.error(
+                'Failed to send summary to %s/%s: %s',
+                config.server,
+                config.topic,
+                err.message,
+            )
+
+    def flush(self):
+        """Send the summaries for every topic now."""
+        with self._condition:
+            buffers = list(self._buffers.values())
+            self._buffers.clear()
+        for buffer in buffers:
+            self._send(buffer)
+
+    def close(self):
+        """Send the summaries for every topic and stop the digest thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -22,6 +22,13 @@ class NtfyrError(NtfyrException):
             the config.
         message (str, optional): The message body specified as an argument or
             in the config.
+        status_code (int, optional): The HTTP status code of the response
+            from the server. `None` if no response was received.
+        retry_after (float, optional): The seconds the server asked to wait
+            before trying again.
+
+    Attributes:
+        attempts (int): The number of attempts made to send the message.
     """
 
     def __init__(
@@ -31,6 +38,8 @@ class NtfyrError(NtfyrException):
         topic=None,
         message=None,
         headers=None,
+        status_code=None,
+        retry_after=None,
     ):  # noqa: D107
         super().__init__(error)
         self.message = error
@@ -38,3 +47,17 @@ class NtfyrError(NtfyrException):
         self.topic = topic
         self._message = message
         self.headers = headers
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.attempts = 1
+
+
+class NtfyrRateLimitError(NtfyrError):
+    """Indicates a notification was held back by the client-side rate limit.
+
+    `retry_after` is the number of seconds until the next token is added.
+    """
+
+
+class NtfyrQueueFullError(NtfyrError):
+    """Indicates a notification was dropped because a queue was full."""
@@ -0,0 +1,195 @@
+"""Failover between redundant ntfy servers.
+
+When `failover` is set in the config, notifications go to the first
+available server of `server` and the `failover` servers and move on to the
+next server right away when one can not be reached or returns a 429 or 5xx
+response.
+
+Every request updates the health of its server: a moving average of its
+latency and the number of failures in the last `FAILURE_WINDOW` seconds. A
+circuit breaker opens after `circuit_threshold` failures in a row and the
+server is skipped for `circuit_reset` seconds. Then one notification is let
+through as a probe. The circuit closes if the probe succeeds and opens again
+if it fails. The health of each server is shared by every client in the
+process.
+"""
+
+
+import collections
+import threading
+import time
+
+from .errors import NtfyrError
+
+DEFAULT_CIRCUIT_THRESHOLD = 3
+"""The default number of failures in a row that open a circuit."""
+DEFAULT_CIRCUIT_RESET = 30.0
+"""The default number of seconds a circuit stays open before a probe."""
+FAILOVER_POLICIES = ['ordered', 'weighted']
+"""How the servers to send to are ordered."""
+FAILURE_WINDOW = 60.0
+"""Seconds a failure counts against the health of a server."""
+LATENCY_WEIGHT = 0.3
+"""The weight of the latest request in the latency moving average."""
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+class ServerHealth:
+    """The passive health of one server and its circuit breaker.
+
+    Attributes:
+        latency (float): The moving average of the seconds successful requests
+            took or `None` if none succeeded yet.
+        state (str): The state of the circuit. One of `CLOSED`, `OPEN` or
+            `HALF_OPEN`.
+    """
+
+    def __init__(self):
+        self.latency = None
+        self.state = CLOSED
+        self._failures_in_row = 0
+        self._failures = collections.deque()
+        self._opened = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._failures and self._failures[0] <= now - FAILURE_WINDOW:
+            self._failures.popleft()
+
+    @property
+    def recent_failures(self):
+        """The number of failures in the last `FAILURE_WINDOW` seconds."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._failures)
+
+    def score(self, weight=1.0):
+        """Return how costly the server is expected to be. Lower is better.
+
+        Servers without a measured latency score 0 so they are tried.
+        """
+        return (self.latency or 0.0) * (1 + self.recent_failures) / weight
+
+    def acquire(self, reset):
+        """Return `True` if a request may be sent to the server now.
+
+        Once the circuit has been open for `reset` seconds the first caller
+        is let through as the probe. Another probe is let through if the
+        probe did not report back within `reset` seconds.
+
+        Arguments:
+            reset (float): Seconds the circuit stays open.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened < reset:
+                    return False
+                self.state = HALF_OPEN
+            elif now - self._probe_started < reset:
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self, latency):
+        """Record a successful request and close the circuit."""
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_WEIGHT * (latency - self.latency)
+            self._failures_in_row = 0
+            self.state = CLOSED
+
+    def record_failure(self, threshold):
+        """Record a failed request and open the circuit if needed.
+
+        Arguments:
+            threshold (int): The number of failures in a row that open the
+                circuit. A failed probe always opens it again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._failures.append(now)
+            self._expire(now)
+            self._failures_in_row += 1
+            if self.state == HALF_OPEN or self._failures_in_row >= threshold:
+                self.state = OPEN
+                self._opened = now
+
+
+def get_health(server):
+    """Return the health of `server` shared by every client in the process."""
+    with _servers_lock:
+        if server not in _servers:
+            _servers[server] = ServerHealth()
+        return _servers[server]
+
+
+def reset():
+    """Forget the health of every server."""
+    with _servers_lock:
+        _servers.clear()
+
+
+def parse_server(entry):
+    """Return the server and weight of a `failover` entry.
+
+    An entry is a server URL optionally followed by `=` and a weight, like
+    `https://ntfy2.example.com=2`. An `=` in the query string of a URL is
+    not taken as the start of a weight.
+
+    Raises:
+        NtfyrError: If the weight is not a positive number.
+    """
+    server, sep, weight = entry.rpartition('=')
+    if not sep or '?' in server or '#' in server:
+        return entry, 1.0
+    try:
+        weight = float(weight)
+    except ValueError:
+        weight = None
+    if weight is None or not weight > 0:
+        raise NtfyrError(
+            f'The weight of the failover server {server} must be a positive '
+            f'number: {entry}',
+            server=server,
+        )
+    return server, weight
+
+
+def candidates(config):
+    """Yield the servers to send a notification to in the order to try them.
+
+    With the `'ordered'` policy the servers are tried in the order they are
+    configured. With the `'weighted'` policy the server with the lowest
+    latency times recent failures divided by its weight is tried first.
+    Servers with an open circuit are skipped.
+
+    Arguments:
+        config (Config): The config with the `server` and `failover`
+            servers.
+
+    Yields:
+        tuple: The server and its `ServerHealth`.
+    """
+    servers = [(config.server, 1.0)]
+    servers.extend(parse_server(entry) for entry in config.failover)
+    servers = [
+        (index, server, weight, get_health(server))
+        for index, (server, weight) in enumerate(servers)
+    ]
+    if config.failover_policy == 'weighted':
+        servers.sort(key=lambda s: (s[3].score(s[2]), s[0]))
+    for _, server, _, server_health in servers:
+        if server_health.acquire(config.circuit_reset):
+            yield server, server_health
@@ -0,0 +1,192 @@
+"""Send log records as notifications.
+
+`NtfyHandler` puts records on a queue and returns right away. A
+`QueueListener` thread groups the records that arrive within a window into
+one notification and sends it over a pooled connection, so a slow or
+unreachable server never blocks the code that logs.
+
+Example:
+    handler = NtfyHandler(Config(topic='alerts'))
+    logging.getLogger().addHandler(handler)
+"""
+
+
+import dataclasses
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+from .errors import NtfyrError
+from .ntfyr import _new_session
+
+DEFAULT_WINDOW = 5.0
+"""The default number of seconds records are grouped for."""
+DEFAULT_MAX_RECORDS = 50
+"""The default number of records sent in one notification at most."""
+DEFAULT_QUEUE_SIZE = 1000
+"""The default number of records that can wait to be sent."""
+LEVEL_PRIORITIES = [
+    (logging.CRITICAL, 'urgent'),
+    (logging.ERROR, 'high'),
+    (logging.WARNING, 'default'),
+    (logging.INFO, 'low'),
+    (logging.NOTSET, 'min'),
+]
+"""The priority for records at or above each log level."""
+
+
+def level_priority(level):
+    """Return the notification priority for a log level."""
+    for min_level, priority in LEVEL_PRIORITIES:
+        if level >= min_level:
+            return priority
+    return LEVEL_PRIORITIES[-1][1]
+
+
+class _Batcher:
+    """Collect records and send them in one notification per window.
+
+    This is only used from the listener thread. It is not a
+    `logging.Handler` so `logging.shutdown()` leaves it to `NtfyHandler`.
+    """
+
+    def __init__(self, config, window, max_records):
+        self.window = window
+        self.max_records = max_records
+        # Validate the config up front and reuse the headers for each
+        #   priority.
+        self._prepared = {
+            priority: dataclasses.replace(config, priority=priority).prepare()
+            for _, priority in LEVEL_PRIORITIES
+        }
+        self._session = _new_session(pool_maxsize=1, transport=config.transport)
+        self._records = []
+        self._deadline = None
+
+    def timeout(self):
+        """Return the seconds until the records must be sent or `None`."""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def handle(self, record):
+        """Add a record that was formatted by `NtfyHandler`."""
+        if not self._records:
+            self._deadline = time.monotonic() + self.window
+        self._records.append(record)
+        if len(self._records) >= self.max_records:
+            self.flush()
+
+    def flush(self):
+        """Send the collected records."""
+        records, self._records = self._records, []
+        self._deadline = None
+        if not records:
+            return
+        top = max(records, key=lambda record: record.levelno)
+        prepared = self._prepared[level_priority(top.levelno)]
+        if not prepared.config.title:
+            if len(records) == 1:
+                title = f'{top.levelname} in {top.name}'
+            else:
+                title = f'{len(records)} log records up to {top.levelname}'
+            config = dataclasses.replace(prepared.config, title=title)
+            prepared = config.prepare()
+        message = '\n'.join(record.getMessage() for record in records)
+        try:
+            prepared.send(message, session=self._session)
+        except NtfyrError as err:
+            # Logging the error would be sent again if `NtfyHandler` is on the
+            #   root logger.
+            sys.stderr.write(
+                f'Failed to send {len(records)} log records: {err.message}\n'
+            )
+
+    def close(self):
+        """Send the collected records and close the connection pool."""
+        self.flush()
+        self._session.close()
+
+
+class _BatchingListener(logging.handlers.QueueListener):
+    """A `QueueListener` that sends the collected records when they are due."""
+
+    def enqueue_sentinel(self):  # noqa: D102
+        # Wait for room so stopping works even when the queue is full.
+        self.queue.put(self._sentinel)
+
+    def dequeue(self, block):  # noqa: D102
+        (batcher,) = self.handlers
+        while True:
+            try:
+                return self.queue.get(block, batcher.timeout())
+            except queue.Empty:
+                if not block:
+                    raise
+                batcher.flush()
+
+
+class NtfyHandler(logging.handlers.QueueHandler):
+    """A logging handler that sends records as notifications.
+
+    Records logged within `window` seconds of the first one are sent in one
+    notification with the priority of the most severe record. Records from
+    `ntfyr` itself are ignored so a failure to send is never sent again.
+
+    Arguments:
+        config (Config): The config to send notifications with. The priority
+            is set from the log level and the title defaults to a summary of
+            the records.
+        level (int, optional): The lowest level to send.
+        window (float, optional): Seconds to collect records for before
+            sending them.
+        max_records (int, optional): The most records sent in one
+            notification.
+        queue_size (int, optional): The number of records that can wait to
+            be sent. More records are dropped and counted in `dropped`.
+
+    Attributes:
+        dropped (int): The number of records dropped because the queue was
+            full.
+
+    Raises:
+        NtfyrError: If `config` is missing a server or topic, or has invalid
+            authentication settings.
+    """
+
+    def __init__(
+        self,
+        config,
+        level=logging.ERROR,
+        window=DEFAULT_WINDOW,
+        max_records=DEFAULT_MAX_RECORDS,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        super().__init__(queue.Queue(queue_size))
+        self.setLevel(level)
+        self.addFilter(_not_ntfyr)
+        self.dropped = 0
+        self._batcher = _Batcher(config, window, max_records)
+        self.listener = _BatchingListener(self.queue, self._batcher)
+        self.listener.start()
+
+    def enqueue(self, record):
+        """Queue `record` or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Send the records that are queued and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self._batcher.close()
+        super().close()
+
+
+def _not_ntfyr(record):
+    return record.name != 'ntfyr' and not record.name.startswith('ntfyr.')
@@ -2,13 +2,24 @@
 
 
 import json
-from datetime import datetime as dt
-
-import requests
-import tzlocal
+import sys
+import threading
+import time
 
+from . import dedup, health, ratelimit, timestamp
 from ._common import log
-from .errors import NtfyrError
+from .errors import NtfyrError, NtfyrRateLimitError
+from .retry import Deadline, RetryPolicy, parse_retry_after
+
+DEFAULT_POOL_CONNECTIONS = 10
+"""The default number of per-host connection pools kept by a client."""
+DEFAULT_POOL_MAXSIZE = 10
+"""The default number of connections kept alive per host by a client."""
+MESSAGE_SIZE_LIMIT = 4096
+"""The largest message in bytes ntfy sends as a message and not as a file."""
+
+_default_sessions = {}
+_default_sessions_lock = threading.Lock()
 
 
 def _get_headers(config):
@@ -38,31 +49,21 @@ def _get_headers(config):
     return headers
 
 
-def _get_timestamp(ts_format):
-    """Return the local time formatted with `ts_format`.
-
-    See https://docs.python.org/3/library/time.html#time.strftime for string
-    formatting options.
-    """
-    system_tz = tzlocal.get_localzone()
-    now = dt.now(tz=system_tz)
-    return now.strftime(ts_format)
-
-
-def notify(config, message):
-    """Send a notification.
-
-    Arguments:
-        config (dict): Parsed config from the config file.
-        message (str): The body of the message to be sent.
-    """
+def _get_url(config):
+    """Validate the server and topic and return the URL to publish to."""
     if not config.server:
         raise NtfyrError('A server must be specified.')
-    server = config.server
     if not config.topic:
         raise NtfyrError('A topic must be specified.')
-    url = f'{server}/{config.topic}'
-    headers = _get_headers(config)
+    return f'{config.server}/{config.topic}'
+
+
+def _get_credentials(config):
+    """Validate the authentication settings and return basic auth credentials.
+
+    Returns:
+        A `(user, password)` tuple or `None` if basic auth is not used.
+    """
     user = config.user
     password = config.password
     if config.user and config.password and config.token:
@@ -73,58 +74,599 @@ def notify(config, message):
     if (user and not password) or (not user and password):
         raise NtfyrError('Either user or password was specified but not both.')
     if user and password:
-        credentials = (user, password)
-    else:
-        credentials = None
-    if config.include_timestamp:
-        timestamp = config.timestamp
-        if '%message' in timestamp:
-            # Replacing % notation with {} to avoid confusion with strftime
-            message_format = timestamp.replace('%message', '{message}')
-            message = _get_timestamp(message_format).format(message=message)
-        else:
-            message = f'{_get_timestamp(timestamp)} {message}'
-    log.debug(
-        'Sending request: method=POST, url=%s, headers=%s, auth.user=%s, '
-        'data=%s',  # nofmt
-        url,
-        headers,
-        user,
-        message,
+        return (user, password)
+    return None
+
+
+def _is_transient(err):
+    """Return `True` if sending again later might fix `err`.
+
+    Only connection errors and 429 and 5xx responses are transient.
+    """
+    if err.status_code is None:
+        return True
+    return err.status_code == 429 or err.status_code >= 500
+
+
+def _is_retryable(err):
+    """Return `True` if it is safe to send the message that caused `err` again.
+
+    Only 429 and 5xx responses and errors connecting to the server are
+    retried. Other errors, like read timeouts, might happen after the server
+    accepted the message.
+    """
+    if err.status_code is not None:
+        return err.status_code == 429 or err.status_code >= 500
+    # Only check for the errors of transports that were imported to send
+    _http = sys.modules.get(f'{__package__}._http')
+    if _http is not None and isinstance(err.__cause__, _http.ConnectError):
+        return True
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(
+        err.__cause__, requests.ConnectionError
     )
-    res = requests.post(
-        url=url, headers=headers, data=message.encode('utf-8'), auth=credentials
+
+
+def _format_message(config, message):
+    """Prefix `message` with a timestamp if `config` asks for one."""
+    if config.include_timestamp:
+        return timestamp.get_formatter(config.timestamp)(message)
+    return message
+
+
+def _new_session(
+    pool_connections=DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    transport='requests',
+):
+    """Return a session with a sized keep-alive connection pool.
+
+    Arguments:
+        pool_connections (int, optional): The number of per-host connection
+            pools to keep.
+        pool_maxsize (int, optional): The number of connections to keep alive
+            per host.
+        transport (str, optional): `'requests'` for a `requests.Session` or
+            `'stdlib'` for a session built on `http.client` which is faster to
+            import. The stdlib session does not limit its pool size.
+    """
+    if transport == 'stdlib':
+        from . import _http
+
+        return _http.Session()
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
     )
-    try:
-        log.debug('Got response: %s\n%s\n', res, res.json())
-    except json.JSONDecodeError:
-        log.error(
-            'Failed to decode respones form ntfy. Got: %s',
-            res.content.decode(),
-        )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _get_default_session(transport='requests'):
+    """Return the session shared by `notify()` calls, creating it if needed."""
+    with _default_sessions_lock:
+        if transport not in _default_sessions:
+            _default_sessions[transport] = _new_session(transport=transport)
+        return _default_sessions[transport]
+
+
+class _Sender:
+    """The sending logic shared by `NtfyClient` and `PreparedNotification`.
+
+    Subclasses set `config`, `url`, `server`, `topic`, `headers`, `auth` and
+    `retry_policy`, and implement `_request_headers` and `_enqueue()`.
+    """
+
+    __slots__ = ()
+
+    def _send(self, session, message, block, attachment=None):
+        # Attachments are never suppressed or spooled since only the message
+        #   identifies them and the file might be gone later.
+        if attachment is None and dedup.is_duplicate(self.config, message):
+            log.info('Suppressed duplicate notification to %s', self.url)
+            return None
+        body = _format_message(self.config, message)
+        deadline = Deadline(self.config.deadline)
+        try:
+            return self._post_with_retries(
+                session, body, block, deadline, attachment
+            )
+        except NtfyrError as err:
+            if attachment is not None:
+                raise
+            if (
+                not self.config.spool
+                or not _is_retryable(err)
+                or isinstance(err, NtfyrRateLimitError)
+            ):
+                dedup.forget(self.config, message)
+                raise
+            self._enqueue(body)
+            log.warning(
+                'Spooled notification to %s after error: %s',
+                self.url,
+                err.message,
+            )
+            return None
+
+    def _post_with_retries(
+        self, session, message, block, deadline, attachment=None
+    ):
+        attempt = 1
+        while True:
+            try:
+                ratelimit.acquire(self.config, block, deadline.remaining())
+                return self._post_with_failover(
+                    session, message, deadline, attachment
+                )
+            except NtfyrError as err:
+                err.attempts = attempt
+                if not _is_retryable(err):
+                    raise
+                delay = self.retry_policy.delay(attempt, err.retry_after)
+                if delay is None or not deadline.allows(delay):
+                    raise
+                log.warning(
+                    'Attempt %s of %s to send to %s failed: %s. Retrying in '
+                    '%.2f seconds.',
+                    attempt,
+                    self.retry_policy.max_attempts,
+                    self.url,
+                    err.message,
+                    delay,
+                )
+            time.sleep(delay)
+            attempt += 1
+
+    def _post_with_failover(self, session, message, deadline, attachment):
+        """Post to the first server in `config.failover` that accepts it."""
+        if not self.config.failover:
+            return self._post(
+                session, message, self.server, deadline, attachment
+            )
+        error = None
+        for server, server_health in health.candidates(self.config):
+            started = time.monotonic()
+            try:
+                response = self._post(
+                    session, message, server, deadline, attachment
+                )
+            except NtfyrError as err:
+                if _is_transient(err):
+                    server_health.record_failure(self.config.circuit_threshold)
+                if not _is_retryable(err) or deadline.expired():
+                    raise
+                log.warning(
+                    'Failed to send to %s: %s. Trying the next server.',
+                    server,
+                    err.message,
+                )
+                error = err
+                continue
+            server_health.record_success(time.monotonic() - started)
+            return response
+        if error is not None:
+            raise error
         raise NtfyrError(
-            f'{res.status_code} {res.content.decode()}',
-            server=server,
-            topic=config.topic,
+            'Every server is unavailable until its circuit breaker resets.',
+            server=self.server,
+            topic=self.topic,
             message=message,
-            headers=headers,
+            headers=self.headers,
         )
-    if not res.ok:
-        if res.json():
+
+    def _post(self, session, message, server, deadline, attachment=None):
+        url = self.url if server == self.server else f'{server}/{self.topic}'
+        if deadline.expired():
             raise NtfyrError(
-                '{error} {link}'.format(
-                    error=res.json().get('error'),
-                    link=res.json().get('link', ''),
-                ),
+                'The deadline for sending the notification passed.',
                 server=server,
-                topic=config.topic,
+                topic=self.topic,
                 message=message,
-                headers=headers,
+                headers=self.headers,
             )
-        raise NtfyrError(
-            f'{res.status_code} {res.content.decode()}',
-            server=server,
-            topic=config.topic,
-            message=message,
-            headers=headers,
+        if attachment is None:
+            method = session.post
+            headers = self._request_headers
+            data = message.encode('utf-8')
+        else:
+            method = session.put
+            headers = attachment.headers(self._request_headers, message)
+            data = attachment.rewind()
+            if data is None:
+                raise NtfyrError(
+                    'The attachment can not be sent again because its file '
+                    'is not seekable.',
+                    server=server,
+                    topic=self.topic,
+                    message=message,
+                    headers=self.headers,
+                )
+        log.debug(
+            'Sending request: method=%s, url=%s, headers=%s, auth.user=%s, '
+            'data=%s',  # nofmt
+            'POST' if attachment is None else 'PUT',
+            url,
+            self.headers,
+            self.auth[0] if self.auth else None,
+            message if attachment is None else attachment.filename,
         )
+        try:
+            res = method(
+                url=url,
+                headers=headers,
+                data=data,
+                auth=self.auth,
+                timeout=deadline.timeout(
+                    self.config.connect_timeout,
+                    self.config.read_timeout,
+                ),
+            )
+        except (OSError, ValueError) as err:
+            # `requests.RequestException` is an `OSError`. Invalid URLs raise a
+            #   `ValueError`.
+            raise NtfyrError(
+                f'{err.__class__.__name__}: {err}',
+                server=server,
+                topic=self.topic,
+                message=message,
+                headers=self.headers,
+            ) from err
+        return self._handle_response(res, message, server)
+
+    def _handle_response(self, res, message, server):
+        try:
+            body = res.json()
+            log.debug('Got response: %s\n%s\n', res, body)
+        except json.JSONDecodeError:
+            log.error(
+                'Failed to decode respones form ntfy. Got: %s',
+                res.content.decode(),
+            )
+            raise NtfyrError(
+                f'{res.status_code} {res.content.decode()}',
+                server=server,
+                topic=self.topic,
+                message=message,
+                headers=self.headers,
+                status_code=res.status_code,
+                retry_after=parse_retry_after(res.headers.get('Retry-After')),
+            )
+        if not res.ok:
+            retry_after = parse_retry_after(res.headers.get('Retry-After'))
+            if body:
+                raise NtfyrError(
+                    '{error} {link}'.format(
+                        error=body.get('error'),
+                        link=body.get('link', ''),
+                    ),
+                    server=server,
+                    topic=self.topic,
+                    message=message,
+                    headers=self.headers,
+                    status_code=res.status_code,
+                    retry_after=retry_after,
+                )
+            raise NtfyrError(
+                f'{res.status_code} {res.content.decode()}',
+                server=server,
+                topic=self.topic,
+                message=message,
+                headers=self.headers,
+                status_code=res.status_code,
+                retry_after=retry_after,
+            )
+        return body
+
+
+class NtfyClient(_Sender):
+    """A client that sends notifications over pooled keep-alive connections.
+
+    The URL, headers and credentials are derived from `config` once when the
+    client is created, so changes made to `config` afterwards are not seen by
+    the client.
+
+    Arguments:
+        config (Config): The config to send notifications with.
+        session (requests.Session, optional): A session to share with other
+            clients. A client never closes a session it was given.
+        pool_connections (int, optional): The number of per-host connection
+            pools to keep. Ignored if `session` is given.
+        pool_maxsize (int, optional): The number of connections to keep alive
+            per host. Ignored if `session` is given.
+
+    Failed notifications are retried as set by `config.max_attempts`,
+    `config.retry_delay` and `config.retry_max_delay`. Only connection errors
+    and 429 and 5xx responses are retried.
+
+    If `config.spool` is set, notifications that fail with an error
+    connecting to the server, a 429 or a 5xx response are written to the
+    spool in that directory instead of raising an error. Read timeouts are
+    raised since the server might have accepted the notification. See
+    `ntfyr.spool.Spool`.
+
+    If `config.dedup_ttl` is set, a notification identical to one sent in the
+    last `dedup_ttl` seconds is not sent. See `ntfyr.dedup`.
+
+    If `config.failover` is set, notifications go to the first available
+    server of `config.server` and the failover servers. See `ntfyr.health`.
+
+    Each request waits at most `config.connect_timeout` seconds to connect
+    and `config.read_timeout` seconds for the response. If `config.deadline`
+    is set, sending a notification, including retries and waiting for the
+    rate limit, fails after that many seconds.
+
+    Raises:
+        NtfyrError: If `config` is missing a server or topic, or has invalid
+            authentication settings.
+    """
+
+    def __init__(
+        self,
+        config,
+        session=None,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    ):
+        self.config = config
+        self.url = _get_url(config)
+        self.server = config.server
+        self.topic = config.topic
+        self.headers = _get_headers(config)
+        self.auth = _get_credentials(config)
+        self.retry_policy = RetryPolicy.from_config(config)
+        self._owns_session = session is None
+        if session is None:
+            session = _new_session(
+                pool_connections,
+                pool_maxsize,
+                config.transport,
+            )
+        self._session = session
+        self._spool = None
+
+    def send(self, message, block=True, body=None, filename=None):
+        """Send a notification.
+
+        Arguments:
+            message (str): The body of the message to be sent. If `body` is
+                given this is the message shown with the attachment.
+            block (bool, optional): Wait for the client-side rate limit if
+                `True`. Raise `NtfyrRateLimitError` instead if `False`.
+            body (str, os.PathLike or file object, optional): A path or a
+                binary file object to upload as an attachment. The file is
+                streamed so it is never read into memory. File objects are
+                left open. See `ntfyr.attachment`.
+            filename (str, optional): The name shown for the attachment.
+                Defaults to the name of the file.
+
+        Returns:
+            dict: The message as returned by the server or `None` if the
+            message was spooled or suppressed as a duplicate.
+
+        Raises:
+            NtfyrError: If the server rejects the message. The number of
+                attempts made is in its `attempts` attribute.
+            NtfyrRateLimitError: If `block` is `False` and the rate limit was
+                reached.
+        """
+        if body is None:
+            return self._send(self._session, message, block)
+        from .attachment import open_attachment
+
+        with open_attachment(body, filename) as attachment:
+            return self._send(self._session, message, block, attachment)
+
+    @property
+    def _request_headers(self):
+        return self.headers
+
+    def _enqueue(self, message):
+        self._get_spool().enqueue(self.config, message)
+
+    def _get_spool(self):
+        if self._spool is None:
+            from .spool import Spool
+
+            self._spool = Spool(self.config.spool, self.config.spool_sync)
+        return self._spool
+
+    def close(self):
+        """Close the connection pool if it is owned by this client."""
+        if self._owns_session:
+            self._session.close()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PreparedNotification(_Sender):
+    """An immutable request template for sending many similar notifications.
+
+    The config is validated and the URL, the encoded headers and the
+    `Authorization` header are built once when the notification is prepared.
+    `send()` only formats the body and posts it. Use `Config.prepare()` to
+    create one.
+
+    Retries, rate limits, failover, timeouts and the spool work the same as
+    for `NtfyClient`.
+
+    Arguments:
+        config (Config): The config to send notifications with. A copy is
+            kept so changes made to `config` afterwards are not seen.
+
+    Attributes:
+        config (Config): The copy of the config.
+        url (str): The URL notifications are published to.
+        server (str): The server notifications are sent to.
+        topic (str): The topic notifications are sent to.
+        headers (mappingproxy): The ntfy headers, not including basic auth.
+        retry_policy (RetryPolicy): The retry policy from the config.
+
+    Raises:
+        NtfyrError: If `config` is missing a server or topic, has invalid
+            authentication settings, or has a header that can not be encoded.
+    """
+
+    __slots__ = (
+        'config',
+        'url',
+        'server',
+        'topic',
+        'headers',
+        'retry_policy',
+        '_request_headers',
+    )
+
+    auth = None
+    """Credentials are sent in the prepared `Authorization` header."""
+
+    def __init__(self, config):
+        import dataclasses
+        import types
+
+        config = dataclasses.replace(config, tags=list(config.tags))
+        url = _get_url(config)
+        headers = _get_headers(config)
+        request_headers = dict(headers)
+        credentials = _get_credentials(config)
+        if credentials:
+            import base64
+
+            encoded = base64.b64encode(':'.join(credentials).encode('utf-8'))
+            request_headers['Authorization'] = f'Basic {encoded.decode()}'
+        try:
+            request_headers = {
+                name: value.encode('latin-1')
+                for name, value in request_headers.items()
+            }
+        except UnicodeEncodeError as err:
+            raise NtfyrError(
+                f'Invalid header value: {err}',
+                server=config.server,
+                topic=config.topic,
+                headers=headers,
+            ) from err
+        for name, value in (
+            ('config', config),
+            ('url', url),
+            ('server', config.server),
+            ('topic', config.topic),
+            ('headers', types.MappingProxyType(headers)),
+            ('retry_policy', RetryPolicy.from_config(config)),
+            ('_request_headers', types.MappingProxyType(request_headers)),
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.url}>'
+
+    def send(self, body, session=None, block=True):
+        """Send a notification with `body` as the message.
+
+        Arguments:
+            body (str): The body of the message to be sent.
+            session (requests.Session, optional): The session to send with.
+                Defaults to the session shared by `notify()` calls.
+            block (bool, optional): Wait for the client-side rate limit if
+                `True`. Raise `NtfyrRateLimitError` instead if `False`.
+
+        Returns:
+            dict: The message as returned by the server or `None` if the
+            message was spooled or suppressed as a duplicate.
+
+        Raises:
+            NtfyrError: If the server rejects the message.
+            NtfyrRateLimitError: If `block` is `False` and the rate limit was
+                reached.
+        """
+        if session is None:
+            session = _get_default_session(self.config.transport)
+        return self._send(session, body, block)
+
+    def _enqueue(self, message):
+        from .spool import Spool
+
+        with Spool(self.config.spool, self.config.spool_sync) as spool:
+            spool.enqueue(self.config, message)
+
+
+def notify(config, message='', body=None, filename=None):
+    """Send a notification.
+
+    This is a thin wrapper around `NtfyClient` that reuses one connection pool
+    for every call.
+
+    Arguments:
+        config (dict): Parsed config from the config file.
+        message (str): The body of the message to be sent, or the message
+            shown with the attachment if `body` is given.
+        body (str, os.PathLike or file object, optional): A path or a binary
+            file object to stream to the server as an attachment.
+        filename (str, optional): The name shown for the attachment.
+
+    Returns:
+        dict: The message as returned by the server.
+    """
+    session = _get_default_session(config.transport)
+    with NtfyClient(config, session=session) as client:
+        return client.send(message, body=body, filename=filename)
+
+
+def notify_many(items, max_workers=DEFAULT_POOL_MAXSIZE, session=None):
+    """Send many notifications concurrently.
+
+    The notifications are sent from a pool of `max_workers` threads that share
+    one connection pool. A failed notification does not stop the others from
+    being sent.
+
+    Arguments:
+        items (iterable): `(config, message)` pairs to send.
+        max_workers (int, optional): The number of notifications to send at
+            once.
+        session (requests.Session, optional): The session to send with.
+            Defaults to a new connection pool for the transport of the first
+            config that is closed when every notification is sent.
+
+    Returns:
+        list: The message returned by the server or the `NtfyrError` raised
+        for each item, in the same order as `items`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    items = list(items)
+    own_session = session is None
+    if own_session:
+        transport = items[0][0].transport if items else 'requests'
+        session = _new_session(pool_maxsize=max_workers, transport=transport)
+
+    def _send(item):
+        config, message = item
+        try:
+            with NtfyClient(config, session=session) as client:
+                return client.send(message)
+        except NtfyrError as err:
+            return err
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_send, items))
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,169 @@
+"""Client-side rate limiting.
+
+Notifications are limited by a token bucket for each server and another for
+each topic on a server. The buckets are shared by every client in the process
+so the limits hold no matter how many clients send to the same server.
+"""
+
+
+import collections
+import math
+import threading
+import time
+
+from .errors import NtfyrRateLimitError
+
+MAX_BUCKETS = 1024
+"""The most buckets kept. The least recently used are dropped first."""
+
+_buckets = collections.OrderedDict()
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    Tokens are added at `rate` per second up to `burst`. Waiting callers
+    reserve a token ahead of time so they are served in the order they asked
+    and the send rate stays smooth.
+
+    Arguments:
+        rate (float): The number of tokens added per second.
+        burst (int, optional): The maximum number of tokens. Defaults to
+            `rate` rounded up, with a minimum of 1.
+
+    Raises:
+        ValueError: If `rate` or `burst` is not positive.
+    """
+
+    def __init__(self, rate, burst=None):
+        if not rate > 0:
+            raise ValueError(f'The rate must be positive: {rate}')
+        if burst is not None and not burst > 0:
+            raise ValueError(f'The burst must be positive: {burst}')
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token, possibly one that has not been added yet.
+
+        Arguments:
+            max_wait (float, optional): The longest the caller is willing to
+                wait for the token. No limit if `None`.
+
+        Returns:
+            float: The seconds to wait before the token is available or
+            `None` if that is longer than `max_wait`, in which case no token
+            is taken.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def refund(self):
+        """Return a token taken by `reserve()` that was not used."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+def _get_bucket(key, rate, burst):
+    with _buckets_lock:
+        key = (*key, rate, burst)
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rate, burst)
+            if len(_buckets) > MAX_BUCKETS:
+                _buckets.popitem(last=False)
+        else:
+            _buckets.move_to_end(key)
+        return bucket
+
+
+def _buckets_for(config):
+    buckets = []
+    if config.rate_limit:
+        buckets.append(
+            _get_bucket(
+                ('server', config.server),
+                config.rate_limit,
+                config.rate_burst,
+            )
+        )
+    if config.topic_rate_limit:
+        buckets.append(
+            _get_bucket(
+                ('topic', config.server, config.topic),
+                config.topic_rate_limit,
+                config.topic_rate_burst,
+            )
+        )
+    return buckets
+
+
+def _reserve(config, block, max_wait=None):
+    """Reserve a token in each bucket and return the seconds to wait.
+
+    Raises:
+        NtfyrRateLimitError: If `block` is `False` and a token is not
+            available right away, or if the wait would be longer than
+            `max_wait`.
+    """
+    reserved = []
+    wait = 0.0
+    for bucket in _buckets_for(config):
+        bucket_wait = bucket.reserve(max_wait if block else 0)
+        if bucket_wait is None:
+            for reserved_bucket in reserved:
+                reserved_bucket.refund()
+            raise NtfyrRateLimitError(
+                'The client-side rate limit was reached.',
+                server=config.server,
+                topic=config.topic,
+                retry_after=1 / bucket.rate,
+            )
+        reserved.append(bucket)
+        wait = max(wait, bucket_wait)
+    return wait
+
+
+def acquire(config, block=True, max_wait=None):
+    """Wait until the rate limits in `config` allow a notification.
+
+    Arguments:
+        config (Config): The config the notification will be sent with.
+        block (bool, optional): Raise an error instead of waiting if `False`.
+        max_wait (float, optional): The most seconds to wait. No limit if
+            `None`.
+
+    Raises:
+        NtfyrRateLimitError: If `block` is `False` and the notification can
+            not be sent right away, or if it can not be sent within
+            `max_wait` seconds.
+    """
+    wait = _reserve(config, block, max_wait)
+    if wait:
+        time.sleep(wait)
+
+
+async def acquire_async(config, block=True, max_wait=None):
+    """Wait until the rate limits in `config` allow a notification.
+
+    This is the asyncio counterpart of `acquire()`.
+    """
+    import asyncio
+
+    wait = _reserve(config, block, max_wait)
+    if wait:
+        await asyncio.sleep(wait)
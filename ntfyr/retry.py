@@ -0,0 +1,141 @@
+"""Retry policies for sending notifications."""
+
+
+import random
+import time
+from dataclasses import dataclass
+
+DEFAULT_MAX_ATTEMPTS = 1
+"""By default a notification is only sent once."""
+DEFAULT_RETRY_DELAY = 0.5
+"""The default base delay in seconds between attempts."""
+DEFAULT_RETRY_MAX_DELAY = 30.0
+"""The default maximum delay in seconds between attempts."""
+DEFAULT_CONNECT_TIMEOUT = 10.0
+"""The default number of seconds to wait for a connection to the server."""
+DEFAULT_READ_TIMEOUT = 30.0
+"""The default number of seconds to wait for the server to respond."""
+
+
+def parse_retry_after(value):
+    """Return the number of seconds a `Retry-After` header asks to wait.
+
+    Arguments:
+        value (str): The value of a `Retry-After` header. Either a number of
+            seconds or an HTTP date.
+
+    Returns:
+        float: The number of seconds to wait or `None` if `value` is empty or
+        invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter.
+
+    The delay before attempt `n + 1` is a random number of seconds between 0
+    and `min(max_delay, base_delay * 2 ** (n - 1))`. A `Retry-After` from the
+    server is used as the delay instead, unless it is longer than `max_delay`
+    in which case no more attempts are made.
+
+    Arguments:
+        max_attempts (int): The maximum number of attempts including the
+            first one.
+        base_delay (float): The delay in seconds the backoff starts from.
+        max_delay (float): The maximum delay in seconds between attempts.
+    """
+
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    base_delay: float = DEFAULT_RETRY_DELAY
+    max_delay: float = DEFAULT_RETRY_MAX_DELAY
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the retry policy set in `config`."""
+        return cls(
+            max_attempts=config.max_attempts,
+            base_delay=config.retry_delay,
+            max_delay=config.retry_max_delay,
+        )
+
+    def delay(self, attempt, retry_after=None):
+        """Return the seconds to wait before the next attempt.
+
+        Arguments:
+            attempt (int): The number of attempts made so far.
+            retry_after (float, optional): The delay the server asked for.
+
+        Returns:
+            float: The delay or `None` if no more attempts should be made.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return retry_after
+        backoff = self.base_delay * 2 ** (attempt - 1)
+        return random.uniform(0, min(self.max_delay, backoff))
+
+
+class Deadline:
+    """The time by which sending a notification must finish.
+
+    The deadline covers every attempt, the delays between them and waiting
+    for the rate limit.
+
+    Arguments:
+        seconds (float, optional): Seconds from now. No deadline if `None`.
+    """
+
+    __slots__ = ('expires',)
+
+    def __init__(self, seconds=None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """Return the seconds left or `None` if there is no deadline."""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        """Return `True` if the deadline has passed."""
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def allows(self, delay):
+        """Return `True` if waiting `delay` seconds leaves time to send."""
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+    def timeout(self, connect, read):
+        """Return the `(connect, read)` timeouts for a request.
+
+        Arguments:
+            connect (float): Seconds to wait for a connection or `None`.
+            read (float): Seconds to wait for a response or `None`.
+
+        Returns:
+            tuple: `connect` and `read`, each capped at the time left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return connect, read
+        return (
+            remaining if connect is None else min(connect, remaining),
+            remaining if read is None else min(read, remaining),
+        )
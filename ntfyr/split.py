@@ -0,0 +1,173 @@
+"""Split messages that are too large for ntfy into ordered parts.
+
+ntfy turns a message larger than `MESSAGE_SIZE_LIMIT` bytes into an
+attachment or rejects it. `notify_split()` sends it as several notifications
+instead, labeled "(1/N)", "(2/N)" and so on in the title. Messages are split
+at line breaks where possible and never inside a UTF-8 character. Text is
+read from a stream a chunk at a time and at most `max_parts` parts are kept,
+so memory use does not depend on the size of the input.
+"""
+
+
+import dataclasses
+import io
+
+from ._common import log
+from .ntfyr import (
+    MESSAGE_SIZE_LIMIT,
+    NtfyClient,
+    _format_message,
+    _get_default_session,
+)
+
+DEFAULT_MAX_PARTS = 10
+"""The default number of parts sent at most."""
+
+_READ_SIZE = 8192
+
+
+def _cut(text, limit):
+    """Return where to split `text` so the first part fits in `limit` bytes.
+
+    Returns:
+        tuple: The end of the first part and the start of the rest.
+    """
+    head = text.encode('utf-8')[:limit].decode('utf-8', 'ignore')
+    newline = head.rfind('\n')
+    if newline > 0:
+        return newline, newline + 1
+    # Always make progress even if `limit` is smaller than one character.
+    end = max(len(head), 1)
+    return end, end
+
+
+def iter_parts(stream, limit=MESSAGE_SIZE_LIMIT):
+    """Yield the parts of the text in `stream` of at most `limit` bytes.
+
+    Arguments:
+        stream (file object): A text stream. It is read a chunk at a time.
+        limit (int, optional): The largest part in UTF-8 bytes.
+    """
+    pending = ''
+    while True:
+        chunk = stream.read(_READ_SIZE)
+        pending += chunk
+        while len(pending.encode('utf-8')) > limit:
+            end, start = _cut(pending, limit)
+            yield pending[:end]
+            pending = pending[start:]
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+
+def collect_parts(
+    stream,
+    limit=MESSAGE_SIZE_LIMIT,
+    max_parts=DEFAULT_MAX_PARTS,
+    max_bytes=None,
+):
+    """Return the parts of the text in `stream`, stopping at the caps.
+
+    Reading stops at the first part that would go over a cap so the rest of
+    `stream` is never read.
+
+    Arguments:
+        stream (file object): A text stream.
+        limit (int, optional): The largest part in UTF-8 bytes.
+        max_parts (int, optional): The most parts returned.
+        max_bytes (int, optional): The most bytes returned in all parts. No
+            limit if `None`.
+
+    Returns:
+        tuple: The list of parts and `True` if the text was cut short.
+    """
+    parts = []
+    total = 0
+    for part in iter_parts(stream, limit):
+        total += len(part.encode('utf-8'))
+        if len(parts) >= max_parts or (
+            max_bytes is not None and total > max_bytes
+        ):
+            return parts, True
+        parts.append(part)
+    return parts, False
+
+
+def part_limit(config):
+    """Return the largest part that fits in a message sent with `config`.
+
+    Room is left for the timestamp if `config` adds one.
+    """
+    return MESSAGE_SIZE_LIMIT - len(_format_message(config, '').encode('utf-8'))
+
+
+def send_parts(config, parts, session=None):
+    """Send `parts` in order, each labeled with its position in the title.
+
+    Sending stops at the first part that fails so the parts that were sent
+    are always in order.
+
+    Arguments:
+        config (Config): The config to send the parts with.
+        parts (list): The parts of the message.
+        session (requests.Session, optional): The session to send with.
+            Defaults to the session shared by `notify()` calls.
+
+    Returns:
+        list: The message returned by the server for each part.
+
+    Raises:
+        NtfyrError: If a part could not be sent.
+    """
+    parts = parts or ['']
+    session = session or _get_default_session(config.transport)
+    responses = []
+    for index, part in enumerate(parts, 1):
+        part_config = config
+        if len(parts) > 1:
+            label = f'({index}/{len(parts)})'
+            part_config = dataclasses.replace(
+                config,
+                title=f'{config.title} {label}' if config.title else label,
+            )
+        with NtfyClient(part_config, session=session) as client:
+            responses.append(client.send(part))
+    return responses
+
+
+def notify_split(
+    config,
+    message,
+    max_parts=DEFAULT_MAX_PARTS,
+    max_bytes=None,
+    session=None,
+):
+    """Send a message of any size in parts that fit ntfy's size limit.
+
+    Arguments:
+        config (Config): The config to send the parts with.
+        message (str or file object): The message or a text stream to read
+            it from.
+        max_parts (int, optional): The most parts sent. The rest of the
+            message is dropped with a warning.
+        max_bytes (int, optional): The most bytes sent. No limit if `None`.
+        session (requests.Session, optional): The session to send with.
+
+    Returns:
+        list: The message returned by the server for each part.
+
+    Raises:
+        NtfyrError: If a part could not be sent.
+    """
+    if isinstance(message, str):
+        message = io.StringIO(message)
+    parts, truncated = collect_parts(
+        message, part_limit(config), max_parts, max_bytes
+    )
+    if truncated:
+        log.warning(
+            'Only the first %s parts of the message are sent', len(parts)
+        )
+    return send_parts(config, parts, session)
@@ -0,0 +1,294 @@
+"""A durable on-disk queue for notifications that could not be sent.
+
+Spooled notifications are kept in a SQLite database in WAL mode so enqueueing
+is a single cheap append. They are replayed in the order they were spooled by
+`Spool.drain()`, the `ntfyr flush` command, or a `SpoolDrainer` thread.
+"""
+
+
+import contextlib
+import dataclasses
+import fcntl
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from ._common import log
+from .config import SPOOL_SYNC_MODES, Config
+from .errors import NtfyrConfigException, NtfyrError
+from .ntfyr import NtfyClient, _is_retryable, _new_session
+
+DEFAULT_BATCH_SIZE = 100
+"""The default number of spooled notifications read per batch."""
+DEFAULT_DRAIN_INTERVAL = 30
+"""The default number of seconds between drains by a `SpoolDrainer`."""
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    server TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    config TEXT NOT NULL,
+    message TEXT NOT NULL
+)
+'''
+
+
+class Spool:
+    """A durable queue of notifications.
+
+    Notifications are stored with the config they were sent with, including
+    the server, topic, headers and credentials, so the spool directory and
+    database are only accessible by their owner. The message is stored after
+    the timestamp is added so replayed notifications keep the time they were
+    created.
+
+    Arguments:
+        directory (str): The directory to keep the spool in. It is created if
+            it does not exist.
+        sync (str, optional): How hard SQLite tries to make writes durable.
+            One of `'off'`, `'normal'` or `'full'`. `'full'` calls fsync on
+            every enqueue.
+
+    Raises:
+        NtfyrConfigException: If `sync` is invalid.
+    """
+
+    def __init__(self, directory, sync='normal'):
+        if sync not in SPOOL_SYNC_MODES:
+            raise NtfyrConfigException(
+                f'Invalid value for `spool_sync`: {sync}'
+            )
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.directory.chmod(0o700)
+        path = self.directory.joinpath('spool.sqlite3')
+        # Spools created by older versions might be readable by others.
+        for name in (path.name, f'{path.name}-wal', f'{path.name}-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                self.directory.joinpath(name).chmod(0o600)
+        self._lock = threading.Lock()
+        # SQLite creates the WAL and shared memory files with the mode of the
+        #   database.
+        old_umask = os.umask(0o077)
+        try:
+            self._db = sqlite3.connect(
+                path,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._db.execute('PRAGMA journal_mode = WAL')
+        finally:
+            os.umask(old_umask)
+        self._db.execute(f'PRAGMA synchronous = {sync.upper()}')
+        self._db.execute(_SCHEMA)
+
+    def enqueue(self, config, message):
+        """Add a notification to the end of the spool.
+
+        Arguments:
+            config (Config): The config the notification was sent with.
+            message (str): The body of the message with any timestamp already
+                added.
+        """
+        stored_config = dataclasses.asdict(config)
+        # The notification was already checked for duplicates.
+        stored_config.update(
+            include_timestamp=False, timestamp=None, spool=None, dedup_ttl=None
+        )
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO notifications (created, server, topic, config, '
+                'message) VALUES (?, ?, ?, ?, ?)',
+                (
+                    time.time(),
+                    config.server,
+                    config.topic,
+                    json.dumps(stored_config),
+                    message,
+                ),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM notifications'
+            ).fetchone()[0]
+
+    def _read(self, after, limit):
+        with self._lock:
+            return self._db.execute(
+                'SELECT id, server, config, message FROM notifications '
+                'WHERE id > ? ORDER BY id LIMIT ?',
+                (after, limit),
+            ).fetchall()
+
+    def _ack(self, ids):
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany(
+                'DELETE FROM notifications WHERE id = ?',
+                [(id_,) for id_ in ids],
+            )
+            self._db.execute('COMMIT')
+
+    def compact(self):
+        """Reclaim the disk space used by notifications that were sent."""
+        with self._lock:
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            empty = not self._db.execute(
+                'SELECT 1 FROM notifications LIMIT 1'
+            ).fetchone()
+            if empty:
+                self._db.execute('VACUUM')
+
+    @contextlib.contextmanager
+    def _drain_lock(self):
+        """Yield `True` if no other process or thread is draining the spool."""
+        with open(self.directory.joinpath('drain.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def drain(self, session=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Send the spooled notifications in the order they were spooled.
+
+        Notifications for a server that fails with an error that is safe to
+        retry stay in the spool, along with every later notification for that
+        server, so the order is kept. Notifications that are rejected
+        permanently are dropped. So are notifications that timed out while
+        waiting for the reply, since the server might have accepted them and
+        sending them again could duplicate them.
+
+        Arguments:
+            session (requests.Session, optional): The session to send with.
+            batch_size (int, optional): The number of notifications to read
+                and acknowledge at a time.
+
+        Returns:
+            int: The number of notifications sent.
+        """
+        with self._drain_lock() as locked:
+            if not locked:
+                log.debug('The spool in %s is already draining', self.directory)
+                return 0
+            owns_session = session is None
+            if owns_session:
+                session = _new_session()
+            try:
+                sent = self._drain(session, batch_size)
+            finally:
+                if owns_session:
+                    session.close()
+        if sent:
+            self.compact()
+        return sent
+
+    def _drain(self, session, batch_size):
+        sent = 0
+        last_id = 0
+        failed_servers = set()
+        while True:
+            rows = self._read(last_id, batch_size)
+            if not rows:
+                return sent
+            acked = []
+            for id_, server, stored_config, message in rows:
+                last_id = id_
+                if server in failed_servers:
+                    continue
+                config = Config().update(
+                    {
+                        key: value
+                        for key, value in json.loads(stored_config).items()
+                        if value is not None
+                    }
+                )
+                try:
+                    with NtfyClient(config, session=session) as client:
+                        client.send(message)
+                    sent += 1
+                except NtfyrError as err:
+                    if _is_retryable(err):
+                        log.warning(
+                            'Leaving notifications for %s spooled: %s',
+                            server,
+                            err.message,
+                        )
+                        failed_servers.add(server)
+                        continue
+                    if err.status_code is None:
+                        # Keep the later notifications in order.
+                        failed_servers.add(server)
+                    log.error(
+                        'Dropping spooled notification to %s/%s that might '
+                        'not have been sent: %s',
+                        server,
+                        config.topic,
+                        err.message,
+                    )
+                acked.append(id_)
+            self._ack(acked)
+
+    def close(self):
+        """Close the spool database."""
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SpoolDrainer(threading.Thread):
+    """A background thread that drains a spool periodically.
+
+    Arguments:
+        spool (Spool): The spool to drain.
+        interval (float, optional): Seconds between drains.
+        session (requests.Session, optional): The session to send with.
+        batch_size (int, optional): The number of notifications to read and
+            acknowledge at a time.
+    """
+
+    def __init__(
+        self,
+        spool,
+        interval=DEFAULT_DRAIN_INTERVAL,
+        session=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        super().__init__(name='ntfyr-spool-drainer', daemon=True)
+        self.spool = spool
+        self.interval = interval
+        self.session = session
+        self.batch_size = batch_size
+        self._stopped = threading.Event()
+
+    def run(self):  # noqa: D102
+        while not self._stopped.wait(self.interval):
+            try:
+                sent = self.spool.drain(self.session, self.batch_size)
+            except (sqlite3.Error, OSError) as err:
+                log.error('Failed to drain the spool: %s', err)
+                continue
+            if sent:
+                log.info('Sent %s spooled notifications', sent)
+
+    def stop(self):
+        """Stop draining and wait for the thread to exit."""
+        self._stopped.set()
+        self.join()
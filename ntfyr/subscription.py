@@ -0,0 +1,277 @@
+"""Receive the messages published to a topic.
+
+`subscribe()` reads ntfy's `/json` endpoint, which streams one JSON event per
+line and sends a keepalive event every 45 seconds by default. The stream is
+read a line at a time as data arrives, so memory use stays the same however
+long the subscription runs. Keepalive and open events are dropped. A dropped
+connection is opened again with backoff and resumes after the last message
+received, or from the last keepalive if there was none, so no messages are
+missed. Messages received again at the boundary are dropped. When
+`cursor_path` is set in the config, where the subscription left off is saved
+there and a new subscription resumes from it (see `ntfyr.cursor`). When
+`archive_path` is set the messages are stored in a searchable archive (see
+`ntfyr.archive`).
+"""
+
+
+import json
+import math
+import time
+
+from ._common import log
+from .cursor import Cursor, Cursors
+from .errors import NtfyrError
+from .ntfyr import _get_credentials, _get_url, _is_transient, _new_session
+from .retry import RetryPolicy, parse_retry_after
+
+KEEPALIVE_TIMEOUT = 100.0
+"""Seconds without any data after which a connection is opened again.
+
+This is longer than two of ntfy's default keepalive intervals.
+"""
+MESSAGE_EVENT = 'message'
+"""The event of a published message. Other events are dropped."""
+
+_MAX_ERROR_SIZE = 200
+
+
+class Message:
+    """A message received from a topic.
+
+    The attributes have the names of the fields of ntfy's JSON message
+    format. Fields the server left out are `None`, except `priority` which
+    defaults to 3 and `tags` which defaults to an empty list.
+    """
+
+    __slots__ = (
+        'id',
+        'time',
+        'expires',
+        'topic',
+        'message',
+        'title',
+        'tags',
+        'priority',
+        'click',
+        'icon',
+        'actions',
+        'attachment',
+    )
+
+    def __init__(self, **fields):
+        fields.setdefault('priority', 3)
+        fields.setdefault('tags', [])
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_json(cls, event):
+        """Return the message in a decoded JSON event, ignoring extra fields."""
+        return cls(
+            **{name: event[name] for name in cls.__slots__ if name in event}
+        )
+
+    def as_dict(self):
+        """Return the fields that are set in ntfy's JSON message format."""
+        fields = {'event': MESSAGE_EVENT}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not None:
+                fields[name] = value
+        return fields
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}(id={self.id!r}, topic={self.topic!r}, '
+            f'message={self.message!r})'
+        )
+
+
+def _iter_events(session, config, url, params, auth, headers, timeout):
+    """Yield the decoded events of one connection to the `/json` endpoint.
+
+    Raises:
+        NtfyrError: If the connection failed or the server returned an error.
+    """
+    try:
+        res = session.get(
+            url,
+            params=params,
+            headers=headers,
+            auth=auth,
+            timeout=timeout,
+            stream=True,
+        )
+    except (OSError, ValueError) as err:
+        raise NtfyrError(
+            f'{err.__class__.__name__}: {err}',
+            server=config.server,
+            topic=config.topic,
+        ) from err
+    with res:
+        if not res.ok:
+            raise NtfyrError(
+                f'{res.status_code} {res.text[:_MAX_ERROR_SIZE]}',
+                server=config.server,
+                topic=config.topic,
+                status_code=res.status_code,
+                retry_after=parse_retry_after(res.headers.get('Retry-After')),
+            )
+        try:
+            for line in res.iter_lines():
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    log.warning(
+                        'Ignoring invalid event from %s: %r',
+                        url,
+                        line[:_MAX_ERROR_SIZE],
+                    )
+        except OSError as err:
+            # Read timeouts and broken connections while streaming.
+            raise NtfyrError(
+                f'{err.__class__.__name__}: {err}',
+                server=config.server,
+                topic=config.topic,
+            ) from err
+
+
+def subscribe(
+    config,
+    since=None,
+    poll=False,
+    keepalive_timeout=KEEPALIVE_TIMEOUT,
+    session=None,
+):
+    """Yield the messages published to the topic in `config`.
+
+    Several topics can be subscribed to at once by separating them with
+    commas in `config.topic`. The connection is opened again whenever it
+    drops, with the backoff set by `retry_delay` and `retry_max_delay` in
+    `config`, and resumes after the last message received.
+
+    Arguments:
+        config (Config): The server, topic and credentials to subscribe with.
+        since (str, optional): Also yield the messages the server cached
+            since a message ID, a Unix timestamp, a duration like `10m` or
+            `all`. If `None` the subscription resumes from the saved cursor
+            or only new messages are yielded. Otherwise the saved cursor is
+            started over.
+        poll (bool, optional): Yield the cached messages and return instead
+            of waiting for new ones.
+        keepalive_timeout (float, optional): Seconds without any data after
+            which the connection is considered dead and opened again.
+        session (requests.Session, optional): The session to connect with. A
+            new one is used by default and closed when the generator is.
+
+    Yields:
+        Message: Each message in the order the server sent them.
+
+    Raises:
+        NtfyrError: If the server or topic is missing, the credentials are
+            invalid or the server rejected the subscription. When `poll` is
+            set connection errors are raised too.
+    """
+    url = f'{_get_url(config)}/json'
+    auth = _get_credentials(config)
+    headers = {}
+    if config.token:
+        headers['Authorization'] = f'Bearer {config.token}'
+    timeout = (config.connect_timeout, keepalive_timeout)
+    policy = RetryPolicy(
+        max_attempts=math.inf,
+        base_delay=config.retry_delay,
+        max_delay=config.retry_max_delay,
+    )
+    archive = None
+    if config.archive_path:
+        from .archive import Archive
+
+        archive = Archive(config.archive_path)
+    if config.cursor_path:
+        cursors = Cursors(
+            config.cursor_path,
+            before_flush=archive.flush if archive is not None else None,
+        )
+        if since is not None:
+            cursors.reset(config.server, config.topic)
+        cursor = cursors.get(config.server, config.topic)
+        if since is None:
+            since = cursor.id
+    else:
+        cursors = None
+        cursor = Cursor()
+    own_session = session is None
+    if own_session:
+        session = _new_session(pool_connections=1, pool_maxsize=1)
+    attempt = 0
+    try:
+        while True:
+            params = {}
+            if since is not None:
+                params['since'] = str(since)
+            if poll:
+                params['poll'] = '1'
+            try:
+                for event in _iter_events(
+                    session, config, url, params, auth, headers, timeout
+                ):
+                    # Any event, including keepalives, shows the connection
+                    #   works so the backoff starts over.
+                    attempt = 0
+                    if event.get('event', MESSAGE_EVENT) != MESSAGE_EVENT:
+                        if since is None and event.get('time'):
+                            # Resume from here if no message arrives first.
+                            since = event['time']
+                        if archive is not None:
+                            archive.maybe_flush()
+                        if cursors:
+                            cursors.maybe_flush()
+                        continue
+                    message = Message.from_json(event)
+                    if message.id:
+                        if not cursor.is_new(message):
+                            log.debug(
+                                'Dropping duplicate message %s', message.id
+                            )
+                            continue
+                        if archive is not None:
+                            archive.add(config.server, message)
+                        if cursors:
+                            cursors.advance(
+                                config.server, config.topic, message
+                            )
+                        else:
+                            cursor.advance(message)
+                        since = message.id
+                    yield message
+                if poll:
+                    return
+                retry_after = None
+                log.info('The server closed the subscription to %s', url)
+            except NtfyrError as err:
+                if poll or not _is_transient(err):
+                    raise
+                retry_after = err.retry_after
+                log.warning('Lost the subscription to %s: %s', url, err)
+            attempt += 1
+            delay = policy.delay(attempt, retry_after)
+            if delay is None:
+                # The server asked to wait longer than the maximum delay.
+                delay = retry_after
+            log.info('Subscribing again in %.2f seconds', delay)
+            time.sleep(delay)
+    finally:
+        if own_session:
+            session.close()
+        if cursors:
+            cursors.close()
+        if archive is not None:
+            archive.close()
@@ -0,0 +1,100 @@
+"""Timestamps for notifications.
+
+Timestamps are rendered by a `TimestampFormatter` compiled once per format.
+The local timezone is looked up once and checked for changes every
+`ZONE_TTL` seconds or when `refresh()` is called, for example from a SIGHUP
+handler. The rendered timestamp is reused for every message sent in the same
+second.
+"""
+
+
+import functools
+import threading
+import time
+from datetime import datetime as dt
+
+ZONE_TTL = 60
+"""Seconds between checks for a change of the system timezone."""
+FORMATTER_CACHE_SIZE = 32
+"""The number of compiled timestamp formats kept."""
+MESSAGE_PLACEHOLDER = '%message'
+"""Where the message goes in a timestamp format."""
+
+_zone = None
+_zone_expires = 0.0
+_zone_lock = threading.Lock()
+
+
+def local_zone():
+    """Return the system timezone.
+
+    The timezone is cached for `ZONE_TTL` seconds or until `refresh()` is
+    called.
+    """
+    global _zone, _zone_expires
+
+    if _zone is not None and time.monotonic() < _zone_expires:
+        return _zone
+    import tzlocal
+
+    with _zone_lock:
+        if _zone is None or time.monotonic() >= _zone_expires:
+            # `get_localzone()` never looks at the system again.
+            _zone = tzlocal.reload_localzone()
+            _zone_expires = time.monotonic() + ZONE_TTL
+        return _zone
+
+
+def refresh():
+    """Look up the system timezone again before the next timestamp.
+
+    This is safe to call from a signal handler.
+    """
+    global _zone_expires
+
+    _zone_expires = 0.0
+
+
+class TimestampFormatter:
+    """Prefix messages with the local time.
+
+    Arguments:
+        ts_format (str): A `strftime` format. `%message` marks where the
+            message goes. Otherwise the message follows the timestamp after a
+            space. See https://docs.python.org/3/library/time.html#time.strftime
+            for formatting options.
+    """
+
+    def __init__(self, ts_format):
+        self.format = ts_format
+        if MESSAGE_PLACEHOLDER in ts_format:
+            self._parts = ts_format.split(MESSAGE_PLACEHOLDER)
+        else:
+            self._parts = [f'{ts_format} ', '']
+        # Sub-second formats can not be reused for the rest of the second.
+        self._per_second = '%f' not in ts_format
+        self._cached = (None, None, None)
+
+    def _render(self):
+        """Return the timestamp parts for the current time."""
+        zone = local_zone()
+        now = time.time()
+        second = int(now)
+        cached_second, cached_zone, rendered = self._cached
+        if cached_second == second and cached_zone is zone:
+            return rendered
+        when = dt.fromtimestamp(second if self._per_second else now, zone)
+        rendered = [when.strftime(part) for part in self._parts]
+        if self._per_second:
+            self._cached = (second, zone, rendered)
+        return rendered
+
+    def __call__(self, message):
+        """Return `message` with the timestamp for the current time."""
+        return message.join(self._render())
+
+
+@functools.lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def get_formatter(ts_format):
+    """Return the shared `TimestampFormatter` for `ts_format`."""
+    return TimestampFormatter(ts_format)
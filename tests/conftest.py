@@ -1,3 +1,10 @@
-import pytest  # noqa: F401
+import pytest
 
 from .fixtures.ntfy_server import ntfy_server  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def no_config_cache(monkeypatch):
+    """Keep tests from reading or writing the user's config cache."""
+    monkeypatch.setenv('NTFYR_CONFIG_CACHE', '')
+    monkeypatch.setattr('ntfyr.config._search_result', None)
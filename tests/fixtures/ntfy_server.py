@@ -1,13 +1,23 @@
-"""A super simple mock ntfy server."""
+"""A mock ntfy server for tests and benchmarks.
 
+`MockNtfyServer` answers publish requests like ntfy and streams the published
+messages from the `/<topic>/json` subscribe endpoint. It serves each
+connection in its own thread with HTTP/1.1 keep-alive and records every
+request. Latency, 429 and 5xx responses and `Retry-After` headers can be
+injected to test retries, failover and throughput offline.
+"""
+
+import collections
 import http.server
-import io
+import json
+import random
+import secrets
 import socket
 import socketserver
 import threading
 import time
-from dataclasses import dataclass
-from typing import Callable
+import urllib.parse
+from dataclasses import dataclass, field
 
 import pytest
 
@@ -83,20 +93,14 @@ class _Ports:
         raise NoFeePort()
 
 
-class _RequestHandler(http.server.BaseHTTPRequestHandler):
-    _consume_request: Callable[[str, dict, io.BufferedIOBase], None] = None
-
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        message = self.rfile.read(content_length)
-        self._consume_request(self.path, self.headers, message.decode())
-        echo = f'{{"message": "{message.decode()}"}}'.encode("utf-8")
-        self.send_response(http.server.HTTPStatus.ACCEPTED)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Content-Length', str(len(echo)))
-        self.end_headers()
-        self.wfile.write(echo)
-        self.wfile.flush()
+_PRIORITIES = {
+    'min': 1,
+    'low': 2,
+    'default': 3,
+    'high': 4,
+    'max': 5,
+    'urgent': 5,
+}
 
 
 @dataclass
@@ -104,32 +108,350 @@ class _Request:
     path: str = None
     headers: dict = None
     content: str = None
+    method: str = None
+    body: bytes = None
+    status: int = None
+    client_address: tuple = None
+    time: float = field(default_factory=time.monotonic)
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    mock: 'MockNtfyServer' = None
+
+    def server_bind(self):
+        # Skip the reverse DNS lookup `HTTPServer` does for its name.
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = self.server_address[:2]
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and body are written separately. Without this the body
+    #   waits for the client's delayed ACK on kept-alive connections.
+    disable_nagle_algorithm = True
+    server: _HTTPServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+            return self.rfile.read(int(self.headers['Content-Length'] or 0))
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                break
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+        # Skip the trailers.
+        while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+            pass
+        return b''.join(chunks)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        mock = self.server.mock
+        body = b'' if self.command == 'GET' else self._read_body()
+        url = urllib.parse.urlsplit(self.path)
+        topics = url.path.strip('/')
+        if self.command == 'GET':
+            topics = topics[: -len('/json')] if topics.endswith('/json') else ''
+        status, headers = mock._respond()
+        if status == 200 and not topics:
+            status = 404
+        mock._log(
+            _Request(
+                path=self.path,
+                headers=self.headers,
+                content=body.decode('utf-8', 'replace'),
+                method=self.command,
+                body=body,
+                status=status,
+                client_address=self.client_address,
+            )
+        )
+        if status != 200:
+            self._send_json(
+                status,
+                {
+                    'code': status * 100,
+                    'http': status,
+                    'error': http.HTTPStatus(status).phrase.lower(),
+                },
+                headers,
+            )
+        elif self.command == 'GET':
+            query = urllib.parse.parse_qs(url.query)
+            self._subscribe(
+                topics.split(','),
+                query.get('since', [None])[0],
+                query.get('poll', ['0'])[0] in ('1', 'true', 'yes'),
+            )
+        else:
+            self._send_json(200, mock._publish(topics, body, self.headers))
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _subscribe(self, topics: list, since: str, poll: bool):
+        mock = self.server.mock
+        messages, seq = mock._cached(topics, since)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        if poll:
+            data = b''.join(_event_line(message) for message in messages)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        topic = ','.join(topics)
+        try:
+            self._write_chunk(_event_line(_event('open', topic)))
+            for message in messages:
+                self._write_chunk(_event_line(message))
+            while True:
+                messages, seq = mock._wait_for_messages(topics, seq)
+                if messages is None:
+                    break
+                for message in messages:
+                    self._write_chunk(_event_line(message))
+                if not messages:
+                    self._write_chunk(_event_line(_event('keepalive', topic)))
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+def _event(event: str, topic: str, **fields) -> dict:
+    return dict(
+        id=secrets.token_urlsafe(9),
+        time=int(time.time()),
+        event=event,
+        topic=topic,
+        **fields,
+    )
+
+
+def _event_line(event: dict) -> bytes:
+    return json.dumps(event).encode('utf-8') + b'\n'
 
 
 class MockNtfyServer(threading.Thread):
-    def __init__(self, *args, **kwargs):
-        threading.Thread.__init__(self, *args, daemon=True, **kwargs)
+    """A local stand-in for a ntfy server.
+
+    The injected behavior can be changed while the server is running.
+
+    Arguments:
+        latency: Seconds to wait before answering each request.
+        error_rate: The fraction of requests answered with `error_status`.
+        error_status: The status of injected errors. Defaults to 503.
+        rate_limit_rate: The fraction of requests answered with a 429.
+        retry_after: The `Retry-After` header sent with injected 429 and
+            5xx responses. Not sent if `None`.
+        keepalive_interval: Seconds between keepalive events on subscribe
+            streams with no messages.
+        cache_size: The number of published messages kept for subscribers.
+        seed: The seed of the random injected errors.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        rate_limit_rate: float = 0.0,
+        retry_after: str = None,
+        keepalive_interval: float = 45.0,
+        cache_size: int = 1000,
+        seed: int = None,
+    ):
+        threading.Thread.__init__(self, daemon=True)
         self.port: int = _Ports.free_port()
-        self._request: _Request = None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.keepalive_interval = keepalive_interval
+        self._random = random.Random(seed)
+        self._forced = collections.deque()
+        self._requests: list[_Request] = []
+        self._messages = collections.deque(maxlen=cache_size)
+        self._seq = 0
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._server: _HTTPServer = None
+        self._listening = threading.Event()
+
+    def start(self):
+        """Start the server and wait until it accepts connections."""
+        super().start()
+        self._listening.wait()
+
+    def stop(self):
+        """Stop the server and end the subscribe streams."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        self.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
 
     @property
     def url(self) -> str:
         return f'http://localhost:{self.port}'
 
-    def _consume_request(self, path: str, headers: dict, content: str):
-        self._request = _Request(path, headers, content)
+    @property
+    def requests(self) -> list[_Request]:
+        """A copy of the log of every request received so far."""
+        with self._condition:
+            return list(self._requests)
+
+    def fail_next(self, count: int = 1, status: int = 503, retry_after=None):
+        """Answer the next `count` requests with `status`."""
+        with self._condition:
+            self._forced.extend([(status, retry_after)] * count)
+
+    def wait_for_requests(self, count: int, timeout: float = 10.0):
+        """Wait until `count` requests were received and return the log."""
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: len(self._requests) >= count, timeout
+            ):
+                raise TimeoutError(f'Got {len(self._requests)} requests')
+            return list(self._requests)
+
+    def get_request(self, index: int = -1, timeout: float = 10.0) -> _Request:
+        """Wait for a request and return it. Defaults to the latest one."""
+        return self.wait_for_requests(
+            index + 1 if index >= 0 else -index, timeout
+        )[index]
+
+    def _log(self, request: _Request):
+        with self._condition:
+            self._requests.append(request)
+            self._condition.notify_all()
+
+    def _respond(self) -> tuple[int, dict]:
+        """Wait out the latency and return the status and headers to send."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._condition:
+            if self._forced:
+                status, retry_after = self._forced.popleft()
+            else:
+                retry_after = self.retry_after
+                draw = self._random.random()
+                if draw < self.rate_limit_rate:
+                    status = 429
+                elif draw < self.rate_limit_rate + self.error_rate:
+                    status = self.error_status
+                else:
+                    return 200, {}
+        if retry_after is None:
+            return status, {}
+        return status, {'Retry-After': str(retry_after)}
+
+    def _publish(self, topic: str, body: bytes, headers) -> dict:
+        fields = {}
+        if headers.get('Title'):
+            fields['title'] = headers['Title']
+        priority = headers.get('Priority')
+        if priority:
+            fields['priority'] = _PRIORITIES.get(priority) or int(priority)
+        if headers.get('Tags'):
+            fields['tags'] = headers['Tags'].split(',')
+        if headers.get('Click'):
+            fields['click'] = headers['Click']
+        if headers.get('Filename'):
+            fields['attachment'] = {
+                'name': headers['Filename'],
+                'size': len(body),
+            }
+            text = headers.get('Message') or (
+                f'You received a file: {headers["Filename"]}'
+            )
+        else:
+            text = body.decode('utf-8', 'replace')
+        message = _event('message', topic, message=text, **fields)
+        with self._condition:
+            self._seq += 1
+            self._messages.append((self._seq, message))
+            self._condition.notify_all()
+        return message
+
+    def _cached(self, topics: list, since: str) -> tuple[list, int]:
+        """Return the cached messages `since` asks for and the last seq."""
+        with self._condition:
+            cached = [
+                (seq, message)
+                for seq, message in self._messages
+                if message['topic'] in topics
+            ]
+            if since is None:
+                cached = []
+            elif since.isdigit():
+                cached = [m for m in cached if m[1]['time'] >= int(since)]
+            elif since != 'all':
+                ids = [message['id'] for _, message in cached]
+                if since in ids:
+                    cached = cached[ids.index(since) + 1 :]
+            return [message for _, message in cached], self._seq
+
+    def _wait_for_messages(self, topics: list, seq: int) -> tuple[list, int]:
+        """Wait for messages published after `seq`.
+
+        Returns:
+            The new messages, empty if `keepalive_interval` passed first or
+            `None` if the server is stopping, and the last seq.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stopping or self._seq > seq,
+                self.keepalive_interval,
+            )
+            if self._stopping:
+                return None, seq
+            messages = [
+                message
+                for message_seq, message in self._messages
+                if message_seq > seq and message['topic'] in topics
+            ]
+            return messages, self._seq
 
     def run(self):
-        _RequestHandler._consume_request = self._consume_request
         address = ('localhost', self.port)
-        with socketserver.TCPServer(address, _RequestHandler) as sock:
-            sock.handle_request()
-
-    def get_request(self) -> _Request:
-        while self.is_alive():
-            time.sleep(0.01)
-        self.join()
-        return self._request
+        try:
+            self._server = _HTTPServer(address, _RequestHandler)
+            self._server.mock = self
+        finally:
+            self._listening.set()
+        self._server.serve_forever(poll_interval=0.05)
 
 
 @pytest.fixture()
@@ -137,4 +459,4 @@ def ntfy_server():
     server = MockNtfyServer()
     server.start()
     yield server
-    server.join()
+    server.stop()
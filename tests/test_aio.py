@@ -0,0 +1,184 @@
+"""Asyncio `ntfyr` functionality."""
+
+import asyncio
+import base64
+import json
+
+import pytest
+
+from ntfyr import health
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+
+aio = pytest.importorskip('ntfyr.aio')
+
+
+class _MockResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class _MockSession:
+    def __init__(self, status=200, body=b'{}', delay=0, headers=None):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._status = status
+        self._body = body
+        self._delay = delay
+        self._headers = headers
+
+    def post(self, url, headers, data, timeout):
+        self.requests.append(
+            dict(url=url, headers=headers, data=data, timeout=timeout)
+        )
+        session = self
+
+        class _Context(_MockResponse):
+            async def __aenter__(self):
+                session.in_flight += 1
+                session.max_in_flight = max(
+                    session.max_in_flight, session.in_flight
+                )
+                if session._delay:
+                    await asyncio.sleep(session._delay)
+                session.in_flight -= 1
+                return self
+
+        return _Context(self._status, self._body, self._headers)
+
+
+def test_async_client_send():
+    session = _MockSession(body=b'{"id": "abc"}')
+    config = Config(
+        topic='topic value',
+        server='server value',
+        title='title value',
+        user='user value',
+        password='password value',
+    )
+
+    async def _send():
+        async with aio.AsyncNtfyClient(session=session) as client:
+            return await client.send(config, 'test message')
+
+    assert asyncio.run(_send()) == {'id': 'abc'}
+    request = session.requests[0]
+    assert request['url'] == f'{config.server}/{config.topic}'
+    basic = base64.b64encode(b'user value:password value').decode()
+    assert request['headers'] == {
+        'Title': config.title,
+        'Authorization': f'Basic {basic}',
+    }
+    assert request['data'] == b'test message'
+
+
+def test_async_client_concurrency_limit():
+    session = _MockSession(delay=0.01)
+    config = Config(topic='topic value', server='server value')
+
+    async def _send():
+        client = aio.AsyncNtfyClient(session=session, concurrency=3)
+        await asyncio.gather(*(client.send(config, str(i)) for i in range(10)))
+
+    asyncio.run(_send())
+    assert len(session.requests) == 10
+    assert session.max_in_flight == 3
+
+
+def test_async_client_error():
+    error = {'error': 'error text', 'link': 'error link'}
+    session = _MockSession(status=500, body=json.dumps(error).encode())
+    config = Config(topic='topic value', server='server value')
+
+    async def _send():
+        await aio.AsyncNtfyClient(session=session).send(config, 'message')
+
+    with pytest.raises(NtfyrError) as err:
+        asyncio.run(_send())
+    assert err.value.message == 'error text error link'
+    assert err.value.topic == config.topic
+
+
+def test_async_client_invalid_config():
+    async def _send():
+        await aio.AsyncNtfyClient(session=_MockSession()).send(Config(), '')
+
+    with pytest.raises(NtfyrError):
+        asyncio.run(_send())
+
+
+def test_async_client_retries(mocker):
+    sleep = mocker.patch('ntfyr.aio.asyncio.sleep')
+    session = _MockSession(status=429, body=b'{}', headers={'Retry-After': '2'})
+    config = Config(topic='topic value', server='server value', max_attempts=3)
+
+    async def _send():
+        await aio.AsyncNtfyClient(session=session).send(config, 'message')
+
+    with pytest.raises(NtfyrError) as err:
+        asyncio.run(_send())
+    assert err.value.attempts == 3
+    assert len(session.requests) == 3
+    assert sleep.call_args_list == [mocker.call(2.0), mocker.call(2.0)]
+
+
+class _FailoverSession(_MockSession):
+    def __init__(self, down):
+        super().__init__()
+        self._down = down
+
+    def post(self, url, headers, data, timeout):
+        if url.startswith(self._down):
+            self.requests.append(dict(url=url))
+            return _MockResponse(503, b'{"error": "down"}')
+        return super().post(url, headers, data, timeout)
+
+
+def test_async_client_failover():
+    health.reset()
+    session = _FailoverSession(down='https://a')
+    config = Config(
+        topic='topic',
+        server='https://a',
+        failover=['https://b=2'],
+        circuit_threshold=2,
+        max_attempts=1,
+    )
+
+    async def _send():
+        client = aio.AsyncNtfyClient(session=session)
+        for _ in range(3):
+            await client.send(config, 'message')
+
+    asyncio.run(_send())
+    health.reset()
+    # The circuit of the first server opened after 2 failures.
+    assert [request['url'] for request in session.requests] == [
+        'https://a/topic',
+        'https://b/topic',
+        'https://a/topic',
+        'https://b/topic',
+        'https://b/topic',
+    ]
+
+
+def test_async_client_spool(tmp_path):
+    config = Config(topic='topic', server='server', spool=str(tmp_path))
+
+    async def _send():
+        await aio.AsyncNtfyClient(session=_MockSession()).send(config, '')
+
+    with pytest.raises(NtfyrError):
+        asyncio.run(_send())
@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from ntfyr.__main__ import main
+from ntfyr.archive import Archive, parse_time
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrConfigException
+from ntfyr.subscription import Message, subscribe
+
+from .test_subscription import _Response, _Session
+
+
+def _message(message_id, time, message, topic='alerts', **fields):
+    return Message(
+        id=message_id,
+        time=time,
+        topic=topic,
+        message=message,
+        **fields,
+    )
+
+
+@pytest.fixture()
+def archive(tmp_path):
+    with Archive(tmp_path.joinpath('archive.sqlite3')) as archive:
+        archive.add('https://a', _message('1', 100, 'Disk full on db1'))
+        archive.add(
+            'https://a',
+            _message(
+                '2',
+                200,
+                'Backup finished',
+                title='db1',
+                tags=['backup', 'ok'],
+                priority=2,
+            ),
+        )
+        archive.add(
+            'https://a',
+            _message('3', 300, 'Disk full on web1', priority=5, tags=['disk']),
+        )
+        archive.add('https://a', _message('4', 400, 'Deployed', topic='ci'))
+        # Received again from the same server.
+        archive.add('https://a', _message('4', 400, 'Deployed', topic='ci'))
+        yield archive
+
+
+def _ids(messages):
+    return [message.id for message in messages]
+
+
+def test_search(archive):
+    assert len(archive) == 4
+    assert _ids(archive.search()) == ['4', '3', '2', '1']
+    assert _ids(archive.search(text='disk FULL')) == ['3', '1']
+    assert _ids(archive.search(text='db1')) == ['2', '1']
+    # Query syntax is matched as text.
+    assert _ids(archive.search(text='"full*')) == ['3', '1']
+    assert _ids(archive.search(topic='alerts', since=200)) == ['3', '2']
+    assert _ids(archive.search(until=300)) == ['2', '1']
+    assert _ids(archive.search(priority=4)) == ['3']
+    assert _ids(archive.search(tags=['backup', 'ok'])) == ['2']
+    assert _ids(archive.search(tags=['backup', 'disk'])) == []
+    assert _ids(archive.search(limit=1)) == ['4']
+    assert archive.search(tags=['disk'])[0] == _message(
+        '3', 300, 'Disk full on web1', priority=5, tags=['disk']
+    )
+
+
+def test_search_without_full_text(archive):
+    archive.full_text = False
+    assert _ids(archive.search(text='disk FULL')) == ['3', '1']
+    assert _ids(archive.search(text='db1')) == ['2', '1']
+
+
+def test_batched_inserts(tmp_path):
+    path = tmp_path.joinpath('archive.sqlite3')
+    archive = Archive(path, flush_size=2)
+    other = Archive(path)
+    archive.add('https://a', _message('1', 100, 'one'))
+    assert len(other) == 0
+    archive.add('https://a', _message('2', 100, 'two'))
+    assert len(other) == 2
+    archive.add('https://a', _message('3', 100, 'three'))
+    archive.close()
+    assert len(other) == 3
+    other.close()
+
+
+def test_parse_time(mocker):
+    mocker.patch('ntfyr.archive.time.time', return_value=1000000)
+    assert parse_time('1700000000') == 1700000000
+    assert parse_time('1d2h') == 1000000 - 86400 - 7200
+    assert parse_time('2023-11-14T22:13:20+00:00') == 1700000000
+    with pytest.raises(ValueError):
+        parse_time('yesterday')
+
+
+def test_subscribe_archive(tmp_path, mocker):
+    mocker.patch('ntfyr.subscription.time.sleep')
+    path = tmp_path.joinpath('archive.sqlite3')
+    config = Config(
+        server='https://server',
+        topic='alerts',
+        archive_path=str(path),
+        cursor_path=str(tmp_path.joinpath('cursors.json')),
+    )
+    lines = [
+        dict(_message('1', 100, 'one').as_dict()),
+        dict(_message('2', 200, 'two').as_dict()),
+    ]
+    session = _Session(_Response(lines=lines))
+    assert _ids(subscribe(config, poll=True, session=session)) == ['1', '2']
+    with Archive(path) as archive:
+        assert _ids(archive.search()) == ['2', '1']
+
+
+def test_main_search(archive, capsys):
+    archive.flush()
+    main(
+        [
+            'search',
+            'disk',
+            '--since',
+            '200',
+            '-P',
+            'high',
+            '--format',
+            'text',
+            '--archive',
+            str(archive.path),
+            '-c',
+            str(archive.path.with_name('missing.ini')),
+        ]
+    )
+    assert capsys.readouterr().out == 'Disk full on web1\n'
+
+
+def test_main_search_json(archive, capsys, tmp_path):
+    archive.flush()
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text(f'[ntfyr]\narchive_path = {archive.path}\n')
+    main(['search', '-t', 'ci', '-c', str(config_path)])
+    assert json.loads(capsys.readouterr().out)['message'] == 'Deployed'
+
+
+def test_main_search_no_archive(tmp_path):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\n')
+    with pytest.raises(NtfyrConfigException):
+        main(['search', '-c', str(config_path)])
+    with pytest.raises(SystemExit):
+        main(['search', '--since', 'yesterday', '-c', str(config_path)])
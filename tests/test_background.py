@@ -0,0 +1,168 @@
+"""Fire-and-forget notifications sent from background threads."""
+
+import threading
+from collections import namedtuple
+
+import pytest
+
+from ntfyr import background
+from ntfyr.background import BackgroundSender, notify_async_background
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError, NtfyrQueueFullError
+
+_Response = namedtuple(
+    'mock_response',
+    ['ok', 'json', 'status_code', 'content', 'headers'],
+)
+
+
+def _mock_post_factory(release=None, started=None):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        if started is not None:
+            started.set()
+        if release is not None:
+            release.wait(5)
+        sent.append(data)
+        if data == b'bad':
+            return _Response(False, lambda: {'error': 'bad'}, 400, b'', {})
+        return _Response(True, lambda: {'message': data.decode()}, 200, b'', {})
+
+    return sent, _mock_post
+
+
+def _config(**kwargs):
+    return Config(topic='topic value', server='http://server', **kwargs)
+
+
+def test_submit(mocker):
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    with BackgroundSender() as sender:
+        good = sender.submit(_config(), 'good')
+        bad = sender.submit(_config(), 'bad')
+        assert good.result(5) == {'message': 'good'}
+        with pytest.raises(NtfyrError):
+            bad.result(5)
+    assert sent == [b'good', b'bad']
+
+
+def test_submit_timestamp_when_queued(mocker):
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    format_message = mocker.patch(
+        'ntfyr.background._format_message', return_value='stamped'
+    )
+    config = _config(include_timestamp=True, timestamp='%Y')
+    with BackgroundSender() as sender:
+        sender.submit(config, 'message').result(5)
+    format_message.assert_called_once_with(config, 'message')
+    assert sent == [b'stamped']
+
+
+def test_drop_newest(mocker):
+    release = threading.Event()
+    started = threading.Event()
+    sent, mock_post = _mock_post_factory(release, started)
+    mocker.patch('requests.Session.post', mock_post)
+    sender = BackgroundSender(queue_size=1, full_policy='drop_newest')
+    first = sender.submit(_config(), 'first')
+    # Wait for the worker to take the first notification.
+    assert started.wait(5)
+    second = sender.submit(_config(), 'second')
+    third = sender.submit(_config(), 'third')
+    with pytest.raises(NtfyrQueueFullError):
+        third.result(0)
+    release.set()
+    sender.close()
+    assert first.result(0) and second.result(0)
+    assert sent == [b'first', b'second']
+
+
+def test_drop_oldest(mocker):
+    release = threading.Event()
+    started = threading.Event()
+    sent, mock_post = _mock_post_factory(release, started)
+    mocker.patch('requests.Session.post', mock_post)
+    sender = BackgroundSender(queue_size=1, full_policy='drop_oldest')
+    sender.submit(_config(), 'first')
+    assert started.wait(5)
+    second = sender.submit(_config(), 'second')
+    sender.submit(_config(), 'third')
+    with pytest.raises(NtfyrQueueFullError):
+        second.result(0)
+    release.set()
+    sender.close()
+    assert sent == [b'first', b'third']
+
+
+def test_block(mocker):
+    release = threading.Event()
+    sent, mock_post = _mock_post_factory(release)
+    mocker.patch('requests.Session.post', mock_post)
+    sender = BackgroundSender(queue_size=1)
+    sender.submit(_config(), 'first')
+    sender.submit(_config(), 'second')
+    submitted = threading.Event()
+
+    def _submit():
+        sender.submit(_config(), 'third')
+        submitted.set()
+
+    threading.Thread(target=_submit).start()
+    assert not submitted.wait(0.1)
+    release.set()
+    assert submitted.wait(5)
+    sender.close()
+    assert sent == [b'first', b'second', b'third']
+
+
+def test_close_timeout(mocker):
+    release = threading.Event()
+    started = threading.Event()
+    sent, mock_post = _mock_post_factory(release, started)
+    mocker.patch('requests.Session.post', mock_post)
+    sender = BackgroundSender()
+    sender.submit(_config(), 'first')
+    assert started.wait(5)
+    second = sender.submit(_config(), 'second')
+    sender.close(timeout=0.1)
+    release.set()
+    with pytest.raises(NtfyrError):
+        second.result(0)
+    with pytest.raises(NtfyrError):
+        sender.submit(_config(), 'closed')
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        BackgroundSender(full_policy='invalid')
+
+
+def test_notify_async_background(mocker):
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    mocker.patch('ntfyr.background._default_sender', None)
+    future = notify_async_background(_config(), 'message')
+    assert future.result(5) == {'message': 'message'}
+    assert notify_async_background(_config(), 'again').result(5)
+    background._default_sender.close()
+
+
+def test_dedup_with_timestamp(mocker):
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    mocker.patch('ntfyr.dedup._deduplicators', {})
+    stamps = iter(['first', 'second', 'third'])
+    mocker.patch(
+        'ntfyr.background._format_message',
+        side_effect=lambda config, message: f'{next(stamps)} {message}',
+    )
+    config = _config(include_timestamp=True, timestamp='%S', dedup_ttl=60)
+    with BackgroundSender() as sender:
+        assert sender.submit(config, 'message').result(5)
+        # Stamped with a different time but the same message.
+        assert sender.submit(config, 'message').result(5) is None
+        assert sender.submit(config, 'other').result(5)
+    assert sent == [b'first message', b'third other']
@@ -1,4 +1,5 @@
 import argparse
+import json
 import os
 import pathlib
 
@@ -6,10 +7,13 @@ import pytest
 
 from ntfyr.__main__ import _parse_args
 from ntfyr.config import (
+    PRIORITIES,
     Config,
     NamespaceAdapter,
     _config_paths,
     _convert_source,
+    _stat_signature,
+    priority_rank,
 )
 from ntfyr.errors import NtfyrConfigException
 
@@ -236,3 +240,198 @@ def test_config_update_invalid_choice():
     with pytest.raises(NtfyrConfigException):
         # Pass type test to get to choice test
         config.update({'priority': 'banana'})
+
+
+def test_config_update_numbers():
+    config = Config()
+    config.update({'max_attempts': '3', 'retry_delay': '0.25'})
+    assert config.max_attempts == 3
+    assert config.retry_delay == 0.25
+    config.update({'retry_max_delay': 10})
+    assert config.retry_max_delay == 10.0
+
+
+def test_config_update_invalid_number():
+    config = Config()
+    with pytest.raises(NtfyrConfigException):
+        config.update({'max_attempts': 'banana'})
+    with pytest.raises(NtfyrConfigException):
+        config.update({'max_attempts': 1.5})
+
+
+def test_convert_source_path_cached(tmp_path, mocker):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = cached\n')
+    assert _convert_source(config_ini) == {'topic': 'cached'}
+    read_text = mocker.spy(pathlib.Path, 'read_text')
+    assert _convert_source(config_ini) == {'topic': 'cached'}
+    read_text.assert_not_called()
+
+
+def test_convert_source_path_changed(tmp_path):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = old\n')
+    assert _convert_source(config_ini) == {'topic': 'old'}
+    config_ini.write_text('[ntfyr]\ntopic = newer\n')
+    assert _convert_source(config_ini) == {'topic': 'newer'}
+
+
+def test_config_search_cache(tmp_path, mocker):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = cached\ntags = tag\n')
+    cache_path = tmp_path.joinpath('cache', 'config.json')
+    mocker.patch.dict(
+        os.environ,
+        {
+            'NTFYR_CONFIGS': str(config_ini),
+            'NTFYR_CONFIG_CACHE': str(cache_path),
+        },
+        clear=True,
+    )
+    assert Config().search().topic == 'cached'
+    assert cache_path.stat().st_mode & 0o777 == 0o600
+    # A new process only has the cache on disk.
+    mocker.patch('ntfyr.config._search_result', None)
+    read_source = mocker.patch('ntfyr.config._read_source')
+    config = Config().search()
+    read_source.assert_not_called()
+    assert config.topic == 'cached'
+    assert config.tags == ['tag']
+    assert config.server == Config().server
+
+
+def test_config_search_cache_invalidated(tmp_path, mocker):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = old\n')
+    cache_path = tmp_path.joinpath('config.json')
+    mocker.patch.dict(
+        os.environ,
+        {
+            'NTFYR_CONFIGS': str(config_ini),
+            'NTFYR_CONFIG_CACHE': str(cache_path),
+        },
+        clear=True,
+    )
+    assert Config().search().topic == 'old'
+    config_ini.write_text('[ntfyr]\ntopic = newer\n')
+    mocker.patch('ntfyr.config._search_result', None)
+    assert Config().search().topic == 'newer'
+
+
+def test_config_search_cache_other_version(tmp_path, mocker):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = current\n')
+    cache_path = tmp_path.joinpath('config.json')
+    mocker.patch.dict(
+        os.environ,
+        {
+            'NTFYR_CONFIGS': str(config_ini),
+            'NTFYR_CONFIG_CACHE': str(cache_path),
+        },
+        clear=True,
+    )
+    mocker.patch('ntfyr.config._search_result', None)
+    Config().search()
+    # Written by a version of ntfyr with other config fields.
+    cached = json.loads(cache_path.read_text())
+    cached['signature'][0].remove('topic')
+    cached['values']['topic'] = 'stale'
+    cache_path.write_text(json.dumps(cached))
+    mocker.patch('ntfyr.config._search_result', None)
+    assert Config().search().topic == 'current'
+
+
+def test_config_search_cache_unreadable(tmp_path, mocker):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\ntopic = unreadable\n')
+    other_ini = tmp_path.joinpath('other.ini')
+    other_ini.write_text('[ntfyr]\ntitle = other\n')
+    cache_path = tmp_path.joinpath('config.json')
+    mocker.patch.dict(
+        os.environ,
+        {
+            'NTFYR_CONFIGS': f'{config_ini}:{other_ini}',
+            'NTFYR_CONFIG_CACHE': str(cache_path),
+        },
+        clear=True,
+    )
+    mocker.patch('ntfyr.config._search_result', None)
+    read_config_file = mocker.patch(
+        'ntfyr.config._read_config_file',
+        side_effect=[PermissionError('denied'), {'ntfyr': {'title': 'other'}}],
+    )
+    config = Config().search()
+    assert config.title == 'other'
+    assert config.topic != 'unreadable'
+    assert not cache_path.exists()
+    read_config_file.side_effect = None
+    read_config_file.return_value = {'ntfyr': {'topic': 'readable'}}
+    assert Config().search().topic == 'readable'
+    assert cache_path.exists()
+
+
+def test_stat_signature_mode(tmp_path):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\n')
+    config_ini.chmod(0o644)
+    signature = _stat_signature(config_ini)
+    mtime = config_ini.stat().st_mtime_ns
+    config_ini.chmod(0o600)
+    os.utime(config_ini, ns=(mtime, mtime))
+    assert _stat_signature(config_ini) != signature
+
+
+def test_config_targets_from_args(tmp_path):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text(
+        '[ntfyr]\n'
+        'server = https://default\n'
+        'title = title value\n'
+        '[targets]\n'
+        'ops = alerts, https://other.example/ops\n'
+        'all = alerts topic0\n'
+    )
+    args = _parse_args(['-c', str(config_ini), '-t', 'topic0'])
+    assert [
+        (config.server, config.topic)
+        for config in Config.targets_from_args(args)
+    ] == [('https://default', 'topic0')]
+    args = _parse_args(
+        # fmt: off
+        [
+            '-c', str(config_ini),
+            '-t', 'topic0',
+            '-s', 'https://server0', 'https://server1',
+            '--target', 'ops', 'all',
+        ]
+        # fmt: on
+    )
+    configs = Config.targets_from_args(args)
+    assert [(config.server, config.topic) for config in configs] == [
+        ('https://server0', 'topic0'),
+        ('https://server1', 'topic0'),
+        ('https://server0', 'alerts'),
+        ('https://server1', 'alerts'),
+        ('https://other.example', 'ops'),
+    ]
+    assert all(config.title == 'title value' for config in configs)
+    assert Config.from_args(args).topic == 'topic0'
+    assert Config.from_args(args).server == 'https://server0'
+
+
+def test_config_targets_from_args_invalid(tmp_path):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text('[ntfyr]\n[targets]\nbad = https://host\n')
+    args = _parse_args(['-c', str(config_ini), '--target', 'missing'])
+    with pytest.raises(NtfyrConfigException):
+        Config.targets_from_args(args)
+    args = _parse_args(['-c', str(config_ini), '--target', 'bad'])
+    with pytest.raises(NtfyrConfigException):
+        Config.targets_from_args(args)
+
+
+def test_priority_rank():
+    assert priority_rank(None) == 0
+    assert priority_rank('min') == priority_rank('1') == 1
+    assert priority_rank('max') == priority_rank('urgent') == 5
+    assert [priority_rank(p) for p in PRIORITIES[:6]] == [5, 5, 4, 3, 2, 1]
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+
+import pytest
+
+from ntfyr.cursor import Cursor, Cursors
+from ntfyr.subscription import Message
+
+
+@pytest.fixture()
+def clock(mocker):
+    now = [1000.0]
+    mocker.patch('ntfyr.cursor.time.monotonic', lambda: now[0])
+    return now
+
+
+def _message(message_id, time=100):
+    return Message(id=message_id, time=time, topic='topic', message='m')
+
+
+def test_cursor_drops_duplicates(mocker):
+    mocker.patch('ntfyr.cursor.SEEN_SIZE', 2)
+    cursor = Cursor()
+    for message_id in ('a', 'b', 'c'):
+        assert cursor.is_new(_message(message_id))
+        cursor.advance(_message(message_id))
+    assert cursor.id == 'c'
+    # Only the last two IDs are kept.
+    assert cursor.is_new(_message('a'))
+    assert not cursor.is_new(_message('b'))
+    assert not cursor.is_new(_message('d', time=99))
+    assert cursor.as_dict() == {'id': 'c', 'time': 100, 'seen': ['b', 'c']}
+
+
+def test_cursors_batch_writes(tmp_path, clock):
+    path = tmp_path.joinpath('state', 'cursors.json')
+    cursors = Cursors(path, flush_interval=5, flush_size=3)
+    cursors.advance('https://server', 'topic', _message('a'))
+    cursors.advance('https://server', 'topic', _message('b'))
+    assert not path.exists()
+    cursors.advance('https://server', 'topic', _message('c'))
+    assert json.loads(path.read_text()) == {
+        'https://server/topic': {
+            'id': 'c',
+            'time': 100,
+            'seen': ['a', 'b', 'c'],
+        },
+    }
+    cursors.advance('https://server', 'other', _message('d'))
+    cursors.maybe_flush()
+    assert 'https://server/other' not in json.loads(path.read_text())
+    clock[0] += 5
+    cursors.maybe_flush()
+    assert json.loads(path.read_text())['https://server/other']['id'] == 'd'
+    assert list(tmp_path.joinpath('state').iterdir()) == [path]
+
+
+def test_cursors_resume(tmp_path):
+    path = tmp_path.joinpath('cursors.json')
+    with Cursors(path) as cursors:
+        cursors.advance('https://server', 'topic', _message('a'))
+    # Another process wrote a cursor in the meantime.
+    with Cursors(path) as other:
+        other.advance('https://server', 'other', _message('b'))
+    with Cursors(path) as cursors:
+        assert cursors.get('https://server', 'topic').id == 'a'
+        assert not cursors.get('https://server', 'topic').is_new(_message('a'))
+        cursors.advance('https://server', 'topic', _message('c'))
+    assert set(json.loads(path.read_text())) == {
+        'https://server/topic',
+        'https://server/other',
+    }
+
+
+def test_cursors_invalid_file(tmp_path, caplog):
+    path = tmp_path.joinpath('cursors.json')
+    path.write_text('not json')
+    with caplog.at_level(logging.WARNING, logger='ntfyr'):
+        cursors = Cursors(path)
+    assert cursors.get('https://server', 'topic').id is None
+    assert 'Ignoring the cursor file' in caplog.text
+
+
+def test_cursors_flush_syncs(tmp_path, mocker):
+    path = tmp_path.joinpath('cursors.json')
+    fsync = mocker.spy(os, 'fsync')
+    with Cursors(path) as cursors:
+        cursors.advance('https://server', 'topic', _message('a'))
+    # The file before it replaces the old one, then the directory.
+    assert fsync.call_count == 2
+    assert json.loads(path.read_text())['https://server/topic']['id'] == 'a'
+
+
+def test_cursors_invalid_values(tmp_path, caplog):
+    path = tmp_path.joinpath('cursors.json')
+    path.write_text(
+        json.dumps(
+            {
+                'https://server/seen': {'seen': 5},
+                'https://server/id': {'id': 1},
+                'https://server/time': {'time': 'noon'},
+                'https://server/topic': {'id': 'a', 'time': 1, 'seen': ['a']},
+            }
+        )
+    )
+    with caplog.at_level(logging.WARNING, logger='ntfyr'):
+        cursors = Cursors(path)
+    assert cursors.get('https://server', 'topic').id == 'a'
+    assert cursors.get('https://server', 'seen').id is None
+    assert caplog.text.count('Ignoring the invalid cursor') == 3
@@ -0,0 +1,158 @@
+"""The `ntfyr` daemon and the CLI forwarding to it."""
+
+import os
+import socket
+import stat
+import threading
+from collections import namedtuple
+
+import pytest
+
+from ntfyr.__main__ import _parse_args
+from ntfyr.config import Config
+from ntfyr.daemon import Daemon, forward, socket_path
+from ntfyr.errors import NtfyrError, NtfyrException
+
+
+@pytest.fixture()
+def daemon(tmp_path):
+    server = Daemon(tmp_path.joinpath('ntfyr.sock'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _args(tmp_path, *extra):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\nserver = server value\n')
+    return _parse_args(['-t', 'topic value', '-c', str(config_path), *extra])
+
+
+def test_forward(mocker, tmp_path, daemon):
+    context = {}
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        context.update(dict(url=url, headers=headers, data=data))
+        return namedtuple('mock_response', ['ok', 'json'])(True, lambda: {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    args = _args(tmp_path, '--title', 'title value')
+    assert forward(args, 'test message', daemon.path)
+    assert context['url'] == 'server value/topic value'
+    assert context['headers'] == {
+        'Priority': 'default',
+        'Title': 'title value',
+    }
+    assert context['data'] == b'test message'
+
+
+def test_forward_error(tmp_path, daemon):
+    args = _args(tmp_path, '--user', 'user value')
+    with pytest.raises(NtfyrError) as err:
+        forward(args, 'test message', daemon.path)
+    assert err.value.message == (
+        'Either user or password was specified but not both.'
+    )
+
+
+def test_forward_fan_out(mocker, tmp_path, daemon, caplog):
+    urls = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        urls.append(url)
+        response = namedtuple(
+            'mock_response',
+            ['ok', 'json', 'status_code', 'content', 'headers'],
+        )
+        if 'broken' in url:
+            return response(False, lambda: {'error': 'broken'}, 400, b'', {})
+        return response(True, lambda: {}, 200, b'', {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    args = _args(tmp_path)
+    args.topic = ['topic0', 'topic1']
+    assert forward(args, 'test message', daemon.path)
+    assert sorted(urls) == ['server value/topic0', 'server value/topic1']
+    args.topic = ['broken0', 'topic0', 'broken1']
+    with pytest.raises(NtfyrError) as err:
+        forward(args, 'test message', daemon.path)
+    assert err.value.topic == 'broken0'
+    assert 'server value/broken1' in caplog.text
+
+
+def test_forward_no_daemon(tmp_path):
+    assert not forward(_args(tmp_path), 'message', tmp_path.joinpath('none'))
+
+
+def test_daemon_replaces_stale_socket(tmp_path):
+    path = tmp_path.joinpath('ntfyr.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+    assert not forward(_args(tmp_path), 'message', path)
+    with Daemon(path):
+        assert path.exists()
+    assert not path.exists()
+
+
+def test_daemon_already_running(daemon):
+    with pytest.raises(NtfyrException):
+        Daemon(daemon.path)
+
+
+def test_forward_untrusted_socket(mocker, tmp_path, daemon):
+    send = mocker.spy(socket.socket, 'sendall')
+    mocker.patch('ntfyr.daemon.os.getuid', return_value=12345)
+    assert not forward(_args(tmp_path), 'message', daemon.path)
+    assert not send.called
+
+
+def test_forward_untrusted_daemon(mocker, tmp_path, daemon):
+    mocker.patch('ntfyr.daemon._peer_is_user', return_value=False)
+    assert not forward(_args(tmp_path), 'message', daemon.path)
+
+
+def test_forward_credentials(mocker, tmp_path, daemon):
+    targets = mocker.spy(Config, 'targets_from_args')
+    mocker.patch('requests.Session.post', side_effect=OSError('down'))
+    with pytest.raises(NtfyrError):
+        forward(_args(tmp_path), 'message', daemon.path)
+    assert not {'user', 'password', 'token'} & set(
+        vars(targets.call_args[0][0])
+    )
+    with pytest.raises(NtfyrError):
+        forward(_args(tmp_path, '--token', 'tk'), 'message', daemon.path)
+    assert targets.call_args[0][0].token == 'tk'
+
+
+def test_daemon_untrusted_directory(mocker, tmp_path):
+    mocker.patch('ntfyr.daemon.os.getuid', return_value=12345)
+    with pytest.raises(NtfyrException):
+        Daemon(tmp_path.joinpath('ntfyr.sock'))
+
+
+def test_socket_path(monkeypatch, tmp_path):
+    monkeypatch.delenv('NTFYR_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    path = socket_path()
+    assert path.parent == tmp_path.joinpath(f'ntfyr-{os.getuid()}')
+    with Daemon(path):
+        assert stat.S_IMODE(path.parent.stat().st_mode) == 0o700
+
+
+def test_forward_client_config_paths(mocker, tmp_path, daemon):
+    targets = mocker.spy(Config, 'targets_from_args')
+    mocker.patch('requests.Session.post', side_effect=OSError('down'))
+    config_path = tmp_path.joinpath('client.ini')
+    config_path.write_text('[ntfyr]\nserver = client server\n')
+    mocker.patch.dict(os.environ, {'NTFYR_CONFIGS': str(config_path)})
+    args = _parse_args(['-t', 'topic'])
+    with pytest.raises(NtfyrError) as err:
+        forward(args, 'test message', daemon.path)
+    # The daemon uses the config files of the client, not its own.
+    assert targets.call_args[0][0].config == [str(config_path)]
+    assert err.value.server == 'client server'
@@ -0,0 +1,120 @@
+"""Suppress duplicate notifications."""
+
+from collections import namedtuple
+
+import pytest
+
+from ntfyr.config import Config
+from ntfyr.dedup import (
+    Deduplicator,
+    SqliteDeduplicator,
+    digest,
+    get_deduplicator,
+)
+from ntfyr.errors import NtfyrError
+from ntfyr.ntfyr import NtfyClient
+
+
+@pytest.fixture(autouse=True)
+def deduplicators(mocker):
+    return mocker.patch.dict('ntfyr.dedup._deduplicators', clear=True)
+
+
+def test_digest():
+    fields = dict(topic='topic', title='title', tags=['a', 'b'])
+    config = Config(**fields)
+    assert len(digest(config, 'message')) == 16
+    assert digest(config, 'message') == digest(Config(**fields), 'message')
+    assert digest(config, 'message') != digest(config, 'other')
+    for change in [
+        {'topic': 'other'},
+        {'title': 'other'},
+        {'tags': ['a']},
+        {'server': 'http://other'},
+    ]:
+        other = Config(**dict(fields, **change))
+        assert digest(config, 'message') != digest(other, 'message')
+
+
+def test_deduplicator_ttl(mocker):
+    clock = mocker.patch('time.monotonic', return_value=100)
+    deduplicator = Deduplicator(ttl=10)
+    assert not deduplicator.check(b'key')
+    assert deduplicator.check(b'key')
+    clock.return_value = 109
+    # Duplicates do not extend the TTL.
+    assert deduplicator.check(b'key')
+    clock.return_value = 110
+    assert not deduplicator.check(b'key')
+    assert deduplicator.suppressed == 2
+
+
+def test_deduplicator_bounded():
+    deduplicator = Deduplicator(ttl=10, max_entries=2)
+    for key in [b'a', b'b', b'a', b'c']:
+        deduplicator.check(key)
+    assert list(deduplicator._expires) == [b'a', b'c']
+    assert not deduplicator.check(b'b')
+
+
+def test_deduplicator_forget():
+    deduplicator = Deduplicator(ttl=10)
+    deduplicator.check(b'key')
+    deduplicator.forget(b'key')
+    assert not deduplicator.check(b'key')
+
+
+def test_sqlite_deduplicator_shared(tmp_path, mocker):
+    clock = mocker.patch('time.time', return_value=100)
+    path = tmp_path.joinpath('dedup.sqlite3')
+    first = SqliteDeduplicator(path, ttl=10, max_entries=2)
+    second = SqliteDeduplicator(path, ttl=10, max_entries=2)
+    assert not first.check(b'key')
+    assert second.check(b'key')
+    assert second.suppressed == 1
+    second.forget(b'key')
+    assert not first.check(b'key')
+    clock.return_value = 110
+    assert not second.check(b'key')
+    for key in [b'a', b'b', b'c']:
+        first.check(key)
+    count = first._db.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+    assert count == 2
+    first.close()
+    second.close()
+
+
+def test_get_deduplicator(tmp_path):
+    assert get_deduplicator(Config()) is None
+    config = Config(dedup_ttl=10)
+    assert get_deduplicator(config) is get_deduplicator(Config(dedup_ttl=10))
+    config = Config(dedup_ttl=10, dedup_path=str(tmp_path.joinpath('db')))
+    assert isinstance(get_deduplicator(config), SqliteDeduplicator)
+
+
+def test_client_suppresses_duplicates(mocker):
+    sent = []
+    response = namedtuple(
+        'mock_response',
+        ['ok', 'json', 'status_code', 'content', 'headers'],
+    )
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append(data)
+        if data == b'bad':
+            return response(False, lambda: None, 400, b'bad', {})
+        return response(True, lambda: {}, 200, b'{}', {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    config = Config(topic='topic', server='http://server', dedup_ttl=60)
+    with NtfyClient(config) as client:
+        assert client.send('message') == {}
+        assert client.send('message') is None
+        assert client.send('other') == {}
+        with pytest.raises(NtfyrError):
+            client.send('bad')
+        # Failed notifications are not suppressed.
+        with pytest.raises(NtfyrError):
+            client.send('bad')
+    assert sent == [b'message', b'other', b'bad', b'bad']
+    assert get_deduplicator(config).suppressed == 1
@@ -0,0 +1,112 @@
+"""Combine many notifications into periodic summaries."""
+
+import time
+from collections import namedtuple
+
+import pytest
+
+from ntfyr.__main__ import _parse_args
+from ntfyr.config import Config
+from ntfyr.digest import DEFAULT_WINDOW, Digest, _fit
+from ntfyr.ntfyr import MESSAGE_SIZE_LIMIT
+
+_Response = namedtuple('mock_response', ['ok', 'json'])
+
+
+@pytest.fixture
+def sent(mocker):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append((url, headers, data.decode()))
+        return _Response(True, lambda: {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    return sent
+
+
+def _config(**kwargs):
+    return Config(**dict({'server': 'http://server', 'topic': 'a'}, **kwargs))
+
+
+def test_digest_summary(sent):
+    with Digest(window=60, max_lines=2) as digest:
+        digest.add(_config(priority='low', tags=['x']), 'one')
+        digest.add(_config(priority='high', tags=['y', 'x']), 'two')
+        digest.add(_config(priority='default'), 'one')
+        digest.add(_config(topic='b'), 'other topic')
+    assert sent == [
+        (
+            'http://server/a',
+            {
+                'Priority': 'high',
+                'Tags': 'x,y',
+                'Title': '3 events, 2 distinct',
+            },
+            '3 events, 2 distinct\none\ntwo\n(1 more not shown)',
+        ),
+        ('http://server/b', {}, 'other topic'),
+    ]
+
+
+def test_digest_keep_last(sent):
+    with Digest(window=60, max_lines=2, keep='last') as digest:
+        for message in ['one', 'two', 'three']:
+            digest.add(_config(title='title'), message)
+    assert sent[0][1]['Title'] == 'title'
+    assert sent[0][2] == '3 events, 3 distinct\ntwo\nthree\n(1 more not shown)'
+
+
+def test_digest_window(sent):
+    with Digest(window=0.1) as digest:
+        digest.add(_config(), 'one')
+        digest.add(_config(), 'two')
+        time.sleep(0.5)
+        assert len(sent) == 1
+        digest.add(_config(), 'three')
+    assert [data for _, _, data in sent] == [
+        '2 events, 2 distinct\none\ntwo',
+        'three',
+    ]
+
+
+def test_digest_max_count(sent):
+    with Digest(window=60, max_count=2) as digest:
+        for message in ['one', 'two', 'three']:
+            digest.add(_config(), message)
+        assert len(sent) == 1
+    assert len(sent) == 2
+
+
+def test_digest_failed(mocker):
+    mocker.patch(
+        'requests.Session.post',
+        side_effect=OSError('unreachable'),
+    )
+    with Digest() as digest:
+        digest.add(_config(), 'one')
+    assert digest.failed == 1
+
+
+def test_fit_size_limit():
+    lines = ['x' * 1000] * 10
+    message = _fit('heading', lines, 10)
+    assert len(message.encode('utf-8')) <= MESSAGE_SIZE_LIMIT
+    assert message.endswith('more not shown)')
+    assert '…' in message
+
+
+def test_digest_long_timestamp(sent):
+    config = _config(include_timestamp=True, timestamp='%Y-%m-%d ' * 100)
+    with Digest(window=60) as digest:
+        for _ in range(10):
+            digest.add(config, 'x' * 1000)
+    ((_, _, data),) = sent
+    assert len(data.encode('utf-8')) <= MESSAGE_SIZE_LIMIT
+    assert data.endswith('more not shown)')
+
+
+def test_digest_count_implies_digest():
+    args = _parse_args(['--follow', '--digest-count', '10'])
+    assert args.digest == DEFAULT_WINDOW
+    assert args.digest_count == 10
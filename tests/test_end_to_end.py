@@ -2,11 +2,19 @@
 
 import base64
 import pathlib
+import threading
+import time
+from dataclasses import replace
 from datetime import datetime
 
 import pytest
 
+from ntfyr import _http
 from ntfyr.__main__ import main
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.ntfyr import _default_sessions, notify, notify_many
+from ntfyr.subscription import subscribe
 
 from .fixtures.ntfy_server import MockNtfyServer
 
@@ -44,6 +52,7 @@ def test_parse_args_password(
         '--user', username,
         '--password', password,
         '--config', str(config_path),
+        '--no-daemon',
         '--log-level', 'DEBUG',
         # fmt: on
     ]
@@ -93,6 +102,7 @@ def test_parse_args_token(tmp_path: pathlib.Path, ntfy_server: MockNtfyServer):
         '--server', ntfy_server.url,
         '--token', token,
         '--config', str(config_path),
+        '--no-daemon',
         '--log-level', 'DEBUG',
         # fmt: on
     ]
@@ -109,3 +119,166 @@ def test_parse_args_token(tmp_path: pathlib.Path, ntfy_server: MockNtfyServer):
     assert request.headers['Tags'] == 'tag0,tag1,tag2,tag3'
     assert request.headers['Title'] == 'title value'
     assert request.headers['Authorization'] == f'Bearer {token}'
+
+
+@pytest.mark.system
+def test_stdlib_transport(tmp_path: pathlib.Path, ntfy_server: MockNtfyServer):
+    """An end-to-end test of ntfyr with the stdlib transport."""
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\ntransport = stdlib')
+    username = 'username'
+    password = 'password'
+    args = [
+        # fmt: off
+        '--title', 'title value',
+        '--message', 'message value',
+        '--topic', 'test-topic',
+        '--server', ntfy_server.url,
+        '--user', username,
+        '--password', password,
+        '--config', str(config_path),
+        '--no-daemon',
+        # fmt: on
+    ]
+    main(args)
+    request = ntfy_server.get_request()
+    basic_credentials = (
+        base64.encodebytes(f'{username}:{password}'.encode()).decode().strip()
+    )
+    assert request.path == '/test-topic'
+    assert request.content == 'message value'
+    assert request.headers['Title'] == 'title value'
+    assert request.headers['Authorization'] == f'Basic {basic_credentials}'
+    assert isinstance(_default_sessions['stdlib'], _http.Session)
+
+
+@pytest.mark.system
+@pytest.mark.parametrize('transport', ['requests', 'stdlib'])
+def test_prepared_notification(ntfy_server: MockNtfyServer, transport):
+    """An end-to-end test of a prepared notification with each transport."""
+    prepared = Config(
+        topic='test-topic',
+        server=ntfy_server.url,
+        title='title value',
+        user='username',
+        password='password',
+        transport=transport,
+    ).prepare()
+    prepared.send('message value')
+    request = ntfy_server.get_request()
+    assert request.path == '/test-topic'
+    assert request.content == 'message value'
+    assert request.headers['Title'] == 'title value'
+    assert request.headers['Authorization'] == 'Basic dXNlcm5hbWU6cGFzc3dvcmQ='
+
+
+@pytest.mark.system
+@pytest.mark.parametrize('transport', ['requests', 'stdlib'])
+def test_file_attachment(
+    tmp_path: pathlib.Path,
+    ntfy_server: MockNtfyServer,
+    transport,
+):
+    """An end-to-end test of uploading a file with each transport."""
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text(f'[ntfyr]\ntransport = {transport}')
+    file_path = tmp_path.joinpath('app.log')
+    file_path.write_text('line 0\nline 1\n' * 1000)
+    args = [
+        # fmt: off
+        '--message', 'the log\nfollows',
+        '--file', str(file_path),
+        '--topic', 'test-topic',
+        '--server', ntfy_server.url,
+        '--config', str(config_path),
+        '--no-daemon',
+        # fmt: on
+    ]
+    main(args)
+    request = ntfy_server.get_request()
+    assert request.path == '/test-topic'
+    assert request.content == file_path.read_text()
+    assert request.headers['Filename'] == 'app.log'
+    assert request.headers['Message'] == 'the log\\nfollows'
+
+
+@pytest.mark.system
+@pytest.mark.parametrize('transport', ['requests', 'stdlib'])
+def test_notify_many_keep_alive(transport):
+    """Notifications are sent at once over a few reused connections."""
+    with MockNtfyServer(latency=0.1) as server:
+        config = Config(server=server.url, transport=transport)
+        items = [
+            (replace(config, topic=f'topic{index}'), f'message {index}')
+            for index in range(20)
+        ]
+        start = time.monotonic()
+        results = notify_many(items, max_workers=10)
+        elapsed = time.monotonic() - start
+        requests = server.requests
+    assert [result['message'] for result in results] == [
+        message for _, message in items
+    ]
+    assert len(requests) == 20
+    assert elapsed < 20 * 0.1 / 2
+    assert len({request.client_address for request in requests}) <= 10
+
+
+@pytest.mark.system
+def test_retry_after():
+    """Injected 429s are retried after the delay the server asks for."""
+    with MockNtfyServer() as server:
+        server.fail_next(2, status=429, retry_after=0)
+        config = Config(
+            topic='test-topic',
+            server=server.url,
+            max_attempts=3,
+            retry_max_delay=1,
+        )
+        assert notify(config, 'message value')['message'] == 'message value'
+        assert [request.status for request in server.requests] == [
+            429,
+            429,
+            200,
+        ]
+        server.error_rate = 1.0
+        server.error_status = 502
+        with pytest.raises(NtfyrError) as err:
+            notify(replace(config, max_attempts=1), 'message value')
+        assert err.value.status_code == 502
+
+
+@pytest.mark.system
+def test_subscribe():
+    """Messages published while subscribed are streamed as they arrive."""
+    with MockNtfyServer(keepalive_interval=0.05) as server:
+        config = Config(topic='test-topic', server=server.url)
+        notify(replace(config, title='cached'), 'message 0')
+        received = []
+
+        def _subscribe():
+            for message in subscribe(config, since='all'):
+                received.append(message)
+                if len(received) == 3:
+                    return
+
+        thread = threading.Thread(target=_subscribe)
+        thread.start()
+        assert server.wait_for_requests(2)[1].method == 'GET'
+        # Let a few keepalive events through.
+        time.sleep(0.2)
+        notify(config, 'message 1')
+        notify(replace(config, topic='other-topic'), 'not received')
+        notify(replace(config, priority='high', tags=['tag']), 'message 2')
+        thread.join(10)
+        polled = list(subscribe(config, since='all', poll=True))
+    assert not thread.is_alive()
+    assert [message.message for message in received] == [
+        'message 0',
+        'message 1',
+        'message 2',
+    ]
+    assert received[0].title == 'cached'
+    assert received[2].priority == 4
+    assert received[2].tags == ['tag']
+    assert polled == received
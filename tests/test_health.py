@@ -0,0 +1,155 @@
+from collections import namedtuple
+
+import pytest
+
+from ntfyr import health
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.ntfyr import NtfyClient
+
+_Response = namedtuple(
+    '_Response',
+    ['ok', 'json', 'status_code', 'content', 'headers'],
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_health():
+    health.reset()
+    yield
+    health.reset()
+
+
+@pytest.fixture()
+def clock(mocker):
+    now = [1000.0]
+    mocker.patch('ntfyr.health.time.monotonic', lambda: now[0])
+    return now
+
+
+def _mock_post_factory(down):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append(url)
+        if url.split('/topic')[0] in down:
+            return _Response(False, lambda: {'error': 'down'}, 503, b'', {})
+        return _Response(True, lambda: {'url': url}, 200, b'', {})
+
+    return sent, _mock_post
+
+
+def test_circuit_breaker(clock):
+    server_health = health.ServerHealth()
+    server_health.record_failure(2)
+    assert server_health.state == health.CLOSED
+    server_health.record_failure(2)
+    assert server_health.state == health.OPEN
+    assert not server_health.acquire(30)
+    clock[0] += 30
+    # Only one probe at a time.
+    assert server_health.acquire(30)
+    assert server_health.state == health.HALF_OPEN
+    assert not server_health.acquire(30)
+    server_health.record_failure(2)
+    assert server_health.state == health.OPEN
+    clock[0] += 30
+    assert server_health.acquire(30)
+    server_health.record_success(0.5)
+    assert server_health.state == health.CLOSED
+    # The first two failures were a minute ago.
+    assert server_health.recent_failures == 1
+    clock[0] += health.FAILURE_WINDOW
+    assert server_health.recent_failures == 0
+
+
+def test_latency_average():
+    server_health = health.ServerHealth()
+    server_health.record_success(1.0)
+    server_health.record_success(2.0)
+    assert server_health.latency == pytest.approx(1.3)
+    assert server_health.score(2.0) == pytest.approx(0.65)
+
+
+def test_candidates_weighted():
+    config = Config(
+        server='https://a',
+        failover=['https://b=4', 'https://c'],
+        failover_policy='weighted',
+    )
+    health.get_health('https://a').record_success(1.0)
+    health.get_health('https://b').record_success(2.0)
+    health.get_health('https://c').record_success(0.1)
+    assert [server for server, _ in health.candidates(config)] == [
+        'https://c',
+        'https://b',
+        'https://a',
+    ]
+    config.failover_policy = 'ordered'
+    assert [server for server, _ in health.candidates(config)] == [
+        'https://a',
+        'https://b',
+        'https://c',
+    ]
+
+
+def test_failover(mocker):
+    sent, mock_post = _mock_post_factory(down=['https://a'])
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic',
+        server='https://a',
+        failover=['https://b'],
+        circuit_threshold=2,
+    )
+    with NtfyClient(config) as client:
+        for _ in range(3):
+            assert client.send('message') == {'url': 'https://b/topic'}
+    # The circuit of the first server opened after 2 failures.
+    assert sent == [
+        'https://a/topic',
+        'https://b/topic',
+        'https://a/topic',
+        'https://b/topic',
+        'https://b/topic',
+    ]
+
+
+def test_failover_every_server_down(mocker):
+    sent, mock_post = _mock_post_factory(down=['https://a', 'https://b'])
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic',
+        server='https://a',
+        failover=['https://b'],
+        circuit_threshold=1,
+    )
+    with NtfyClient(config) as client:
+        with pytest.raises(NtfyrError) as err:
+            client.send('message')
+        assert err.value.server == 'https://b'
+        assert err.value.status_code == 503
+        with pytest.raises(NtfyrError) as err:
+            client.send('message')
+        assert err.value.status_code is None
+    assert len(sent) == 2
+
+
+def test_config_failover(tmp_path):
+    config_ini = tmp_path.joinpath('config.ini')
+    config_ini.write_text(
+        '[ntfyr]\n'
+        'failover = https://b=2, https://c\n'
+        'failover_policy = weighted\n'
+        'circuit_threshold = 5\n'
+    )
+    config = Config().update(config_ini)
+    assert config.failover == ['https://b=2', 'https://c']
+    assert config.failover_policy == 'weighted'
+    assert config.circuit_threshold == 5
+    assert health.parse_server('https://b=2') == ('https://b', 2.0)
+    assert health.parse_server('https://b') == ('https://b', 1.0)
+    assert health.parse_server('https://b/?x=1') == ('https://b/?x=1', 1.0)
+    for weight in ('0', '-1', 'nan', '2x', ''):
+        with pytest.raises(NtfyrError):
+            health.parse_server(f'https://b={weight}')
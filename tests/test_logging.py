@@ -0,0 +1,118 @@
+"""Send log records as notifications."""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.logging import NtfyHandler, level_priority
+
+_Response = namedtuple('mock_response', ['ok', 'json'])
+
+
+@pytest.fixture
+def sent(mocker):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append((headers, data.decode()))
+        return _Response(True, lambda: {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    return sent
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('test_ntfyr_logging')
+    logger.propagate = False
+    yield logger
+    for handler in logger.handlers:
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def _handler(**kwargs):
+    return NtfyHandler(
+        Config(topic='topic value', server='http://server'), **kwargs
+    )
+
+
+def test_level_priority():
+    assert level_priority(logging.CRITICAL) == 'urgent'
+    assert level_priority(logging.ERROR) == 'high'
+    assert level_priority(logging.WARNING + 1) == 'default'
+    assert level_priority(logging.DEBUG) == 'min'
+
+
+def test_handler_batches_window(sent, logger):
+    handler = _handler(window=0.2)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.warning('not sent')
+    logger.error('first')
+    logger.critical('second')
+    time.sleep(0.5)
+    logger.error('third')
+    handler.close()
+    assert [data for _, data in sent] == [
+        'ERROR first\nCRITICAL second',
+        'ERROR third',
+    ]
+    headers = sent[0][0]
+    assert headers['Priority'] == b'urgent'
+    assert headers['Title'] == b'2 log records up to CRITICAL'
+    assert sent[1][0]['Priority'] == b'high'
+    assert sent[1][0]['Title'] == b'ERROR in test_ntfyr_logging'
+
+
+def test_handler_max_records(sent, logger):
+    handler = _handler(window=60, max_records=2)
+    logger.addHandler(handler)
+    for index in range(5):
+        logger.error('record %s', index)
+    handler.close()
+    assert [data for _, data in sent] == [
+        'record 0\nrecord 1',
+        'record 2\nrecord 3',
+        'record 4',
+    ]
+
+
+def test_handler_does_not_block(mocker, logger):
+    release = threading.Event()
+
+    def _slow_post(session, url, headers, data, auth, timeout):
+        release.wait(5)
+        return _Response(True, lambda: {})
+
+    mocker.patch('requests.Session.post', _slow_post)
+    handler = _handler(window=0, queue_size=2)
+    logger.addHandler(handler)
+    start = time.monotonic()
+    for _ in range(100):
+        logger.error('record')
+    assert time.monotonic() - start < 0.5
+    assert handler.dropped > 0
+    release.set()
+
+
+def test_handler_ignores_ntfyr(sent):
+    handler = _handler(window=0)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        logging.getLogger('ntfyr').error('from ntfyr')
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+    assert sent == []
+
+
+def test_handler_invalid_config():
+    with pytest.raises(NtfyrError):
+        NtfyHandler(Config(server=''))
@@ -1,6 +1,9 @@
+import io
+from collections import namedtuple
+
 import pytest
 
-from ntfyr.__main__ import _parse_args
+from ntfyr.__main__ import _iter_records, _parse_args, main
 from ntfyr.config import DEFAULT_TIMESTAMP
 
 
@@ -37,8 +40,8 @@ def test_parse_args_all():
     assert parsed.title == 'title value'
     assert parsed.message == 'message value'
     assert parsed.timestamp == 'timestamp'
-    assert parsed.topic == 'topic value'
-    assert parsed.server == 'server value'
+    assert parsed.topic == ['topic value']
+    assert parsed.server == ['server value']
     assert parsed.user == 'user value'
     assert parsed.password == 'password value'
     assert parsed.token == 'token value'
@@ -77,8 +80,8 @@ def test_parse_args_all_short():
     assert parsed.title == 'title value'
     assert parsed.message == 'message value'
     assert parsed.timestamp is None
-    assert parsed.topic == 'topic value'
-    assert parsed.server == 'server value'
+    assert parsed.topic == ['topic value']
+    assert parsed.server == ['server value']
     assert parsed.user == 'user value'
     assert parsed.password == 'password value'
     assert parsed.token == 'token value'
@@ -92,9 +95,27 @@ def test_parse_args_default_timestamp():
     assert parsed.timestamp == DEFAULT_TIMESTAMP
 
 
-def test_parse_args_invalid_topic():
-    with pytest.raises(SystemExit):
-        _parse_args([])
+def test_parse_args_targets():
+    parsed = _parse_args(
+        # fmt: off
+        [
+            '-t', 'topic0', 'topic1',
+            '-s', 'server0', 'server1',
+            '--target', 'list0', 'list1',
+        ]
+        # fmt: on
+    )
+    assert parsed.topic == ['topic0', 'topic1']
+    assert parsed.server == ['server0', 'server1']
+    assert parsed.target == ['list0', 'list1']
+
+
+def test_main_no_topic(tmp_path):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\n')
+    with pytest.raises(SystemExit) as exit_info:
+        main(['-m', 'message', '--no-daemon', '-c', str(config_path)])
+    assert exit_info.value.code == 1
 
 
 def test_parse_args_invalid_priority():
@@ -112,3 +133,123 @@ def test_parse_args_invalid_log_level():
                 'invalid log level',
             ]
         )
+
+
+def test_parse_args_follow():
+    parsed = _parse_args(['--topic', 'topic value', '--line-mode'])
+    assert parsed.follow is True
+    assert parsed.delimiter == '\\n'
+    parsed = _parse_args(['-t', 'topic value', '-f', '--delimiter', '\\0'])
+    assert parsed.follow is True
+    assert parsed.delimiter == '\\0'
+
+
+def test_iter_records_lines():
+    stream = io.StringIO('first\nsecond\n\nthird')
+    assert list(_iter_records(stream)) == ['first', 'second', 'third']
+
+
+def test_iter_records_delimiter():
+    stream = io.TextIOWrapper(io.BytesIO('fïrst\0second\0\0third\0'.encode()))
+    assert list(_iter_records(stream, '\0')) == ['fïrst', 'second', 'third']
+
+
+def test_iter_records_oversized(mocker):
+    mocker.patch('ntfyr.__main__._MAX_RECORD_SIZE', 4)
+    stream = io.StringIO('0123456789\nab\n')
+    assert list(_iter_records(stream)) == ['0123', '4567', '89', 'ab']
+
+
+def test_main_follow(mocker, tmp_path):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\n')
+    client = mocker.MagicMock()
+    client.__enter__.return_value = client
+    mocker.patch('ntfyr.__main__.NtfyClient', return_value=client)
+    mocker.patch('sys.stdin', io.StringIO('first\nsecond\n'))
+    set_signal = mocker.patch('signal.signal')
+    main(['-t', 'topic value', '--follow', '--config', str(config_path)])
+    assert client.send.call_args_list == [
+        mocker.call('first'),
+        mocker.call('second'),
+    ]
+    # A SIGHUP still ends --follow when its terminal is closed.
+    assert not set_signal.called
+
+
+def test_parse_args_retries():
+    args = [
+        # fmt: off
+        '--topic', 'topic value',
+        '--max-attempts', '5',
+        '--retry-delay', '0.5',
+        '--retry-max-delay', '10',
+        # fmt: on
+    ]
+    parsed = _parse_args(args)
+    assert parsed.max_attempts == 5
+    assert parsed.retry_delay == 0.5
+    assert parsed.retry_max_delay == 10.0
+
+
+def test_main_follow_digest(mocker, tmp_path):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\n')
+    digest = mocker.MagicMock(failed=0)
+    digest.__enter__.return_value = digest
+    digest_class = mocker.patch('ntfyr.__main__.Digest', return_value=digest)
+    mocker.patch('sys.stdin', io.StringIO('first\nsecond\n'))
+    args = ['-t', 'topic value', '-f', '--digest', '--digest-count', '10']
+    main(args + ['--config', str(config_path)])
+    digest_class.assert_called_once_with(60, 10)
+    assert [call.args[1] for call in digest.add.call_args_list] == [
+        'first',
+        'second',
+    ]
+
+
+def test_main_fan_out(mocker, tmp_path, caplog):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\nserver = https://server0\n')
+    urls = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        urls.append(url)
+        response = namedtuple(
+            'mock_response',
+            ['ok', 'json', 'status_code', 'content', 'headers'],
+        )
+        if url.endswith('/broken'):
+            return response(False, lambda: {'error': 'broken'}, 400, b'', {})
+        return response(True, lambda: {}, 200, b'', {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    args = ['-m', 'message', '--no-daemon', '-c', str(config_path)]
+    with pytest.raises(SystemExit) as exit_info:
+        main(args + ['-t', 'topic0', 'broken', 'topic1'])
+    assert exit_info.value.code == 1
+    assert sorted(urls) == [
+        'https://server0/broken',
+        'https://server0/topic0',
+        'https://server0/topic1',
+    ]
+    assert 'Error sending to https://server0/broken' in caplog.text
+    urls.clear()
+    main(args + ['-t', 'topic0', 'topic1'])
+    assert sorted(urls) == ['https://server0/topic0', 'https://server0/topic1']
+
+
+def test_main_split(mocker, tmp_path):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\n')
+    send_parts = mocker.patch('ntfyr.split.send_parts')
+    message = 'x' * 5000
+    args = ['-t', 'topic0', 'topic1', '-m', message, '--split']
+    main(args + ['--no-daemon', '-c', str(config_path)])
+    assert [call.args[0].topic for call in send_parts.call_args_list] == [
+        'topic0',
+        'topic1',
+    ]
+    assert send_parts.call_args.args[1] == ['x' * 4096, 'x' * 904]
+    with pytest.raises(SystemExit):
+        _parse_args(['-t', 'topic', '--split', '--follow'])
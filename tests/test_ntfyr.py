@@ -1,13 +1,22 @@
 """The main `ntfyr` functionality."""
 
+import io
 from collections import namedtuple
 from datetime import datetime as dt
 
 import pytest
+import requests
 
+from ntfyr import timestamp
 from ntfyr.config import Config
 from ntfyr.errors import NtfyrError
-from ntfyr.ntfyr import _get_headers, _get_timestamp, notify
+from ntfyr.ntfyr import (
+    NtfyClient,
+    PreparedNotification,
+    _get_headers,
+    notify,
+    notify_many,
+)
 
 
 def _too_close_to_midnight(seconds_till=2):
@@ -20,7 +29,7 @@ def _too_close_to_midnight(seconds_till=2):
 def _mock_post_factory():
     context = {}
 
-    def _mock_post(url, headers, data, auth):
+    def _mock_post(session, url, headers, data, auth, timeout):
         context.update(dict(url=url, headers=headers, data=data, auth=auth))
         return namedtuple(
             'mock_response',
@@ -37,17 +46,18 @@ def _mock_post_error_factory(with_json=True):
     content = b'content value'
     context['output_values'] = {'status_code': status_code, 'content': content}
 
-    def _mock_post(url, headers, data, auth):
+    def _mock_post(session, url, headers, data, auth, timeout):
         context.update(dict(url=url, headers=headers, data=data, auth=auth))
         json = {'error': 'error text', 'link': 'error link'}
         return namedtuple(
             'mock_response',
-            ['ok', 'json', 'status_code', 'content'],
+            ['ok', 'json', 'status_code', 'content', 'headers'],
             defaults=[
                 False,
                 lambda: json if with_json else None,
                 status_code,
                 content,
+                {},
             ],
         )()
 
@@ -86,9 +96,9 @@ def test_get_timestamp(mocker):
     # Chose a day rather than a time so that the likelyhood of a race condition
     #   between the two formatting operations is low.
     date_format = '%Y-%m-%d'
-    timestamp = _get_timestamp(date_format)
+    formatted = timestamp.get_formatter(date_format)('message')
     expected_timestamp = dt.now().strftime(date_format)
-    assert timestamp == expected_timestamp
+    assert formatted == f'{expected_timestamp} message'
 
 
 @pytest.mark.skipif(
@@ -98,7 +108,7 @@ def test_get_timestamp(mocker):
 def test_notify_kitchen_sink_password(mocker):
     message = 'test message'  # Must not contain time format variables
     context, mock_post = _mock_post_factory()
-    mocker.patch('ntfyr.ntfyr.requests.post', mock_post)
+    mocker.patch('requests.Session.post', mock_post)
     config = Config(
         topic='topic value',
         # Headers
@@ -140,7 +150,7 @@ def test_notify_kitchen_sink_password(mocker):
 def test_notify_kitchen_sink_token(mocker):
     message = 'test message'  # Must not contain time format variables
     context, mock_post = _mock_post_factory()
-    mocker.patch('ntfyr.ntfyr.requests.post', mock_post)
+    mocker.patch('requests.Session.post', mock_post)
     config = Config(
         topic='topic value',
         # Headers
@@ -181,7 +191,7 @@ def test_notify_kitchen_sink_token(mocker):
 def test_notify_error_with_json(mocker):
     message = 'test message'  # Must not contain time format variables
     context, mock_post = _mock_post_error_factory()
-    mocker.patch('requests.post', mock_post)
+    mocker.patch('requests.Session.post', mock_post)
     config = Config(
         topic='topic value',
         # Headers
@@ -212,7 +222,7 @@ def test_notify_error_without_json(mocker):
         f'{context["output_values"]["status_code"]} '
         f'{context["output_values"]["content"].decode()}'
     )
-    mocker.patch('ntfyr.ntfyr.requests.post', mock_post)
+    mocker.patch('requests.Session.post', mock_post)
     config = Config(
         topic='topic value',
         # Headers
@@ -232,3 +242,325 @@ def test_notify_error_without_json(mocker):
     assert context['url'] == f'{config.server}/{config.topic}'
     # Message/timestamp
     assert context['data'] == message.encode()
+
+
+def test_client_reuses_session(mocker):
+    context, mock_post = _mock_post_factory()
+    sessions = []
+
+    def _recording_post(session, **kwargs):
+        sessions.append(session)
+        return mock_post(session, **kwargs)
+
+    mocker.patch('requests.Session.post', _recording_post)
+    config = Config(topic='topic value', server='server value', title='t')
+    with NtfyClient(config) as client:
+        client.send('first')
+        client.send('second')
+    assert sessions[0] is sessions[1]
+    assert context['url'] == f'{config.server}/{config.topic}'
+    assert context['headers'] == {'Title': 't'}
+    assert context['data'] == b'second'
+
+
+def test_client_close_shared_session(mocker):
+    session = mocker.Mock()
+    config = Config(topic='topic value', server='server value')
+    with NtfyClient(config, session=session):
+        pass
+    session.close.assert_not_called()
+
+
+def test_client_invalid_credentials():
+    config = Config(topic='topic value', server='server value', user='user')
+    with pytest.raises(NtfyrError):
+        NtfyClient(config)
+
+
+def test_notify_shares_default_session(mocker):
+    sessions = []
+
+    def _recording_post(session, **kwargs):
+        sessions.append(session)
+        return _mock_post_factory()[1](session, **kwargs)
+
+    mocker.patch('requests.Session.post', _recording_post)
+    config = Config(topic='topic value', server='server value')
+    notify(config, 'first')
+    notify(config, 'second')
+    assert sessions[0] is sessions[1]
+
+
+def test_notify_many(mocker):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append(data)
+        if data == b'bad':
+            return namedtuple(
+                'mock_response',
+                ['ok', 'json', 'status_code', 'content', 'headers'],
+                defaults=[False, lambda: None, 500, b'content value', {}],
+            )()
+        return namedtuple(
+            'mock_response',
+            ['ok', 'json'],
+            defaults=[True, lambda: {'message': data.decode()}],
+        )()
+
+    mocker.patch('requests.Session.post', _mock_post)
+    config = Config(topic='topic value', server='server value')
+    messages = ['first', 'bad', 'third', 'fourth']
+    results = notify_many(
+        [(config, message) for message in messages], max_workers=2
+    )
+    assert sorted(sent) == sorted(m.encode() for m in messages)
+    assert results[0] == {'message': 'first'}
+    assert isinstance(results[1], NtfyrError)
+    assert results[1].message == '500 content value'
+    assert results[2] == {'message': 'third'}
+    assert results[3] == {'message': 'fourth'}
+
+
+def test_notify_many_invalid_config():
+    results = notify_many([(Config(), 'message')])
+    assert isinstance(results[0], NtfyrError)
+
+
+def test_notify_connection_error(mocker):
+    mocker.patch(
+        'requests.Session.post',
+        side_effect=requests.ConnectionError('refused'),
+    )
+    config = Config(topic='topic value', server='server value')
+    with pytest.raises(NtfyrError) as err:
+        notify(config, 'message')
+    assert err.value.message == 'ConnectionError: refused'
+    assert err.value.server == config.server
+
+
+def _mock_post_sequence_factory(responses):
+    requests_sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        requests_sent.append(data)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        status_code, headers = response
+        return namedtuple(
+            'mock_response',
+            ['ok', 'json', 'status_code', 'content', 'headers'],
+        )(status_code < 400, lambda: {}, status_code, b'', headers)
+
+    return requests_sent, _mock_post
+
+
+def _mock_put_sequence_factory(responses):
+    requests_sent = []
+
+    def _mock_put(session, url, headers, data, auth, timeout):
+        # Read the streamed file like the transport would.
+        requests_sent.append((headers, data.read()))
+        status_code, response_headers = responses.pop(0)
+        return namedtuple(
+            'mock_response',
+            ['ok', 'json', 'status_code', 'content', 'headers'],
+        )(status_code < 400, lambda: {}, status_code, b'', response_headers)
+
+    return requests_sent, _mock_put
+
+
+def test_client_retries(mocker):
+    sleep = mocker.patch('ntfyr.ntfyr.time.sleep')
+    requests_sent, mock_post = _mock_post_sequence_factory(
+        [
+            requests.ConnectionError('refused'),
+            (503, {}),
+            (429, {'Retry-After': '3'}),
+            (200, {}),
+        ]
+    )
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic value',
+        server='server value',
+        max_attempts=4,
+        retry_delay=1.0,
+    )
+    assert NtfyClient(config).send('message') == {}
+    assert len(requests_sent) == 4
+    delays = [call.args[0] for call in sleep.call_args_list]
+    assert 0 <= delays[0] <= 1
+    assert 0 <= delays[1] <= 2
+    assert delays[2] == 3
+
+
+def test_client_retries_exhausted(mocker):
+    mocker.patch('ntfyr.ntfyr.time.sleep')
+    requests_sent, mock_post = _mock_post_sequence_factory([(500, {})] * 3)
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(topic='topic value', server='server value', max_attempts=3)
+    with pytest.raises(NtfyrError) as err:
+        NtfyClient(config).send('message')
+    assert err.value.attempts == 3
+    assert err.value.status_code == 500
+
+
+def test_client_timeouts(mocker):
+    timeouts = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        timeouts.append(timeout)
+        return namedtuple('mock_response', ['ok', 'json'])(True, lambda: {})
+
+    mocker.patch('requests.Session.post', _mock_post)
+    config = Config(topic='topic', connect_timeout=2.0, read_timeout=5.0)
+    NtfyClient(config).send('message')
+    config.deadline = 3.0
+    NtfyClient(config).send('message')
+    assert timeouts[0] == (2.0, 5.0)
+    assert timeouts[1][0] == 2.0
+    assert 0 < timeouts[1][1] <= 3.0
+
+
+def test_client_deadline_stops_retries(mocker):
+    sleep = mocker.patch('ntfyr.ntfyr.time.sleep')
+    requests_sent, mock_post = _mock_post_sequence_factory(
+        [(503, {'Retry-After': '2'}), (503, {'Retry-After': '20'})]
+    )
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic',
+        server='server',
+        max_attempts=5,
+        retry_max_delay=60,
+        deadline=10,
+    )
+    with pytest.raises(NtfyrError) as err:
+        NtfyClient(config).send('message')
+    # The second delay would pass the deadline.
+    assert err.value.attempts == 2
+    assert len(requests_sent) == 2
+    sleep.assert_called_once_with(2.0)
+
+
+def test_client_attachment(mocker, tmp_path):
+    requests_sent, mock_put = _mock_put_sequence_factory([(503, {}), (200, {})])
+    mocker.patch('requests.Session.put', mock_put)
+    mocker.patch('ntfyr.ntfyr.time.sleep')
+    path = tmp_path.joinpath('core.dump')
+    path.write_bytes(b'\0' * 100000)
+    config = Config(topic='topic', server='server', max_attempts=2)
+    notify(config, 'dumped \u2603', body=path)
+    # The file is sent again from the start when the first attempt fails.
+    assert requests_sent[0] == requests_sent[1]
+    headers, data = requests_sent[1]
+    assert data == b'\0' * 100000
+    assert headers['Filename'] == 'core.dump'
+    assert headers['Content-Length'] == '100000'
+    assert headers['Message'] == '=?UTF-8?B?ZHVtcGVkIOKYgw==?='
+
+
+def test_client_attachment_not_seekable(mocker):
+    requests_sent, mock_put = _mock_put_sequence_factory([(503, {})])
+    mocker.patch('requests.Session.put', mock_put)
+    mocker.patch('ntfyr.ntfyr.time.sleep')
+    pipe = io.BufferedReader(io.BytesIO(b'data'))
+    pipe.seekable = lambda: False
+    pipe.tell = mocker.Mock(side_effect=OSError('not seekable'))
+    config = Config(topic='topic', server='server', max_attempts=2)
+    with pytest.raises(NtfyrError) as err:
+        NtfyClient(config).send('', body=pipe, filename='pipe.txt')
+    assert 'not seekable' in err.value.message
+    assert requests_sent == [({'Filename': 'pipe.txt'}, b'data')]
+
+
+def test_client_no_retry_permanent(mocker):
+    for response in [(400, {}), requests.ReadTimeout('timed out')]:
+        requests_sent, mock_post = _mock_post_sequence_factory([response])
+        mocker.patch('requests.Session.post', mock_post)
+        config = Config(topic='topic', server='server', max_attempts=3)
+        with pytest.raises(NtfyrError) as err:
+            NtfyClient(config).send('message')
+        assert err.value.attempts == 1
+        assert len(requests_sent) == 1
+
+
+def test_stdlib_transport_connect_error(mocker):
+    sleep = mocker.patch('ntfyr.ntfyr.time.sleep')
+    config = Config(
+        topic='topic value',
+        server='http://127.0.0.1:1',
+        transport='stdlib',
+        max_attempts=2,
+    )
+    with pytest.raises(NtfyrError) as err:
+        NtfyClient(config).send('message')
+    assert err.value.attempts == 2
+    assert sleep.call_count == 1
+
+
+def test_lazy_package_attributes():
+    import ntfyr
+
+    assert ntfyr.notify is notify
+    assert 'NtfyClient' in dir(ntfyr)
+    with pytest.raises(AttributeError):
+        ntfyr.banana
+
+
+def test_prepared_notification(mocker):
+    context, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic value',
+        server='server value',
+        title='title value',
+        tags=['tag0', 'tag1'],
+        user='user',
+        password='password',
+    )
+    prepared = config.prepare()
+    config.title = 'changed'
+    assert prepared.send('message value') == {}
+    assert context['url'] == 'server value/topic value'
+    assert context['data'] == b'message value'
+    assert context['auth'] is None
+    assert context['headers'] == {
+        'Title': b'title value',
+        'Tags': b'tag0,tag1',
+        'Authorization': b'Basic dXNlcjpwYXNzd29yZA==',
+    }
+    assert prepared.headers == {'Title': 'title value', 'Tags': 'tag0,tag1'}
+
+
+def test_prepared_notification_immutable():
+    prepared = Config(topic='topic value', server='server value').prepare()
+    with pytest.raises(AttributeError):
+        prepared.url = 'other'
+    with pytest.raises(AttributeError):
+        prepared.other = 'other'
+    with pytest.raises(TypeError):
+        prepared.headers['Title'] = 'title'
+
+
+def test_prepared_notification_invalid():
+    with pytest.raises(NtfyrError):
+        Config(server='server value').prepare()
+    with pytest.raises(NtfyrError):
+        PreparedNotification(
+            Config(topic='topic value', server='server value', title='\u2603')
+        )
+
+
+def test_prepared_notification_error(mocker):
+    context, mock_post = _mock_post_error_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    prepared = Config(
+        topic='topic value', server='server value', token='secret'
+    ).prepare()
+    with pytest.raises(NtfyrError) as err:
+        prepared.send('message value')
+    assert err.value.status_code == 500
+    assert err.value.headers == {'Authorization': 'Bearer secret'}
@@ -0,0 +1,123 @@
+"""Client-side rate limiting."""
+
+import asyncio
+import threading
+
+import pytest
+
+from ntfyr import ratelimit
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrConfigException, NtfyrRateLimitError
+from ntfyr.ratelimit import TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def _clear_buckets():
+    ratelimit._buckets.clear()
+    yield
+    ratelimit._buckets.clear()
+
+
+def test_token_bucket_burst():
+    bucket = TokenBucket(rate=1, burst=3)
+    assert [bucket.reserve(0) for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve(0) is None
+    assert 0.9 < bucket.reserve() <= 1
+    assert 1.9 < bucket.reserve() <= 2
+
+
+def test_token_bucket_refund():
+    bucket = TokenBucket(rate=1)
+    assert bucket.reserve(0) == 0
+    bucket.refund()
+    assert bucket.reserve(0) == 0
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(rate=1000, burst=10)
+    waits = []
+
+    def _reserve():
+        for _ in range(100):
+            waits.append(bucket.reserve())
+
+    threads = [threading.Thread(target=_reserve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every reservation gets its own slot.
+    assert len(waits) == 400
+    assert max(waits) > 0.3
+
+
+def test_token_bucket_invalid():
+    for rate, burst in ((0, None), (-1, None), (1, 0), (1, -2)):
+        with pytest.raises(ValueError):
+            TokenBucket(rate, burst)
+
+
+def test_config_rate_limit_invalid():
+    for key in ('rate_limit', 'rate_burst', 'topic_rate_limit'):
+        for value in ('0', '-1'):
+            with pytest.raises(NtfyrConfigException):
+                Config().update({key: value})
+    assert Config().update({'topic_rate_burst': '2'}).topic_rate_burst == 2
+
+
+def test_buckets_bounded(mocker):
+    mocker.patch('ntfyr.ratelimit.MAX_BUCKETS', 2)
+    first = ratelimit._get_bucket(('topic', 'server', 'a'), 1, None)
+    ratelimit._get_bucket(('topic', 'server', 'b'), 1, None)
+    # Using a bucket keeps it.
+    assert ratelimit._get_bucket(('topic', 'server', 'a'), 1, None) is first
+    ratelimit._get_bucket(('topic', 'server', 'c'), 1, None)
+    assert [key[2] for key in ratelimit._buckets] == ['a', 'c']
+
+
+def test_acquire_non_blocking():
+    config = Config(server='server', topic='topic', topic_rate_limit=1)
+    ratelimit.acquire(config, block=False)
+    with pytest.raises(NtfyrRateLimitError) as err:
+        ratelimit.acquire(config, block=False)
+    assert err.value.topic == 'topic'
+    # Other topics are not limited.
+    ratelimit.acquire(
+        Config(server='server', topic='other', topic_rate_limit=1)
+    )
+
+
+def test_acquire_refunds_server_token():
+    config = Config(
+        server='server',
+        topic='topic',
+        rate_limit=1,
+        rate_burst=2,
+        topic_rate_limit=1,
+    )
+    ratelimit.acquire(config, block=False)
+    with pytest.raises(NtfyrRateLimitError):
+        ratelimit.acquire(config, block=False)
+    # The server token taken before the topic limit was hit is returned.
+    other = Config(server='server', topic='other', rate_limit=1, rate_burst=2)
+    ratelimit.acquire(other, block=False)
+
+
+def test_acquire_waits(mocker):
+    sleep = mocker.patch('ntfyr.ratelimit.time.sleep')
+    config = Config(server='server', topic='topic', rate_limit=10)
+    for _ in range(11):
+        ratelimit.acquire(config)
+    assert 0.09 < sleep.call_args.args[0] <= 0.1
+
+
+def test_acquire_async_waits(mocker):
+    sleep = mocker.patch('asyncio.sleep')
+    config = Config(server='server', topic='topic', rate_limit=10)
+
+    async def _acquire():
+        for _ in range(11):
+            await ratelimit.acquire_async(config)
+
+    asyncio.run(_acquire())
+    assert 0.09 < sleep.call_args.args[0] <= 0.1
@@ -0,0 +1,69 @@
+"""Retry policies."""
+
+import email.utils
+import time
+
+from ntfyr.config import Config
+from ntfyr.retry import Deadline, RetryPolicy, parse_retry_after
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after('5') == 5.0
+    assert parse_retry_after('-5') == 0.0
+
+
+def test_parse_retry_after_date():
+    value = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(value) <= 60
+
+
+def test_parse_retry_after_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('banana') is None
+
+
+def test_retry_policy_backoff():
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=5)
+    for _ in range(100):
+        assert 0 <= policy.delay(1) <= 1
+        assert 0 <= policy.delay(3) <= 4
+        assert 0 <= policy.delay(9) <= 5
+
+
+def test_retry_policy_max_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.delay(2) is not None
+    assert policy.delay(3) is None
+
+
+def test_retry_policy_retry_after():
+    policy = RetryPolicy(max_attempts=3, max_delay=10)
+    assert policy.delay(1, retry_after=7) == 7
+    assert policy.delay(1, retry_after=11) is None
+
+
+def test_retry_policy_from_config():
+    config = Config(max_attempts=4, retry_delay=2.0, retry_max_delay=8.0)
+    assert RetryPolicy.from_config(config) == RetryPolicy(4, 2.0, 8.0)
+
+
+def test_deadline(mocker):
+    now = [100.0]
+    mocker.patch('ntfyr.retry.time.monotonic', lambda: now[0])
+    deadline = Deadline(5)
+    assert deadline.timeout(10, 2) == (5, 2)
+    assert deadline.timeout(None, None) == (5, 5)
+    assert deadline.allows(4)
+    assert not deadline.allows(5)
+    now[0] += 5
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+
+
+def test_no_deadline():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.allows(1e9)
+    assert deadline.timeout(10, None) == (10, None)
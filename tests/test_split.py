@@ -0,0 +1,91 @@
+import io
+from collections import namedtuple
+
+import pytest
+
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.split import collect_parts, iter_parts, notify_split, part_limit
+
+
+def _mock_post_factory(fail_at=None):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        sent.append((headers.get('Title'), data.decode('utf-8')))
+        ok = len(sent) != fail_at
+        return namedtuple(
+            'mock_response',
+            ['ok', 'json', 'status_code', 'content', 'headers'],
+        )(
+            ok,
+            lambda: {} if ok else {'error': 'bad'},
+            200 if ok else 400,
+            b'',
+            {},
+        )
+
+    return sent, _mock_post
+
+
+def test_iter_parts_lines():
+    text = 'line one\nline two\nline three\n'
+    assert list(iter_parts(io.StringIO(text), 20)) == [
+        'line one\nline two',
+        'line three\n',
+    ]
+
+
+def test_iter_parts_utf8_boundaries(mocker):
+    mocker.patch('ntfyr.split._READ_SIZE', 3)
+    text = '☃' * 10
+    parts = list(iter_parts(io.StringIO(text), 7))
+    # Each snowman is 3 bytes so only 2 fit in 7 bytes.
+    assert parts == ['☃☃'] * 5
+    assert all(len(part.encode('utf-8')) <= 7 for part in parts)
+
+
+def test_collect_parts_caps(mocker):
+    mocker.patch('ntfyr.split._READ_SIZE', 10)
+    stream = io.StringIO('x' * 100)
+    assert collect_parts(stream, 10, max_parts=3) == (['x' * 10] * 3, True)
+    # Reading stopped at the first part over the cap.
+    assert stream.tell() < 100
+    assert collect_parts(io.StringIO('x' * 25), 10, max_bytes=20) == (
+        ['x' * 10] * 2,
+        True,
+    )
+    assert collect_parts(io.StringIO('x' * 25), 10) == (
+        ['x' * 10, 'x' * 10, 'x' * 5],
+        False,
+    )
+
+
+def test_part_limit():
+    assert part_limit(Config()) == 4096
+    config = Config(include_timestamp=True, timestamp='[%Y] %message!')
+    assert part_limit(config) == 4096 - len('[2026] !')
+
+
+def test_notify_split(mocker):
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(topic='topic', title='Report')
+    message = ('a' * 3000 + '\n') * 3
+    assert len(notify_split(config, message)) == 3
+    assert sent == [
+        ('Report (1/3)', 'a' * 3000),
+        ('Report (2/3)', 'a' * 3000),
+        ('Report (3/3)', 'a' * 3000 + '\n'),
+    ]
+    sent.clear()
+    notify_split(Config(topic='topic'), 'short')
+    assert sent == [(None, 'short')]
+
+
+def test_notify_split_stops_at_failure(mocker):
+    sent, mock_post = _mock_post_factory(fail_at=2)
+    mocker.patch('requests.Session.post', mock_post)
+    with pytest.raises(NtfyrError):
+        notify_split(Config(topic='topic'), 'x' * 10000)
+    assert [title for title, _ in sent] == ['(1/3)', '(2/3)']
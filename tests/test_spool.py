@@ -0,0 +1,155 @@
+"""The on-disk notification spool."""
+
+import stat
+from collections import namedtuple
+
+import pytest
+import requests
+
+from ntfyr.__main__ import main
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.ntfyr import NtfyClient
+from ntfyr.spool import Spool
+
+
+def _mock_post_factory(fail_servers=(), status_code=None):
+    sent = []
+
+    def _mock_post(session, url, headers, data, auth, timeout):
+        if any(url.startswith(server) for server in fail_servers):
+            if status_code is None:
+                raise requests.ConnectionError('refused')
+            return namedtuple(
+                'mock_response',
+                ['ok', 'json', 'status_code', 'content', 'headers'],
+                defaults=[
+                    False,
+                    lambda: None,
+                    status_code,
+                    b'content value',
+                    {},
+                ],
+            )()
+        sent.append((url, headers, data))
+        return namedtuple('mock_response', ['ok', 'json'])(True, lambda: {})
+
+    return sent, _mock_post
+
+
+def test_client_spools_transient_errors(mocker, tmp_path):
+    _, mock_post = _mock_post_factory(fail_servers=['server value'])
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(
+        topic='topic value',
+        server='server value',
+        title='title value',
+        include_timestamp=True,
+        timestamp='%Y',
+        spool=str(tmp_path),
+    )
+    with NtfyClient(config) as client:
+        assert client.send('message') is None
+    with Spool(tmp_path) as spool:
+        assert len(spool) == 1
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    with Spool(tmp_path) as spool:
+        assert spool.drain() == 1
+        assert len(spool) == 0
+    url, headers, data = sent[0]
+    assert url == 'server value/topic value'
+    assert headers == {'Title': 'title value'}
+    # The timestamp is only added once.
+    assert data.decode().count(' ') == 1
+
+
+def test_client_raises_permanent_errors(mocker, tmp_path):
+    _, mock_post = _mock_post_factory(['server value'], status_code=400)
+    mocker.patch('requests.Session.post', mock_post)
+    config = Config(topic='topic', server='server value', spool=str(tmp_path))
+    with pytest.raises(NtfyrError):
+        with NtfyClient(config) as client:
+            client.send('message')
+    with Spool(tmp_path) as spool:
+        assert len(spool) == 0
+
+
+def test_drain_keeps_order_per_server(mocker, tmp_path):
+    with Spool(tmp_path) as spool:
+        for server, message in [
+            ('server0', 'first'),
+            ('server1', 'second'),
+            ('server0', 'third'),
+            ('server1', 'fourth'),
+        ]:
+            spool.enqueue(Config(topic='topic', server=server), message)
+        sent, mock_post = _mock_post_factory(fail_servers=['server0'])
+        mocker.patch('requests.Session.post', mock_post)
+        assert spool.drain(batch_size=1) == 2
+        assert [data for _, _, data in sent] == [b'second', b'fourth']
+        assert len(spool) == 2
+        sent, mock_post = _mock_post_factory()
+        mocker.patch('requests.Session.post', mock_post)
+        assert spool.drain() == 2
+        assert [data for _, _, data in sent] == [b'first', b'third']
+        assert len(spool) == 0
+
+
+def test_drain_drops_rejected(mocker, tmp_path):
+    _, mock_post = _mock_post_factory(['server'], status_code=403)
+    mocker.patch('requests.Session.post', mock_post)
+    with Spool(tmp_path) as spool:
+        spool.enqueue(Config(topic='topic', server='server'), 'message')
+        assert spool.drain() == 0
+        assert len(spool) == 0
+
+
+def test_drain_locked(tmp_path):
+    with Spool(tmp_path) as spool:
+        spool.enqueue(Config(topic='topic', server='server'), 'message')
+        with spool._drain_lock():
+            assert spool.drain() == 0
+        assert len(spool) == 1
+
+
+def test_flush_command(mocker, tmp_path):
+    with Spool(tmp_path) as spool:
+        spool.enqueue(Config(topic='topic', server='server'), 'message')
+    sent, mock_post = _mock_post_factory(fail_servers=['server'])
+    mocker.patch('requests.Session.post', mock_post)
+    with pytest.raises(SystemExit):
+        main(['flush', '--spool', str(tmp_path)])
+    sent, mock_post = _mock_post_factory()
+    mocker.patch('requests.Session.post', mock_post)
+    main(['flush', '--spool', str(tmp_path)])
+    assert [data for _, _, data in sent] == [b'message']
+
+
+def test_spool_permissions(tmp_path):
+    directory = tmp_path.joinpath('spool')
+    directory.mkdir(mode=0o755)
+    directory.chmod(0o755)
+    with Spool(directory) as spool:
+        spool.enqueue(Config(topic='topic', server='server'), 'message')
+        assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+        for path in directory.glob('spool.sqlite3*'):
+            assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_read_timeouts_not_spooled(mocker, tmp_path):
+    mocker.patch(
+        'requests.Session.post', side_effect=requests.ReadTimeout('slow')
+    )
+    config = Config(topic='topic', server='server', spool=str(tmp_path))
+    with pytest.raises(NtfyrError):
+        with NtfyClient(config) as client:
+            client.send('message')
+    with Spool(tmp_path) as spool:
+        assert len(spool) == 0
+        spool.enqueue(config, 'first')
+        spool.enqueue(config, 'second')
+        # Dropped since the server might have accepted it, and the next one
+        #   is kept to keep the order.
+        assert spool.drain() == 0
+        assert len(spool) == 1
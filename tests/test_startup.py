@@ -0,0 +1,46 @@
+"""The startup time of the ntfyr CLI."""
+
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_US = 150_000
+"""The budget for importing the CLI in microseconds.
+
+This is several times what it takes on a laptop so it only catches large
+regressions like an eager import of `requests`.
+"""
+LAZY_MODULES = [
+    'asyncio',
+    'concurrent.futures',
+    'configparser',
+    'http.client',
+    'requests',
+    'sqlite3',
+    'tzlocal',
+]
+"""Modules that must only be imported when they are used."""
+
+
+def _import_times(module):
+    """Return the cumulative import time of each module in microseconds."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_lazy_imports():
+    times = _import_times('ntfyr.__main__')
+    assert [module for module in LAZY_MODULES if module in times] == []
+
+
+def test_cli_import_time_budget():
+    times = _import_times('ntfyr.__main__')
+    assert times['ntfyr.__main__'] < IMPORT_TIME_BUDGET_US
@@ -0,0 +1,222 @@
+import json
+
+import pytest
+import requests
+
+from ntfyr.__main__ import main
+from ntfyr.config import Config
+from ntfyr.errors import NtfyrError
+from ntfyr.subscription import Message, subscribe
+
+
+class _Response:
+    def __init__(self, status_code=200, lines=(), error=None, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = 'error text'
+        self.headers = headers or {}
+        self._lines = lines
+        self._error = error
+        self.closed = False
+
+    def iter_lines(self):
+        for line in self._lines:
+            yield json.dumps(line).encode() if isinstance(line, dict) else line
+        if self._error:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, params, headers, auth, timeout, stream):
+        self.requests.append(dict(url=url, params=params, headers=headers))
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def _message(message_id, message='message value', **fields):
+    return dict(
+        id=message_id,
+        time=1700000000,
+        event='message',
+        topic='topic',
+        message=message,
+        **fields,
+    )
+
+
+@pytest.fixture()
+def config():
+    return Config(server='https://server', topic='topic', retry_delay=0)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(mocker):
+    return mocker.patch('ntfyr.subscription.time.sleep')
+
+
+def test_subscribe(config):
+    session = _Session(
+        _Response(
+            lines=[
+                {'id': 'o', 'time': 1, 'event': 'open', 'topic': 'topic'},
+                _message('a', title='title value', tags=['tag'], extra=1),
+                b'',
+                {'id': 'k', 'time': 2, 'event': 'keepalive', 'topic': 'topic'},
+                b'not json',
+                _message('b', priority=5),
+            ]
+        )
+    )
+    messages = subscribe(config, session=session, poll=True)
+    first, second = messages
+    assert first.title == 'title value'
+    assert first.tags == ['tag']
+    assert first.priority == 3
+    assert second.id == 'b'
+    assert second.priority == 5
+    assert second.title is None
+    assert second.as_dict() == dict(_message('b'), priority=5, tags=[])
+    assert session.requests == [
+        {
+            'url': 'https://server/topic/json',
+            'params': {'poll': '1'},
+            'headers': {},
+        }
+    ]
+
+
+def test_subscribe_reconnect(config, no_sleep):
+    config.token = 'token value'
+    session = _Session(
+        _Response(
+            lines=[_message('a')],
+            error=requests.exceptions.ConnectionError('read timed out'),
+        ),
+        _Response(status_code=503),
+        _Response(status_code=429, headers={'Retry-After': '7'}),
+        _Response(lines=[_message('b')]),
+    )
+    messages = subscribe(config, since='all', session=session)
+    assert next(messages).id == 'a'
+    assert next(messages).id == 'b'
+    messages.close()
+    assert [request['params'] for request in session.requests] == [
+        {'since': 'all'},
+        {'since': 'a'},
+        {'since': 'a'},
+        {'since': 'a'},
+    ]
+    assert session.requests[0]['headers'] == {
+        'Authorization': 'Bearer token value',
+    }
+    assert no_sleep.call_args_list[2].args == (7.0,)
+
+
+def test_subscribe_resumes_from_keepalive(config):
+    session = _Session(
+        _Response(lines=[{'time': 1234, 'event': 'keepalive'}]),
+        _Response(lines=[_message('a')]),
+    )
+    messages = subscribe(config, session=session)
+    assert next(messages).id == 'a'
+    messages.close()
+    assert session.requests[1]['params'] == {'since': '1234'}
+
+
+def test_subscribe_rejected(config, no_sleep):
+    session = _Session(_Response(status_code=403))
+    with pytest.raises(NtfyrError) as err:
+        list(subscribe(config, session=session))
+    assert err.value.status_code == 403
+    assert err.value.message == '403 error text'
+    no_sleep.assert_not_called()
+
+
+def test_message():
+    message = Message.from_json(_message('a', unknown='ignored'))
+    assert message == Message(**_message('a'))
+    assert repr(message) == (
+        "Message(id='a', topic='topic', message='message value')"
+    )
+    with pytest.raises(AttributeError):
+        message.unknown = 1
+
+
+@pytest.mark.parametrize(
+    'output_format, expected',
+    [
+        ('text', 'title value: message value\n'),
+        (
+            'json',
+            json.dumps(
+                {
+                    'event': 'message',
+                    'id': 'a',
+                    'time': 1700000000,
+                    'topic': 'topic',
+                    'message': 'message value',
+                    'title': 'title value',
+                    'tags': [],
+                    'priority': 3,
+                }
+            )
+            + '\n',
+        ),
+    ],
+)
+def test_main_subscribe(mocker, capsys, tmp_path, output_format, expected):
+    config_path = tmp_path.joinpath('ntfyr.ini')
+    config_path.write_text('[ntfyr]\nserver = https://server\n')
+    session = _Session(_Response(lines=[_message('a', title='title value')]))
+    mocker.patch('ntfyr.subscription._new_session', return_value=session)
+    main(
+        [
+            'subscribe',
+            '-t',
+            'a',
+            'b',
+            '--poll',
+            '--format',
+            output_format,
+            '-c',
+            str(config_path),
+        ]
+    )
+    assert session.requests[0]['url'] == 'https://server/a,b/json'
+    assert capsys.readouterr().out == expected
+
+
+def test_subscribe_cursor(config, tmp_path):
+    config.cursor_path = str(tmp_path.joinpath('cursors.json'))
+    session = _Session(
+        _Response(lines=[_message('a'), _message('b')]),
+        # The last message is sent again at the boundary.
+        _Response(lines=[_message('b'), _message('c')]),
+        _Response(lines=[_message('a')]),
+    )
+    assert [m.id for m in subscribe(config, poll=True, session=session)] == [
+        'a',
+        'b',
+    ]
+    assert [m.id for m in subscribe(config, poll=True, session=session)] == [
+        'c'
+    ]
+    messages = subscribe(config, since='all', poll=True, session=session)
+    assert [m.id for m in messages] == ['a']
+    assert [request['params'] for request in session.requests] == [
+        {'poll': '1'},
+        {'since': 'b', 'poll': '1'},
+        {'since': 'all', 'poll': '1'},
+    ]
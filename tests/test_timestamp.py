@@ -0,0 +1,76 @@
+"""Timestamps for notifications."""
+
+from datetime import datetime as dt
+from datetime import timezone
+
+import pytest
+
+from ntfyr import timestamp
+from ntfyr.timestamp import TimestampFormatter, get_formatter
+
+
+@pytest.fixture
+def utc(mocker):
+    timestamp.refresh()
+    yield mocker.patch('tzlocal.reload_localzone', return_value=timezone.utc)
+    timestamp.refresh()
+
+
+def test_formatter_prefix(utc, mocker):
+    mocker.patch('time.time', return_value=0.5)
+    formatter = TimestampFormatter('%Y-%m-%d %H:%M:%S %Z')
+    assert formatter('message') == '1970-01-01 00:00:00 UTC message'
+
+
+def test_formatter_placeholder(utc, mocker):
+    mocker.patch('time.time', return_value=0)
+    formatter = TimestampFormatter('[%Y] %message {%H}')
+    assert formatter('{message}') == '[1970] {message} {00}'
+
+
+def test_formatter_local_time():
+    # Chose a day rather than a time so that the likelyhood of a race condition
+    #   between the two formatting operations is low.
+    formatter = TimestampFormatter('%Y-%m-%d')
+    assert formatter('message') == f'{dt.now():%Y-%m-%d} message'
+
+
+def test_formatter_reuses_second(utc, mocker):
+    clock = mocker.patch('time.time', return_value=10.1)
+    formatter = TimestampFormatter('%S')
+    first = formatter._render()
+    clock.return_value = 10.9
+    assert formatter._render() is first
+    clock.return_value = 11.0
+    assert formatter('message') == '11 message'
+
+
+def test_formatter_subsecond_not_reused(utc, mocker):
+    clock = mocker.patch('time.time', return_value=10.25)
+    formatter = TimestampFormatter('%S.%f')
+    assert formatter('message') == '10.250000 message'
+    clock.return_value = 10.5
+    assert formatter('message') == '10.500000 message'
+
+
+def test_zone_cached_until_ttl(utc, mocker):
+    clock = mocker.patch('time.monotonic', return_value=1000)
+    timestamp.local_zone()
+    timestamp.local_zone()
+    assert utc.call_count == 1
+    clock.return_value = 1000 + timestamp.ZONE_TTL
+    timestamp.local_zone()
+    assert utc.call_count == 2
+
+
+def test_zone_refresh(utc, mocker):
+    timestamp.local_zone()
+    timestamp.refresh()
+    utc.return_value = timezone.max
+    mocker.patch('time.time', return_value=0)
+    assert TimestampFormatter('%H:%M')('message') == '23:59 message'
+    assert utc.call_count == 2
+
+
+def test_get_formatter_shared():
+    assert get_formatter('%Y') is get_formatter('%Y')